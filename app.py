@@ -1,14 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from jinja2 import FileSystemBytecodeCache
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import os
+import click
+import sqlite3
+import threading
 from models.database import init_db
 from controllers.auth_controller import auth_bp
 from controllers.admin_controller import admin_bp
 from controllers.user_controller import user_bp
 from controllers.api_controller import api_bp
+from controllers.api_v1_controller import api_v1_bp
+from controllers.assets_controller import assets_bp
 from models.user import User
+from models.scheduler import init_scheduler, scheduler
+from models.archive import ReservationArchive
+from models.waitlist import Waitlist
+from models.gate import GateIngestor
+from models.admission import init_admission
+from models.pricing import PricingEngine
+from models.availability_board import AvailabilityBoard
+from models.importer import ENTITIES, import_file
+import assets
+import benchmarks
 from config import config
 
 app = Flask(__name__)
@@ -21,10 +37,42 @@ app.config.from_object(config[config_name])
 print(f"Running in {config_name} mode")
 print(f"SECRET_KEY length: {len(app.config['SECRET_KEY'])}")
 
+ReservationArchive.archive_dir = app.config['ARCHIVE_DIR']
+Waitlist.hold_minutes = app.config['WAITLIST_HOLD_MINUTES']
+Waitlist.stream_seconds = app.config['WAITLIST_STREAM_SECONDS']
+Waitlist.stream_slots = threading.BoundedSemaphore(app.config['WAITLIST_MAX_STREAMS'])
+GateIngestor.dedup_window_seconds = app.config['GATE_DEDUP_WINDOW_SECONDS']
+GateIngestor.batch_size = app.config['GATE_BATCH_SIZE']
+init_admission(app.config)
+PricingEngine.configure(app.config['PRICING_ENABLED'], app.config['PRICING_HOUR_MULTIPLIERS'],
+                        app.config['PRICING_OCCUPANCY_TIERS'], app.config['PRICING_UTC_OFFSET_HOURS'])
+
+if app.config.get('JINJA_BYTECODE_CACHE_DIR'):
+    os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
+def init_availability_board():
+    # Every worker attaches to the same shared board and rebuilds it from the database,
+    # which also repairs anything a crashed worker left half-written
+    AvailabilityBoard.detach()
+    if not app.config.get('AVAILABILITY_BOARD_ENABLED'):
+        return
+    if AvailabilityBoard.attach(app.config['AVAILABILITY_BOARD_NAME'], app.config['AVAILABILITY_BOARD_CAPACITY']):
+        try:
+            AvailabilityBoard.reconcile()
+        except sqlite3.Error as e:
+            # Typically the tables do not exist yet; serve counts from the database until they do
+            print(f"Could not build the availability board: {e}")
+            AvailabilityBoard.detach()
+
+init_availability_board()
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'auth.login'  # Ensure this matches the blueprint name and route function name
+# API clients get a 401 instead of a redirect to the login page
+login_manager.blueprint_login_views = {'api_v1': None}
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -35,6 +83,20 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(admin_bp, url_prefix='/admin')
 app.register_blueprint(user_bp, url_prefix='/user')
 app.register_blueprint(api_bp, url_prefix='/api')
+app.register_blueprint(api_v1_bp, url_prefix='/api/v1')
+app.register_blueprint(assets_bp)
+
+@app.before_request
+def ensure_scheduler():
+    # Background jobs start with a worker's first request, whatever server loaded the app
+    # (a worker forked from gunicorn --preload inherits no threads); the scheduled_jobs
+    # claim keeps each job to one worker per interval. Requests a CLI command makes through
+    # the test client (benchmarks) do not start it: the command would exit with claimed jobs
+    # half-run in a daemon thread, pushing them back a whole interval
+    command = click.get_current_context(silent=True)
+    if (app.config.get('SCHEDULER_ENABLED') and not scheduler.running
+            and (command is None or command.info_name == 'run')):
+        init_scheduler(app.config)
 
 @app.route('/')
 def index():
@@ -45,6 +107,43 @@ def index():
             return redirect(url_for('user.dashboard'))
     return render_template('index.html')
 
+@app.cli.command('import-data')
+@click.argument('entity', type=click.Choice(ENTITIES))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input format; guessed from the file extension by default.')
+@click.option('--chunk-size', default=10000, show_default=True, help='Rows per transaction.')
+def import_data(entity, path, fmt, chunk_size):
+    """Bulk import lots, users or historical reservations from a CSV or NDJSON file."""
+    init_db()
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl', '.json')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as stream:
+        result = import_file(entity, stream, fmt, chunk_size,
+                             progress=lambda r: click.echo(f'  {r.processed} rows processed...'))
+    click.echo(str(result))
+    for number, message in result.errors[:20]:
+        click.echo(f'  row {number}: {message}')
+
+@app.cli.group('assets')
+def assets_cli():
+    """Vendor, fingerprint and pre-compress static assets."""
+
+@assets_cli.command('fetch')
+@click.option('--force', is_flag=True, help='Download again even if the file exists.')
+def fetch_assets(force):
+    """Download the pinned third-party assets into static/vendor (needs network once)."""
+    for path in assets.fetch_vendor(force):
+        click.echo(f'  fetched {path}')
+
+@assets_cli.command('build')
+def build_assets():
+    """Write fingerprinted, gzip/brotli-compressed assets and image variants to static/dist."""
+    manifest, sizes = assets.build()
+    click.echo(f'Built {len(manifest)} assets into {assets.DIST_DIR}')
+    click.echo(assets.page_weight_report(sizes))
+
+benchmarks.register_commands(app)
+
 if __name__ == '__main__':
     try:
         print("Attempting to initialize database...")
@@ -52,4 +151,5 @@ if __name__ == '__main__':
         print("Database initialized successfully (or already exists).")
     except Exception as e:
         print(f"Error during database initialization: {e}")
+    init_availability_board()
     app.run(debug=True)
@@ -0,0 +1,179 @@
+"""Static asset pipeline: vendoring, fingerprinting and pre-compression.
+
+    flask --app app assets fetch   # once, with network: download pinned vendor files into static/vendor
+    flask --app app assets build   # offline: write fingerprinted, pre-compressed copies to static/dist
+
+Templates call asset_url()/image_srcset() (controllers/assets_controller.py),
+which read static/dist/manifest.json and fall back to the plain static file,
+or to the pinned CDN URL for vendor files that have not been fetched yet.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are skipped without the brotli package
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # WebP/AVIF variants are skipped without Pillow
+    Image = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Pinned third-party assets: path under static/ -> CDN URL
+VENDOR_ASSETS = {
+    'vendor/bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+    'vendor/chartjs/chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js',
+    'vendor/fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+}
+for font in ('fa-solid-900', 'fa-regular-400', 'fa-brands-400', 'fa-v4compatibility'):
+    for extension in ('woff2', 'ttf'):
+        VENDOR_ASSETS[f'vendor/fontawesome/webfonts/{font}.{extension}'] = \
+            f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/webfonts/{font}.{extension}'
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.json')
+RESPONSIVE_IMAGES = ('.jpeg', '.jpg', '.png')
+IMAGE_WIDTHS = (480, 960)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def fetch_vendor(force=False):
+    fetched = []
+    for path, url in VENDOR_ASSETS.items():
+        target = os.path.join(STATIC_DIR, path)
+        if os.path.exists(target) and not force:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response, open(target, 'wb') as f:
+            shutil.copyfileobj(response, f)
+        fetched.append(path)
+    return fetched
+
+
+def _source_files():
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != DIST_DIR]
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, '/')
+
+
+def _fingerprint(path, data):
+    stem, extension = os.path.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+
+def _write(path, data):
+    target = os.path.join(DIST_DIR, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(data)
+
+
+def _rewrite_css_urls(path, data, manifest):
+    # Point url(...) references at the fingerprinted names of the files they load
+    directory = os.path.dirname(path)
+
+    def replace(match):
+        reference = match.group(2)
+        if reference.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', reference).groups()
+        resolved = os.path.normpath(os.path.join(directory, target)).replace(os.sep, '/')
+        entry = manifest.get(resolved)
+        if not entry:
+            return match.group(0)
+        hashed = os.path.relpath(entry['file'], directory or '.').replace(os.sep, '/')
+        return f'url({hashed}{suffix})'
+
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def _image_variants(path, entry, sizes):
+    source = Image.open(os.path.join(STATIC_DIR, path))
+    stem = os.path.splitext(path)[0]
+    widths = sorted({width for width in IMAGE_WIDTHS if width < source.width} | {source.width})
+    for image_format, extension in (('WEBP', 'webp'), ('AVIF', 'avif')):
+        variants = []
+        for width in widths:
+            resized = source if width == source.width else source.resize(
+                (width, round(source.height * width / source.width)), Image.LANCZOS)
+            buffer = io.BytesIO()
+            try:
+                resized.save(buffer, image_format, quality=80)
+            except (KeyError, OSError):  # Pillow built without this codec
+                break
+            sizes[extension] = len(buffer.getvalue())  # The full-width variant is measured last
+            hashed = _fingerprint(f'{stem}-{width}w.{extension}', buffer.getvalue())
+            _write(hashed, buffer.getvalue())
+            variants.append((hashed, width))
+        if variants:
+            entry[extension] = variants
+
+
+def build():
+    """Write fingerprinted and pre-compressed copies of static/ into static/dist.
+
+    Returns (manifest, sizes) where sizes maps each source path to
+    {'raw': bytes, 'gzip': bytes, 'br': bytes} for the page-weight report.
+    """
+    # Old fingerprinted files are kept so pages cached before a deploy still load
+    os.makedirs(DIST_DIR, exist_ok=True)
+
+    manifest, sizes = {}, {}
+    # CSS last, so url() references can be rewritten to already-hashed files
+    for path in sorted(_source_files(), key=lambda p: (p.endswith('.css'), p)):
+        with open(os.path.join(STATIC_DIR, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css_urls(path, data, manifest)
+
+        hashed = _fingerprint(path, data)
+        _write(hashed, data)
+        entry = {'file': hashed, 'encodings': []}
+        sizes[path] = {'raw': len(data)}
+
+        if path.endswith(COMPRESSIBLE):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            _write(hashed + '.gz', compressed)
+            entry['encodings'].append('gzip')
+            sizes[path]['gzip'] = len(compressed)
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                _write(hashed + '.br', compressed)
+                entry['encodings'].append('br')
+                sizes[path]['br'] = len(compressed)
+
+        if Image is not None and path.endswith(RESPONSIVE_IMAGES):
+            _image_variants(path, entry, sizes[path])
+
+        manifest[path] = entry
+
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest, sizes
+
+
+def page_weight_report(sizes):
+    # "best" is what a modern browser downloads: the smallest variant the build produced
+    columns = ('raw', 'gzip', 'br', 'webp', 'avif', 'best')
+    lines = [f'{"asset":50}' + ''.join(f'{column:>10}' for column in columns)]
+    totals = dict.fromkeys(('raw', 'best'), 0)
+    for path, size in sorted(sizes.items()):
+        size = dict(size, best=min(size.values()))
+        totals['raw'] += size['raw']
+        totals['best'] += size['best']
+        lines.append(f'{path:50}' + ''.join(f'{size.get(column, "-"):>10}' for column in columns))
+    lines.append(f'{"total":50}' + ''.join(f'{totals.get(column, ""):>10}' for column in columns))
+    return '\n'.join(lines)
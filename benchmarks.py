@@ -0,0 +1,547 @@
+"""Benchmark and load-test commands, registered on the app's CLI by register_commands()."""
+from flask import current_app, jsonify, render_template
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import mock
+import click
+import csv
+import io
+import json
+import random
+import sqlite3
+import statistics
+import threading
+import time
+import timeit
+import tracemalloc
+import types
+from models.database import init_db, get_db_connection
+from models.user import User
+from models.parking_lot import ParkingLot
+from models.reservation import Reservation
+from models.gate import GateIngestor, simulate_events
+from models.vehicle import Vehicle
+from models.admission import AdmissionGate, Rejected
+from models.pricing import PricingEngine
+from models.waitlist import Waitlist
+from models.archive import ReservationArchive
+from models.importer import import_file
+from models.availability import LotAvailability, SpotSchedule, TIMESTAMP_FORMAT, to_seconds
+from controllers import admin_controller
+from controllers.api_v1_controller import serialize, MSGPACK_MIMETYPES, orjson, msgpack
+
+
+@click.command('api-benchmark')
+@with_appcontext
+@click.option('--lots', default=1000, show_default=True, help='Lots in the synthetic /api/v1/lots payload.')
+@click.option('--repeat', default=200, show_default=True, help='Serializations timed per encoder.')
+def api_benchmark(lots, repeat):
+    """Compare the /api/v1 serializers against the jsonify path used by /api."""
+    payload = {'lots': [{
+        'id': i, 'prime_location_name': f'Lot {i}', 'price': 2.5 + i % 7, 'address': f'{i} Main Street',
+        'pin_code': f'{560000 + i}', 'maximum_number_of_spots': 50, 'created_at': '2024-01-01 08:00:00',
+        'total_spots': 50, 'available_spots': i % 50, 'occupied_spots': 50 - i % 50,
+    } for i in range(1, lots + 1)]}
+    encoders = [('jsonify', lambda: jsonify(payload).get_data()),
+                ('orjson' if orjson is not None else 'json (compact)', lambda: serialize(payload))]
+    if msgpack is not None:
+        encoders.append(('msgpack', lambda: serialize(payload, MSGPACK_MIMETYPES[0])))
+    for name, encode in encoders:
+        size = len(encode())
+        seconds = timeit.timeit(encode, number=repeat)
+        click.echo(f'{name:16} {seconds / repeat * 1000:8.3f} ms/response {size:>10} bytes')
+
+
+@click.command('gate-replay')
+@with_appcontext
+@click.argument('path', required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option('--simulate', default=0, help='Generate this many events from registered plates instead of reading PATH.')
+@click.option('--create-plates', default=0, help='First register this many SIM plates, spread over the users.')
+@click.option('--request-size', default=1000, show_default=True, help='Events per ingest call (one POST).')
+def gate_replay(path, simulate, create_plates, request_size):
+    """Replay gate events (NDJSON file or simulated) through the ingestor and report events/second.
+
+    This writes real reservations: run it against a scratch copy of the database.
+    """
+    init_db()
+    users = [user.id for user in User.iter_all_users() if user.role == 'user']
+    for number in range(create_plates):
+        if users:
+            Vehicle.add(users[number % len(users)], f'SIM{number:05d}')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        plates = list(Vehicle.get_plate_owners())
+        lot_ids = [lot['id'] for lot in ParkingLot.get_all()]
+        if not plates or not lot_ids or not simulate:
+            raise click.UsageError('Pass an events file, or --simulate N with lots and registered plates.')
+        events = list(simulate_events(plates, lot_ids, simulate))
+
+    totals = {'received': 0, 'duplicates': 0, 'entries': 0, 'exits': 0, 'rejected': 0}
+    started = time.perf_counter()
+    for start in range(0, len(events), request_size):
+        result = GateIngestor.ingest(events[start:start + request_size]).as_dict()
+        for key in totals:
+            totals[key] += len(result[key]) if key == 'rejected' else result[key]
+    elapsed = time.perf_counter() - started
+    click.echo(', '.join(f'{value} {key}' for key, value in totals.items()))
+    click.echo(f'{len(events)} events in {elapsed:.2f}s = {len(events) / max(elapsed, 1e-9):,.0f} events/second')
+
+
+@click.command('admission-loadtest')
+@with_appcontext
+@click.option('--overload', default=10.0, show_default=True, help='Offered load as a multiple of measured capacity.')
+@click.option('--seconds', default=5.0, show_default=True, help='How long to offer load.')
+@click.option('--users', default=200, show_default=True, help='Distinct callers the requests are spread over.')
+def admission_loadtest(overload, seconds, users):
+    """Offer more bookings than SQLite's single writer can serve, with and without the admission gate.
+
+    Each request books a spot and releases it through Reservation, the write
+    path behind POST /bookings and /release, so run it against a scratch copy
+    of the database. Latency is measured from each request's scheduled send
+    time, so queueing is not hidden.
+    """
+    init_db()
+    max_workers = 256
+    # One spot per thread that can be mid-request, so bookings never fail for lack of spots
+    lot_id = ParkingLot.create('Admission load test', 10.0, '1 Load Street', '000000', max_workers)
+    conn = get_db_connection()
+    conn.executemany('INSERT OR IGNORE INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                     ((f'loadtest{number}', '!', f'loadtest{number}@example.com') for number in range(users)))
+    conn.commit()
+    user_ids = [row['id'] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'loadtest%'")]
+    conn.close()
+
+    def write(user_id):
+        reservation_id = Reservation.book_spot(lot_id, user_id)
+        if reservation_id:
+            Reservation.release_spot(reservation_id, user_id)
+
+    # Capacity: booking+release pairs per second with no contention at all
+    calibration = 50
+    started = time.perf_counter()
+    for _ in range(calibration):
+        write(random.choice(user_ids))
+    capacity = calibration / (time.perf_counter() - started)
+    total = int(capacity * overload * seconds)
+    click.echo(f'Measured capacity: {capacity:,.0f} bookings+releases/second')
+
+    for label, gate in (('no admission control', None),
+                        ('admission control', AdmissionGate(
+                            'loadtest', current_app.config['ADMISSION_WRITE_CONCURRENCY'], current_app.config['ADMISSION_QUEUE_LIMIT'],
+                            current_app.config['ADMISSION_MAX_WAIT_SECONDS'], current_app.config['ADMISSION_USER_RATE'],
+                            current_app.config['ADMISSION_USER_BURST'], current_app.config['ADMISSION_GLOBAL_RATE'],
+                            current_app.config['ADMISSION_GLOBAL_BURST']))):
+        latencies, shed, failed = [], [], []
+        started = time.perf_counter()
+
+        def request_at(scheduled):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            user_id = random.choice(user_ids)
+            try:
+                if gate is None:
+                    write(user_id)
+                else:
+                    with gate.admit(user_id):
+                        write(user_id)
+                latencies.append(time.perf_counter() - scheduled)
+            except Rejected:
+                shed.append(time.perf_counter() - scheduled)
+            except sqlite3.OperationalError:
+                # "database is locked": the busy timeout ran out while queued for the writer
+                failed.append(time.perf_counter() - scheduled)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for number in range(total):
+                pool.submit(request_at, started + number * seconds / total)
+        served = sorted(latencies)
+        p50, p99 = (served[int(len(served) * q)] * 1000 if served else 0 for q in (0.5, 0.99))
+        click.echo(f'{label:22} offered {total} at {overload:g}x: served {len(served)}, shed {len(shed)}, '
+                   f'failed {len(failed)}, p50 {p50:.0f} ms, p99 {p99:.0f} ms, '
+                   f'slowest rejection {max(shed + failed, default=0) * 1000:.0f} ms')
+
+
+@click.command('pricing-benchmark')
+@with_appcontext
+@click.option('--seconds', default=5.0, show_default=True, help='How long each lookup method is timed.')
+@click.option('--readers', default=4, show_default=True, help='Threads looking up rates.')
+@click.option('--writers', default=2, show_default=True, help='Threads booking and releasing spots meanwhile.')
+def pricing_benchmark(seconds, readers, writers):
+    """Time rate lookups from the precomputed tables against one SQL query per lookup, under booking load.
+
+    The writers make real bookings: run it against a scratch copy of the database.
+    """
+    init_db()
+    lot_ids = [lot['id'] for lot in ParkingLot.get_all()]
+    users = [user.id for user in User.iter_all_users() if user.role == 'user']
+    if not lot_ids or not users:
+        raise click.UsageError('Needs at least one parking lot and one user.')
+
+    def sql_rate(lot_id):
+        # What every lookup would cost without the tables: re-read the lot's price and counts first
+        PricingEngine.invalidate(lot_id)
+        return PricingEngine.rate(lot_id)
+
+    def look_up(rate, stop):
+        lookups = 0
+        while not stop.is_set():
+            rate(random.choice(lot_ids))
+            lookups += 1
+        return lookups
+
+    def book_and_release(stop):
+        sessions = 0
+        while not stop.is_set():
+            user_id = random.choice(users)
+            reservation_id = Reservation.book_spot(random.choice(lot_ids), user_id)
+            if reservation_id:
+                Reservation.release_spot(reservation_id, user_id)
+                sessions += 1
+        return sessions
+
+    for label, rate in (('precomputed tables', PricingEngine.rate), ('SQL per lookup', sql_rate)):
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=readers + writers) as pool:
+            lookups = [pool.submit(look_up, rate, stop) for _ in range(readers)]
+            sessions = [pool.submit(book_and_release, stop) for _ in range(writers)]
+            time.sleep(seconds)
+            stop.set()
+            lookups = sum(future.result() for future in lookups)
+            sessions = sum(future.result() for future in sessions)
+        click.echo(f'{label:20} {lookups / seconds:>12,.0f} lookups/second '
+                   f'({seconds * readers / max(lookups, 1) * 1e6:.1f} us each) '
+                   f'alongside {sessions / seconds:,.0f} bookings+releases/second')
+
+
+@click.command('availability-benchmark')
+@with_appcontext
+@click.option('--spots', default=200, show_default=True, help='Spots in the synthetic lot.')
+@click.option('--days', default=365, show_default=True, help='Days of back-to-back advance bookings.')
+@click.option('--queries', default=2000, show_default=True, help='Free-spot queries timed against the index.')
+def availability_benchmark(spots, days, queries):
+    """Time "which spot is free for [t1, t2)" over a year of dense bookings, against a linear scan.
+
+    The lot is synthetic and held in memory; the database is not touched.
+    """
+    year_start = datetime(2024, 1, 1)
+    horizon = to_seconds(year_start) + days * 86400
+    lot, bookings = LotAvailability(0), []
+    for spot_id in range(1, spots + 1):
+        lot.spot_numbers[spot_id] = spot_id
+        schedule = lot.schedules[spot_id] = SpotSchedule()
+        clock = to_seconds(year_start)
+        while True:
+            clock += random.randint(0, 2) * 3600
+            length = random.randint(1, 8) * 3600
+            if clock + length > horizon:
+                break
+            schedule.add(clock, clock + length)
+            bookings.append((spot_id, clock, clock + length))
+            clock += length
+    click.echo(f'{len(bookings):,} bookings on {spots} spots over {days} days')
+
+    windows = []
+    for _ in range(queries):
+        start = year_start + timedelta(hours=random.randrange(days * 24))
+        windows.append((start, start + timedelta(hours=random.randint(1, 8))))
+
+    def scan(start, end):
+        # What a query without the index does: look at every booking of the lot
+        start, end = to_seconds(start), to_seconds(end)
+        busy = {spot_id for spot_id, booked_from, booked_until in bookings
+                if booked_from < end and booked_until > start}
+        return next((spot_id for spot_id in lot.spot_numbers if spot_id not in busy), None)
+
+    for label, find, count in (('interval index', lot.find_spot, queries),
+                               ('linear scan', scan, min(queries, 50))):
+        started = time.perf_counter()
+        found = sum(find(start, end) is not None for start, end in windows[:count])
+        elapsed = time.perf_counter() - started
+        click.echo(f'{label:16} {elapsed / count * 1000:8.3f} ms/query ({found}/{count} windows had a free spot)')
+
+
+@click.command('archive-benchmark')
+@with_appcontext
+@click.option('--rows', default=1000000, show_default=True, help='Finished reservations to generate (e.g. 10000000).')
+@click.option('--users', default=20000, show_default=True, help='Users the reservations are spread over.')
+@click.option('--days', default=730, show_default=True, help='How far back the reservations go.')
+@click.option('--keep-days', default=30, show_default=True, help='Archive everything older than this.')
+@click.option('--queries', default=200, show_default=True, help='History and stats lookups timed per phase.')
+def archive_benchmark(rows, users, days, keep_days, queries):
+    """Time per-user history and stats queries before and after archiving the generated rows.
+
+    This writes reservations and partitions: run it against a scratch database and ARCHIVE_DIR.
+    """
+    init_db()
+    if not ParkingLot.count():
+        ParkingLot.create('Benchmark', 2.5, '1 Test Road', '560001', 50)
+    conn = get_db_connection()
+    conn.executemany('INSERT OR IGNORE INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                     ((f'bench{number}', '!', f'bench{number}@example.com') for number in range(users)))
+    conn.commit()
+    user_ids = [row['id'] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'bench%'")]
+    spot_ids = [row['id'] for row in conn.execute('SELECT id FROM parking_spots')]
+    now = datetime.utcnow().replace(microsecond=0)
+
+    def generated():
+        for _ in range(rows):
+            start = now - timedelta(seconds=random.randrange(days * 86400))
+            yield (random.choice(spot_ids), random.choice(user_ids), start.strftime(TIMESTAMP_FORMAT),
+                   (start + timedelta(hours=2)).strftime(TIMESTAMP_FORMAT), 5.0)
+
+    started = time.perf_counter()
+    conn.executemany('''
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+        VALUES (?, ?, ?, ?, ?, 'completed')
+    ''', generated())
+    conn.commit()
+    conn.close()
+    click.echo(f'Inserted {rows:,} reservations in {time.perf_counter() - started:.1f}s')
+
+    sample = random.sample(user_ids, min(queries, len(user_ids)))
+
+    def measure(label):
+        for name, query in (('history', Reservation.get_user_history), ('stats', Reservation.get_user_stats)):
+            latencies = []
+            for user_id in sample:
+                started = time.perf_counter()
+                query(user_id)
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            click.echo(f'{label:16} {name:8} p50 {latencies[len(latencies) // 2]:7.2f} ms  '
+                       f'p99 {latencies[int(len(latencies) * 0.99)]:7.2f} ms')
+
+    measure('before archiving')
+    started = time.perf_counter()
+    moved = ReservationArchive.archive_completed(keep_days)
+    click.echo(f'Archived {moved:,} rows in {time.perf_counter() - started:.1f}s')
+    measure('after archiving')
+
+@click.command('import-benchmark')
+@with_appcontext
+@click.option('--lots', default=2000, show_default=True, help='Lots to import.')
+@click.option('--spots', default=50, show_default=True, help='Spots per imported lot.')
+@click.option('--users', default=20000, show_default=True, help='Users to import (with pre-hashed passwords).')
+@click.option('--reservations', default=1000000, show_default=True, help='Historical reservations to import.')
+@click.option('--chunk-size', default=10000, show_default=True, help='Rows per transaction.')
+def import_benchmark(lots, spots, users, reservations, chunk_size):
+    """Import generated lots, users and reservation history from CSV and report rows/second per entity.
+
+    This writes real rows: run it against a scratch database.
+    """
+    init_db()
+    tag = int(time.time())
+    password_hash = generate_password_hash('benchmark')
+
+    def lot_records():
+        for number in range(lots):
+            yield {'prime_location_name': f'Import {tag}-{number}', 'price': 2.5 + number % 7,
+                   'address': f'{number} Import Road', 'pin_code': '560001', 'maximum_number_of_spots': spots}
+
+    def user_records():
+        for number in range(users):
+            yield {'username': f'import{tag}-{number}', 'email': f'import{tag}-{number}@example.com',
+                   'password_hash': password_hash}
+
+    def reservation_records():
+        conn = get_db_connection()
+        lot_ids = [row['id'] for row in conn.execute(
+            'SELECT id FROM parking_lots WHERE prime_location_name LIKE ?', (f'Import {tag}-%',))]
+        conn.close()
+        now = datetime.utcnow().replace(microsecond=0)
+        for _ in range(reservations):
+            start = now - timedelta(seconds=random.randrange(365 * 86400))
+            yield {'lot_id': random.choice(lot_ids), 'spot_number': random.randint(1, spots),
+                   'username': f'import{tag}-{random.randrange(users)}',
+                   'parking_timestamp': start.strftime(TIMESTAMP_FORMAT),
+                   'leaving_timestamp': (start + timedelta(hours=2)).strftime(TIMESTAMP_FORMAT),
+                   'parking_cost': 5.0}
+
+    for entity, records in (('lots', lot_records), ('users', user_records), ('reservations', reservation_records)):
+        # Parse from CSV text so the timing covers the same path as an uploaded file
+        stream = io.StringIO()
+        writer = None
+        for record in records():
+            if writer is None:
+                writer = csv.DictWriter(stream, fieldnames=list(record))
+                writer.writeheader()
+            writer.writerow(record)
+        stream.seek(0)
+        started = time.perf_counter()
+        result = import_file(entity, stream, 'csv', chunk_size)
+        elapsed = time.perf_counter() - started
+        click.echo(f'{str(result):70} {elapsed:7.2f}s = {result.processed / max(elapsed, 1e-9):>10,.0f} rows/second')
+
+@click.command('page-benchmark')
+@with_appcontext
+@click.option('--spots', default=20000, show_default=True, help='Spots in the generated lot.')
+@click.option('--users', default=50000, show_default=True, help='Users in the generated user table.')
+@click.option('--repeat', default=5, show_default=True, help='Requests timed per page and rendering mode.')
+def page_benchmark(spots, users, repeat):
+    """Time-to-first-byte, total time and peak Python memory of the large admin pages,
+    streamed (stream_template) and fully rendered first (render_template).
+
+    This writes a lot, its spots, active reservations and users: run it against a scratch database.
+    """
+    init_db()
+    lot_id = ParkingLot.create('Page benchmark', 2.5, '1 Test Road', '560001', spots)
+    conn = get_db_connection()
+    conn.executemany('INSERT OR IGNORE INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                     ((f'page{number}', '!', f'page{number}@example.com') for number in range(users)))
+    # Occupy every other spot so the Current Reservations table is as long as the layout allows
+    user_ids = [row['id'] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'page%'")]
+    occupied = [row['id'] for row in conn.execute(
+        'SELECT id FROM parking_spots WHERE lot_id = ? AND spot_number % 2 = 0', (lot_id,))]
+    conn.executemany("UPDATE parking_spots SET status = 'O' WHERE id = ?", ((spot_id,) for spot_id in occupied))
+    conn.executemany("INSERT INTO reservations (spot_id, user_id, status) VALUES (?, ?, 'active')",
+                     ((spot_id, user_ids[number % len(user_ids)]) for number, spot_id in enumerate(occupied)))
+    admin_id = conn.execute("SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1").fetchone()['id']
+    conn.commit()
+    conn.close()
+
+    def rendered_page(template_name, **context):
+        # What these routes did before streaming: materialize every row, then render the whole page
+        return render_template(template_name, **{key: list(value) if isinstance(value, types.GeneratorType) else value
+                                                 for key, value in context.items()})
+
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    pages = (('dashboard', '/admin/dashboard'), ('users', '/admin/users'), ('view lot', f'/admin/view_lot/{lot_id}'))
+    for label, render in (('render_template', rendered_page), ('stream_template', None)):
+        for name, url in pages:
+            first_byte, total, peak, size = [], [], 0, 0
+            # The last run is traced for peak memory; tracemalloc slows it down too much to time
+            for run in range(repeat + 1):
+                traced = run == repeat
+                if traced:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                with mock.patch.object(admin_controller, 'stream_page', render or admin_controller.stream_page):
+                    response = client.get(url, buffered=False)
+                    chunks = iter(response.response)
+                    size = len(next(chunks, b''))
+                    if not traced:
+                        first_byte.append(time.perf_counter() - started)
+                    size += sum(len(chunk) for chunk in chunks)
+                if traced:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                else:
+                    total.append(time.perf_counter() - started)
+                response.close()
+            click.echo(f'{label:16} {name:9} TTFB {statistics.median(first_byte) * 1000:8.1f} ms  '
+                       f'total {statistics.median(total) * 1000:8.1f} ms  '
+                       f'peak {peak / 2 ** 20:7.1f} MiB  {size / 2 ** 20:6.1f} MiB sent')
+
+@click.command('waitlist-simulation')
+@with_appcontext
+@click.option('--spots', default=20, show_default=True, help='Spots in the simulated lot.')
+@click.option('--drivers', default=60, show_default=True, help='Drivers competing for them.')
+@click.option('--seconds', default=10.0, show_default=True, help='How long demand is sustained.')
+@click.option('--park-ms', default=200.0, show_default=True, help='Mean time a driver stays parked.')
+@click.option('--retry-ms', default=100.0, show_default=True, help='How often a driver retries a full lot without the waitlist.')
+def waitlist_simulation(spots, drivers, seconds, park_ms, retry_ms):
+    """Sustained over-demand on one lot: retrying book_spot against joining the waitlist.
+
+    Every driver parks, leaves and comes straight back, so demand stays at `drivers`
+    for `spots` spots. Reports SQL statements per parking session and wait times.
+    This writes real reservations: run it against a scratch database.
+    """
+    init_db()
+    lot_id = ParkingLot.create('Waitlist simulation', 2.5, '1 Test Road', '560001', spots)
+    conn = get_db_connection()
+    conn.executemany('INSERT OR IGNORE INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                     ((f'waiter{number}', '!', f'waiter{number}@example.com') for number in range(drivers)))
+    conn.commit()
+    user_ids = [row['id'] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'waiter%'")][:drivers]
+    conn.close()
+
+    statements, timeouts = [0], [0]
+    connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        # Every model opens its connection through sqlite3.connect: count what runs on them
+        db = connect(*args, **kwargs)
+        db.set_trace_callback(lambda sql: statements.__setitem__(0, statements[0] + 1))
+        return db
+
+    def attempt(call, *args):
+        # Under heavy contention a writer can time out waiting for the lock; count it and try again
+        while True:
+            try:
+                return call(*args)
+            except sqlite3.OperationalError:
+                timeouts[0] += 1
+
+    def retry_until_parked(user_id, stop):
+        while not stop.is_set():
+            reservation_id = attempt(Reservation.book_spot, lot_id, user_id)
+            if reservation_id:
+                return reservation_id
+            time.sleep(retry_ms / 1000.0)
+
+    def wait_in_line(user_id, stop):
+        while not stop.is_set():
+            reservation_id = attempt(Reservation.book_spot, lot_id, user_id)
+            if reservation_id:
+                return reservation_id
+            entry_id = attempt(Waitlist.join, lot_id, user_id)
+            if entry_id is None:
+                continue
+            while not stop.is_set():
+                if Waitlist.wait_for_offer([entry_id], 1.0):
+                    if attempt(Waitlist.claim, entry_id, user_id):
+                        return Reservation.get_user_active_reservations(user_id)[0].id
+                    break
+            else:
+                attempt(Waitlist.leave, entry_id, user_id)
+
+    for label, park in (('retry book_spot', retry_until_parked), ('waitlist', wait_in_line)):
+        waits, stop = [], threading.Event()
+
+        def drive(user_id):
+            while not stop.is_set():
+                started = time.perf_counter()
+                reservation_id = park(user_id, stop)
+                if reservation_id is None:
+                    return
+                waits.append(time.perf_counter() - started)
+                time.sleep(random.expovariate(1000.0 / park_ms))
+                attempt(Reservation.release_spot, reservation_id, user_id)
+
+        statements[0] = timeouts[0] = 0
+        with mock.patch('sqlite3.connect', counting_connect), ThreadPoolExecutor(max_workers=drivers) as pool:
+            futures = [pool.submit(drive, user_id) for user_id in user_ids]
+            time.sleep(seconds)
+            stop.set()
+            for future in futures:
+                future.result()
+        waits.sort()
+        sessions = max(len(waits), 1)
+        p50, p99 = (waits[int(len(waits) * q)] * 1000 if waits else 0 for q in (0.5, 0.99))
+        click.echo(f'{label:16} {len(waits):>6} sessions  {statements[0] / seconds:>8,.0f} statements/s  '
+                   f'{statements[0] / sessions:6.1f} per session  {timeouts[0]} lock timeouts  '
+                   f'wait p50 {p50:6.0f} ms  p99 {p99:6.0f} ms')
+        # Leave the lot empty and the queue clear for the next mode
+        conn = get_db_connection()
+        conn.execute("UPDATE waitlist SET status = 'cancelled' WHERE lot_id = ? AND status IN ('waiting', 'offered')",
+                     (lot_id,))
+        conn.commit()
+        conn.close()
+        Waitlist.expire_holds(lot_id)
+
+
+COMMANDS = (availability_benchmark, waitlist_simulation, archive_benchmark, import_benchmark, page_benchmark,
+            api_benchmark, gate_replay, admission_loadtest, pricing_benchmark)
+
+
+def register_commands(app):
+    for command in COMMANDS:
+        app.cli.add_command(command)
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import secrets
 
@@ -5,6 +6,56 @@ class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_urlsafe(32)
     DATABASE_PATH = os.environ.get('DATABASE_PATH') or 'parking_app.db'
+    # Background sweep of active reservations (models/scheduler.py)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') == '1'  # Background jobs in every worker
+    SWEEP_INTERVAL_SECONDS = int(os.environ.get('SWEEP_INTERVAL_SECONDS', 300))
+    SWEEP_BATCH_SIZE = 500
+    OVERSTAY_HOURS = 24  # Sessions longer than this are flagged as overstays
+    ABANDON_HOURS = 72   # Sessions longer than this are closed automatically
+    # A spot freed for the next person on a lot's waitlist is held this long before moving on
+    WAITLIST_HOLD_MINUTES = 10
+    WAITLIST_SWEEP_SECONDS = 30
+    WAITLIST_STREAM_SECONDS = 25  # How long one notification stream waits before the browser reconnects
+    # Open notification streams per worker; each holds a thread, so keep it below the worker's
+    # thread count (gunicorn --threads). Sync workers never hold streams: browsers poll instead
+    WAITLIST_MAX_STREAMS = int(os.environ.get('WAITLIST_MAX_STREAMS', 32))
+    # Finished reservations older than this move to monthly columnar files under ARCHIVE_DIR
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or 'archive'
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+    ARCHIVE_INTERVAL_SECONDS = 24 * 3600
+    # Compiled Jinja templates are cached here so new workers skip template compilation
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR') or \
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jinja_cache')
+    # Per-lot spot counts shared by all worker processes (models/availability_board.py).
+    # The default name is derived from the database path so two deployments never share a board.
+    AVAILABILITY_BOARD_ENABLED = os.environ.get('AVAILABILITY_BOARD_ENABLED', '1') == '1'
+    AVAILABILITY_BOARD_NAME = os.environ.get('AVAILABILITY_BOARD_NAME') or \
+        'parking_board_' + hashlib.sha1(os.path.abspath(DATABASE_PATH).encode()).hexdigest()[:12]
+    AVAILABILITY_BOARD_CAPACITY = 4096  # Maximum number of lots the board can hold
+    # Entry/exit events from license-plate readers (POST /api/v1/gate_events, X-Gate-Token header).
+    # Ingestion is disabled until a token is set.
+    GATE_API_TOKEN = os.environ.get('GATE_API_TOKEN')
+    GATE_DEDUP_WINDOW_SECONDS = 30  # Repeat reads of a plate within this window are ignored
+    GATE_BATCH_SIZE = 500           # Events applied per write transaction
+    # Admission control for booking/release and login (models/admission.py). Requests over a
+    # caller's or the global rate, or that would queue too long for a slot, get 429/503 + Retry-After.
+    ADMISSION_ENABLED = True
+    ADMISSION_USER_RATE = 2.0           # Sustained bookings/releases per second per user
+    ADMISSION_USER_BURST = 10
+    ADMISSION_LOGIN_RATE = 0.5          # Login attempts per second per username and client address
+    ADMISSION_LOGIN_BURST = 5
+    ADMISSION_GLOBAL_RATE = 500.0       # Per worker, all callers together
+    ADMISSION_GLOBAL_BURST = 1000
+    ADMISSION_WRITE_CONCURRENCY = 2     # SQLite has one writer; a second slot overlaps request parsing
+    ADMISSION_LOGIN_CONCURRENCY = os.cpu_count() or 2  # Password hashing is CPU bound
+    ADMISSION_QUEUE_LIMIT = 32
+    ADMISSION_MAX_WAIT_SECONDS = 2.0
+    # Hourly rate = lot price x occupancy multiplier x hour-of-day multiplier (models/pricing.py),
+    # locked in on each reservation when it is booked. Off, every lot charges its base price.
+    PRICING_ENABLED = os.environ.get('PRICING_ENABLED', '1') == '1'
+    PRICING_UTC_OFFSET_HOURS = int(os.environ.get('PRICING_UTC_OFFSET_HOURS', 0))  # Local time of the lots
+    PRICING_HOUR_MULTIPLIERS = [0.8] * 6 + [1.0] * 2 + [1.25] * 3 + [1.0] * 6 + [1.25] * 3 + [1.0] * 2 + [0.8] * 2
+    PRICING_OCCUPANCY_TIERS = [(0.0, 0.9), (0.5, 1.0), (0.75, 1.25), (0.9, 1.5)]  # (occupied fraction, multiplier)
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -26,6 +77,11 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     DATABASE_PATH = ':memory:'  # In-memory database for tests
+    SCHEDULER_ENABLED = False
+    JINJA_BYTECODE_CACHE_DIR = None
+    AVAILABILITY_BOARD_ENABLED = False
+    ADMISSION_ENABLED = False
+    PRICING_ENABLED = False
     SECRET_KEY = 'testing-secret-key-not-for-production'
 
 # Configuration dictionary
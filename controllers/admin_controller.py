@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, stream_template, request, redirect, url_for, flash, get_flashed_messages, Response, stream_with_context
 from flask_login import login_required, current_user
 from models.parking_lot import ParkingLot
 from models.user import User
 from models.reservation import Reservation
+from models.export import DATASETS, FORMATS, stream_export
+from models.importer import ENTITIES, import_file
+import io
 from datetime import datetime # This import is already there, but crucial
 
 admin_bp = Blueprint('admin', __name__)
@@ -16,27 +19,47 @@ def admin_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def _coalesce(chunks, size=16384):
+    # Jinja yields a piece per template expression; sending ~16 KB at a time
+    # keeps the per-chunk WSGI overhead from dominating large tables
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_page(template_name, **context):
+    # Pop flashed messages before the response starts: the session cookie is
+    # written with the headers, so flashes consumed later while streaming
+    # would otherwise be shown again on the next page
+    get_flashed_messages(with_categories=True)
+    return Response(_coalesce(stream_template(template_name, **context)))
+
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
 def dashboard():
     # This dashboard now focuses on the parking lot records table
-    parking_lots = ParkingLot.get_all()
-    print(parking_lots)
-    return render_template('admin_dashboard.html', 
-                           parking_lots=parking_lots)
+    # Rows are streamed into the page as they are read from the database
+    return stream_page('admin_dashboard.html',
+                       parking_lots=ParkingLot.iter_all(),
+                       lot_count=ParkingLot.count(),
+                       export_formats=FORMATS)
 
 @admin_bp.route('/summary')
 @login_required
 @admin_required
 def summary():
     # This page will show the summary statistics and charts
-    parking_lots = ParkingLot.get_all() # Needed to get total lots for summary card
-    total_users = len(User.get_all_users())
+    total_users = User.count()
     active_reservations = Reservation.get_active_count()
     
     return render_template('admin_summary.html', 
-                           total_parking_lots=len(parking_lots), # Pass count directly
+                           total_parking_lots=ParkingLot.count(),
                            total_users=total_users,
                            active_reservations=active_reservations)
 
@@ -113,47 +136,50 @@ def delete_lot(lot_id):
 @admin_required
 def view_lot(lot_id):
     lot = ParkingLot.get_by_id(lot_id)
-    spots = ParkingLot.get_spots_by_lot_id(lot_id)
-    
-    # Prepare spot_reservations for view_spots.html
-    spot_reservations = {}
-    for spot in spots:
-        if spot['user_id']: # If there's an active reservation for this spot
-            # Create dummy objects for nested access in template
-            class DummyParkingSpot:
-                def __init__(self, spot_number, parking_lot):
-                    self.spot_number = spot_number
-                    self.parking_lot = parking_lot
-            class DummyParkingLot:
-                def __init__(self, prime_location_name, price):
-                    self.prime_location_name = prime_location_name
-                    self.price = price
-            class DummyUser:
-                def __init__(self, username):
-                    self.username = username
-
+    if not lot:
+        flash('Parking lot not found!', 'error')
+        return redirect(url_for('admin.dashboard'))
+    spot_counts = ParkingLot.get_spot_counts(lot_id)
+
+    # Create dummy objects for nested access in template
+    class DummyParkingSpot:
+        def __init__(self, spot_number, parking_lot):
+            self.spot_number = spot_number
+            self.parking_lot = parking_lot
+    class DummyParkingLot:
+        def __init__(self, prime_location_name, price):
+            self.prime_location_name = prime_location_name
+            self.price = price
+    class DummyUser:
+        def __init__(self, username):
+            self.username = username
+
+    def spot_reservations():
+        # Active reservations for the "Current Reservations" table, built one row at a time
+        for spot in ParkingLot.iter_spots_by_lot_id(lot_id):
+            if not spot['user_id']: # No active reservation for this spot
+                continue
             r_dict = dict(spot) # Convert Row object to dict
             if isinstance(r_dict['parking_timestamp'], str):
                 r_dict['parking_timestamp'] = datetime.strptime(r_dict['parking_timestamp'], '%Y-%m-%d %H:%M:%S')
             
             r_dict['parking_spot'] = DummyParkingSpot(r_dict['spot_number'], DummyParkingLot(lot['prime_location_name'], lot['price']))
             r_dict['user'] = DummyUser(r_dict['username'])
-            
-            spot_reservations[spot['id']] = type('ReservationObject', (object,), r_dict)()
+            yield type('ReservationObject', (object,), r_dict)()
 
-    return render_template('view_spots.html', 
-                           lot=lot, 
-                           spots=spots, 
-                           spot_reservations=spot_reservations,
-                           moment=datetime # Pass datetime as 'moment' to the template
-                          )
+    return stream_page('view_spots.html', 
+                       lot=lot, 
+                       spots=ParkingLot.iter_spots_by_lot_id(lot_id), 
+                       spot_counts=spot_counts,
+                       spot_reservations=spot_reservations(),
+                       moment=datetime # Pass datetime as 'moment' to the template
+                      )
 
 @admin_bp.route('/users')
 @login_required
 @admin_required
 def view_users():
-    users = User.get_all_users()
-    return render_template('admin_users.html', users=users)
+    return stream_page('admin_users.html', users=User.iter_all_users(), user_count=User.count())
 
 @admin_bp.route('/update_user_role/<int:user_id>', methods=['POST'])
 @login_required
@@ -176,3 +202,54 @@ def update_user_role(user_id):
         flash(f'Failed to update role for {user_to_update.username}.', 'error')
     
     return redirect(url_for('admin.view_users'))
+
+@admin_bp.route('/export/<dataset>')
+@login_required
+@admin_required
+def export(dataset):
+    fmt = request.args.get('format', 'csv')
+    if dataset not in DATASETS or fmt not in FORMATS:
+        flash('Unknown export type!', 'error')
+        return redirect(url_for('admin.dashboard'))
+
+    # Optional date range (YYYY-MM-DD) on parking_timestamp for reservation exports
+    since = request.args.get('since') or None
+    until = request.args.get('until') or None
+    try:
+        for value in (since, until):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format!', 'error')
+        return redirect(url_for('admin.dashboard'))
+
+    # Rows are read with fetchmany and written chunk by chunk, so memory use
+    # does not grow with the size of the export
+    body = stream_export(dataset, fmt, since=since, until=until)
+    filename = f'{dataset}.{fmt}'
+    return Response(stream_with_context(body), mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@admin_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_data():
+    result = None
+    if request.method == 'POST':
+        entity = request.form.get('entity')
+        upload = request.files.get('file')
+        if entity not in ENTITIES or not upload or not upload.filename:
+            flash('Please choose what to import and a file!', 'error')
+            return render_template('admin_import.html', entities=ENTITIES, result=None)
+
+        fmt = 'ndjson' if upload.filename.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+        # Decode the upload as a stream so large files are processed chunk by chunk
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        try:
+            result = import_file(entity, stream, fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(f'Import failed: {e}', 'error')
+            return render_template('admin_import.html', entities=ENTITIES, result=None)
+        flash(f'Import finished - {result}', 'success' if not result.errors else 'warning')
+
+    return render_template('admin_import.html', entities=ENTITIES, result=result)
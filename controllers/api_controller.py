@@ -2,6 +2,9 @@ from flask import Blueprint, jsonify
 from flask_login import login_required, current_user
 from models.parking_lot import ParkingLot
 from models.reservation import Reservation
+from models.scheduler import Scheduler, scheduler
+from models.archive import ReservationArchive
+from models import admission
 
 api_bp = Blueprint('api', __name__)
 
@@ -27,3 +30,34 @@ def parking_stats():
         }
     
     return jsonify(stats)
+
+@api_bp.route('/scheduler_metrics')
+@login_required
+def scheduler_metrics():
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Access denied!'}), 403
+
+    jobs = []
+    for job in Scheduler.get_job_table():
+        job_dict = dict(job)
+        local = scheduler.metrics.get(job['name'])
+        job_dict['this_worker'] = local.as_dict() if local else None
+        jobs.append(job_dict)
+    return jsonify({'jobs': jobs})
+
+@api_bp.route('/archive_summary')
+@login_required
+def archive_summary():
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Access denied!'}), 403
+
+    return jsonify({'months': ReservationArchive.monthly_summary()})
+
+@api_bp.route('/admission_metrics')
+@login_required
+def admission_metrics():
+    if current_user.role != 'admin':
+        return jsonify({'message': 'Access denied!'}), 403
+
+    # Counters of the worker that served the request
+    return jsonify({'gates': [gate.as_dict() for gate in admission.gates.values()]})
@@ -0,0 +1,185 @@
+from flask import Blueprint, Response, request, abort, url_for, current_app
+from flask_login import login_required, current_user
+from datetime import datetime
+import hmac
+import json
+from models.reservation import Reservation
+from models.availability import TIMESTAMP_FORMAT
+from models.gate import GateIngestor
+from models.admission import admission_control
+from models.api_resources import (LOT_FIELDS, COUNT_FIELDS, SPOT_FIELDS, OCCUPANT_FIELDS, RESERVATION_FIELDS,
+                                  parse_fields, select_lots, select_spots, select_reservation,
+                                  select_user_reservations)
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is only offered when the msgpack package is installed
+    msgpack = None
+
+api_v1_bp = Blueprint('api_v1', __name__)
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+MAX_HISTORY_LIMIT = 100
+MAX_GATE_EVENTS = 10000  # Per request; larger replays are split by the sender
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    raise TypeError(f'{type(value).__name__} is not serializable')
+
+
+def serialize(payload, mimetype=JSON_MIMETYPE):
+    if mimetype in MSGPACK_MIMETYPES:
+        return msgpack.packb(payload, default=_default)
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def _negotiate():
+    offered = [JSON_MIMETYPE] + (list(MSGPACK_MIMETYPES) if msgpack is not None else [])
+    return request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+
+
+def api_response(payload, status=200, headers=None):
+    mimetype = _negotiate()
+    response = Response(serialize(payload, mimetype), status=status, mimetype=mimetype, headers=headers)
+    response.vary.add('Accept')
+    if request.method == 'GET' and status == 200:
+        # Clients revalidate with If-None-Match and get an empty 304 when nothing changed
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+def api_error(message, status):
+    return api_response({'message': message}, status)
+
+
+def _fields(allowed, default):
+    try:
+        return parse_fields(request.args.get('fields'), allowed, default)
+    except ValueError as e:
+        abort(api_error(str(e), 400))
+
+
+def _user_only():
+    if current_user.role != 'user':
+        abort(api_error('Access denied!', 403))
+
+
+@api_v1_bp.errorhandler(401)
+def unauthorized(error):
+    return api_error('Login required!', 401)
+
+
+@api_v1_bp.route('/lots')
+@login_required
+def list_lots():
+    return api_response({'lots': select_lots(_fields(LOT_FIELDS, LOT_FIELDS))})
+
+
+@api_v1_bp.route('/lots/<int:lot_id>')
+@login_required
+def get_lot(lot_id):
+    lots = select_lots(_fields(LOT_FIELDS, LOT_FIELDS), lot_id)
+    if not lots:
+        return api_error('Parking lot not found!', 404)
+    return api_response(lots[0])
+
+
+@api_v1_bp.route('/availability')
+@login_required
+def availability():
+    # The lot list trimmed to its counts by default; served from the shared board when it is attached
+    return api_response({'lots': select_lots(_fields(LOT_FIELDS, ('id',) + COUNT_FIELDS))})
+
+
+@api_v1_bp.route('/lots/<int:lot_id>/spots')
+@login_required
+def list_spots(lot_id):
+    fields = _fields(SPOT_FIELDS, ('id', 'spot_number', 'status'))
+    if current_user.role != 'admin' and any(name in OCCUPANT_FIELDS for name in fields):
+        return api_error('Access denied!', 403)
+    if not select_lots(['id'], lot_id):
+        return api_error('Parking lot not found!', 404)
+    return api_response({'lot_id': lot_id, 'spots': select_spots(lot_id, fields)})
+
+
+@api_v1_bp.route('/lots/<int:lot_id>/bookings', methods=['POST'])
+@login_required
+@admission_control('writes')
+def create_booking(lot_id):
+    _user_only()
+    reservation_id = Reservation.book_spot(lot_id, current_user.id)
+    if not reservation_id:
+        return api_error('No available spots in this parking lot!', 409)
+    reservation = select_reservation(reservation_id, current_user.id, list(RESERVATION_FIELDS))
+    return api_response(reservation, 201,
+                        {'Location': url_for('api_v1.get_reservation', reservation_id=reservation_id)})
+
+
+@api_v1_bp.route('/reservations')
+@login_required
+def list_reservations():
+    _user_only()
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_HISTORY_LIMIT)
+    except ValueError:
+        return api_error('limit must be an integer', 400)
+    fields = _fields(RESERVATION_FIELDS, RESERVATION_FIELDS)
+    return api_response({'reservations': select_user_reservations(current_user.id, fields, limit)})
+
+
+@api_v1_bp.route('/reservations/<int:reservation_id>')
+@login_required
+def get_reservation(reservation_id):
+    _user_only()
+    reservation = select_reservation(reservation_id, current_user.id, _fields(RESERVATION_FIELDS, RESERVATION_FIELDS))
+    if not reservation:
+        return api_error('Reservation not found!', 404)
+    return api_response(reservation)
+
+
+@api_v1_bp.route('/reservations/<int:reservation_id>/release', methods=['POST'])
+@login_required
+@admission_control('writes')
+def release_reservation(reservation_id):
+    _user_only()
+    success, _ = Reservation.release_spot(reservation_id, current_user.id)
+    if not success:
+        return api_error('Invalid reservation!', 404)
+    return api_response(select_reservation(reservation_id, current_user.id, list(RESERVATION_FIELDS)))
+
+
+@api_v1_bp.route('/gate_events', methods=['POST'])
+def gate_events():
+    # Gate controllers are machines, not users: they authenticate with a shared token
+    token = current_app.config.get('GATE_API_TOKEN')
+    if not token:
+        return api_error('Gate ingestion is disabled!', 403)
+    if not hmac.compare_digest(request.headers.get('X-Gate-Token', ''), token):
+        return api_error('Access denied!', 403)
+
+    if request.mimetype in MSGPACK_MIMETYPES and msgpack is not None:
+        try:
+            body = msgpack.unpackb(request.get_data())
+        except ValueError:
+            body = None
+    else:
+        body = request.get_json(silent=True)
+    events = body.get('events') if isinstance(body, dict) else body
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        return api_error('Expected {"events": [...]} with one object per event', 400)
+    if len(events) > MAX_GATE_EVENTS:
+        return api_error(f'At most {MAX_GATE_EVENTS} events per request', 413)
+    return api_response(GateIngestor.ingest(events).as_dict())
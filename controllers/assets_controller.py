@@ -0,0 +1,73 @@
+from flask import Blueprint, request, send_from_directory, url_for, abort
+import json
+import mimetypes
+import os
+import assets
+
+assets_bp = Blueprint('assets', __name__)
+
+ONE_YEAR = 365 * 24 * 3600
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+_manifest = None
+_manifest_mtime = None
+
+
+def load_manifest():
+    # Re-read only when a new build has replaced the manifest
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.path.getmtime(assets.MANIFEST_PATH)
+    except OSError:
+        _manifest, _manifest_mtime = {}, None
+        return _manifest
+    if mtime != _manifest_mtime:
+        with open(assets.MANIFEST_PATH) as f:
+            _manifest = json.load(f)
+        _manifest_mtime = mtime
+    return _manifest
+
+
+@assets_bp.app_template_global()
+def asset_url(filename):
+    """URL for a file under static/: fingerprinted if built, else the plain static
+    file, else (for vendor files not fetched yet) the pinned CDN URL."""
+    entry = load_manifest().get(filename)
+    if entry:
+        return url_for('assets.serve', filename=entry['file'])
+    if filename in assets.VENDOR_ASSETS and not os.path.exists(os.path.join(assets.STATIC_DIR, filename)):
+        return assets.VENDOR_ASSETS[filename]
+    return url_for('static', filename=filename)
+
+
+@assets_bp.app_template_global()
+def image_srcset(filename, image_format):
+    # Responsive WebP/AVIF variants produced by the build, or '' if there are none
+    entry = load_manifest().get(filename) or {}
+    return ', '.join(f"{url_for('assets.serve', filename=path)} {width}w"
+                     for path, width in entry.get(image_format, []))
+
+
+@assets_bp.route('/assets/<path:filename>')
+def serve(filename):
+    full_path = os.path.join(assets.DIST_DIR, filename)
+    if not os.path.isfile(full_path):
+        abort(404)
+
+    # Serve the pre-compressed variant the client accepts, if the build produced one
+    send_name, encoding = filename, None
+    for candidate, suffix in ENCODING_SUFFIXES.items():
+        # The quality the client gives this coding; 0 if it is missing or refused (gzip;q=0)
+        if request.accept_encodings[candidate] > 0 and os.path.isfile(full_path + suffix):
+            send_name, encoding = filename + suffix, candidate
+            break
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(assets.DIST_DIR, send_name, mimetype=mimetype,
+                                   max_age=ONE_YEAR, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # File names change with their content, so browsers never need to revalidate
+    response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+    return response
@@ -1,10 +1,17 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, current_user
 from models.user import User
+from models.admission import admission_control
 
 auth_bp = Blueprint('auth', __name__)
 
+def _login_key():
+    # Per account and address: clients sharing an address (NAT, a reverse proxy)
+    # do not use up each other's attempts, and guessing one password stays limited
+    return f"{request.form.get('username', '').strip().lower()}@{request.remote_addr}"
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@admission_control('login', key=_login_key)
 def login():
     if current_user.is_authenticated:
         if current_user.role == 'admin':
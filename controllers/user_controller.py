@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, stream_with_context
 from flask_login import login_required, current_user
 from models.parking_lot import ParkingLot
 from models.reservation import Reservation
+from models.waitlist import Waitlist
+from models.vehicle import Vehicle
+from models.pricing import PricingEngine
+from models.admission import admission_control
 from datetime import datetime # Added this import to fix NameError
+import sys
 
 user_bp = Blueprint('user', __name__)
 
@@ -21,33 +26,48 @@ def user_required(f):
 def dashboard():
     available_lots = ParkingLot.get_available_lots()
     current_reservations = Reservation.get_user_active_reservations(current_user.id)
+    upcoming_reservations = Reservation.get_user_upcoming_reservations(current_user.id)
+    waitlist_entries = Waitlist.get_user_entries(current_user.id)
+    full_lots = ParkingLot.get_full_lots()
+    waitlist_lengths = {lot['id']: Waitlist.queue_length(lot['id']) for lot in full_lots}
     parking_history = Reservation.get_user_history(current_user.id)
+    vehicles = Vehicle.get_user_vehicles(current_user.id)
     
     # Prepare lot_availability for the template
     lot_availability = {lot['id']: lot['available_spots'] for lot in available_lots}
+    # Rate a booking made now would lock in
+    lot_rates = PricingEngine.rates([lot['id'] for lot in available_lots] + [lot['id'] for lot in full_lots])
 
     return render_template('user_dashboard.html',
                            available_lots=available_lots,
                            current_reservations=current_reservations,
+                           upcoming_reservations=upcoming_reservations,
+                           waitlist_entries=waitlist_entries,
+                           full_lots=full_lots,
+                           waitlist_lengths=waitlist_lengths,
                            parking_history=parking_history,
+                           vehicles=vehicles,
                            lot_availability=lot_availability,
+                           lot_rates=lot_rates,
                            moment=datetime # Pass datetime for utcnow() in template
                           )
 
 @user_bp.route('/book_spot/<int:lot_id>', methods=['POST'])
 @login_required
 @user_required
+@admission_control('writes')
 def book_spot(lot_id):
     if Reservation.book_spot(lot_id, current_user.id):
         flash('Parking spot booked successfully!', 'success')
     else:
-        flash('No available spots in this parking lot!', 'error')
+        flash('No available spots in this parking lot! Join its waitlist and we will hold the next free spot for you.', 'error')
     
     return redirect(url_for('user.dashboard'))
 
 @user_bp.route('/release_spot/<int:reservation_id>', methods=['POST'])
 @login_required
 @user_required
+@admission_control('writes')
 def release_spot(reservation_id):
     success, cost = Reservation.release_spot(reservation_id, current_user.id)
     
@@ -57,3 +77,143 @@ def release_spot(reservation_id):
         flash('Invalid reservation!', 'error')
     
     return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/reserve_spot/<int:lot_id>', methods=['POST'])
+@login_required
+@user_required
+def reserve_spot(lot_id):
+    # datetime-local inputs; all timestamps in the app are UTC
+    try:
+        start_time = datetime.strptime(request.form['start_time'], '%Y-%m-%dT%H:%M')
+        end_time = datetime.strptime(request.form['end_time'], '%Y-%m-%dT%H:%M')
+    except (KeyError, ValueError):
+        flash('Please enter a valid start and end time!', 'error')
+        return redirect(url_for('user.dashboard'))
+
+    if start_time < datetime.utcnow().replace(second=0, microsecond=0) or end_time <= start_time:
+        flash('The reservation window must be in the future and end after it starts!', 'error')
+    elif Reservation.reserve_spot(lot_id, current_user.id, start_time, end_time):
+        flash(f'Spot reserved from {start_time:%Y-%m-%d %H:%M} to {end_time:%Y-%m-%d %H:%M} (UTC)!', 'success')
+    else:
+        flash('No spots are free in this parking lot for that time window!', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/check_in/<int:reservation_id>', methods=['POST'])
+@login_required
+@user_required
+def check_in(reservation_id):
+    if Reservation.check_in(reservation_id, current_user.id):
+        flash('Checked in! Your parking session has started.', 'success')
+    else:
+        flash('This reservation cannot be checked in right now!', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/cancel_reservation/<int:reservation_id>', methods=['POST'])
+@login_required
+@user_required
+def cancel_reservation(reservation_id):
+    if Reservation.cancel_reservation(reservation_id, current_user.id):
+        flash('Reservation cancelled.', 'info')
+    else:
+        flash('Invalid reservation!', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/waitlist/join/<int:lot_id>', methods=['POST'])
+@login_required
+@user_required
+def join_waitlist(lot_id):
+    entry_id = Waitlist.join(lot_id, current_user.id)
+    if entry_id:
+        flash('You are on the waitlist. We will hold the next free spot for you.', 'success')
+    elif Reservation.book_spot(lot_id, current_user.id):
+        # A spot freed up in the meantime
+        flash('Parking spot booked successfully!', 'success')
+    else:
+        flash('Could not join the waitlist for this parking lot!', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/vehicles/add', methods=['POST'])
+@login_required
+@user_required
+def add_vehicle():
+    if Vehicle.add(current_user.id, request.form.get('plate', '')):
+        flash('Vehicle registered!', 'success')
+    else:
+        flash('Invalid license plate, or it is already registered!', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/vehicles/remove/<int:vehicle_id>', methods=['POST'])
+@login_required
+@user_required
+def remove_vehicle(vehicle_id):
+    if Vehicle.remove(vehicle_id, current_user.id):
+        flash('Vehicle removed.', 'info')
+    else:
+        flash('Invalid vehicle!', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/waitlist/leave/<int:entry_id>', methods=['POST'])
+@login_required
+@user_required
+def leave_waitlist(entry_id):
+    if Waitlist.leave(entry_id, current_user.id):
+        flash('You have left the waitlist.', 'info')
+    else:
+        flash('Invalid waitlist entry!', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/waitlist/claim/<int:entry_id>', methods=['POST'])
+@login_required
+@user_required
+def claim_spot(entry_id):
+    if Waitlist.claim(entry_id, current_user.id):
+        flash('Parking spot booked successfully!', 'success')
+    else:
+        flash('This hold has expired and the spot was passed on.', 'error')
+
+    return redirect(url_for('user.dashboard'))
+
+def _green_threads():
+    # gevent and eventlet workers patch socket: a held stream then costs a greenlet, not a thread
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey and gevent_monkey.is_module_patched('socket'):
+        return True
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    return bool(eventlet_patcher and eventlet_patcher.is_monkey_patched('socket'))
+
+@user_bp.route('/waitlist/events')
+@login_required
+@user_required
+def waitlist_events():
+    # Server-sent events: the dashboard waits here instead of polling book_spot.
+    # Only entries still waiting count, so an offer already on the page does not
+    # make it reload again and again
+    entry_ids = Waitlist.waiting_entry_ids(current_user.id)
+    # Holding a stream needs a threaded or async worker (gunicorn --threads, gevent). A sync
+    # worker has one thread, so a held stream would take the whole worker: there the page
+    # is answered at once and the browser polls every stream_retry_ms instead
+    can_hold = request.environ.get('wsgi.multithread') or _green_threads()
+
+    def events():
+        # EventSource reconnects after `retry` ms when the stream ends
+        yield f'retry: {Waitlist.stream_retry_ms}\n\n'
+        if can_hold and Waitlist.stream_slots.acquire(blocking=False):
+            try:
+                offered = Waitlist.wait_for_offer(entry_ids, Waitlist.stream_seconds)
+            finally:
+                Waitlist.stream_slots.release()
+        else:
+            # A sync worker, or every stream slot in this worker is taken: check once and let the browser retry
+            offered = Waitlist.wait_for_offer(entry_ids, 0)
+        if offered or not entry_ids:
+            yield 'event: offer\ndata: {}\n\n'
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
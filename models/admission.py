@@ -0,0 +1,192 @@
+from flask import request, jsonify, make_response
+from flask_login import current_user
+from contextlib import contextmanager
+from functools import wraps
+import math
+import threading
+import time
+
+
+class Rejected(Exception):
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        # `now` may predate a bucket created after the caller read the clock
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        # 0 if a token is available now, otherwise the seconds until one will be; takes nothing
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        # Returns 0 if a token was taken, otherwise the seconds until one will be available
+        retry_after = self.wait_time(now)
+        if not retry_after:
+            self.tokens -= 1
+        return retry_after
+
+    def give_back(self):
+        # Return a token taken for a request that was then turned away
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class AdmissionGate:
+    """Rate limits and a bounded queue in front of one scarce resource.
+
+    A request must find a token in its caller's bucket (429 otherwise) and in
+    the global bucket (503 otherwise); only then is one taken from each. It
+    then needs one of `concurrency` slots.
+    If every slot is busy it waits in a queue of at most `queue_limit`
+    requests for up to `max_wait` seconds; beyond that it is turned away with
+    a 503 at once instead of piling up behind SQLite's single writer, and its
+    tokens are given back: only admitted requests count against the rates.
+
+    State is per worker process, like the other in-memory caches.
+    """
+
+    max_tracked_callers = 10000
+
+    def __init__(self, name, concurrency, queue_limit, max_wait,
+                 caller_rate, caller_burst, global_rate, global_burst):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.caller_rate = caller_rate
+        self.caller_burst = caller_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self._callers = {}
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = dict.fromkeys(
+            ('admitted', 'queued', 'shed_caller_rate', 'shed_global_rate', 'shed_queue_full', 'shed_timeout'), 0)
+        self.max_waiting = 0
+
+    def _caller_bucket(self, key, now):
+        bucket = self._callers.get(key)
+        if bucket is None:
+            if len(self._callers) >= self.max_tracked_callers:
+                # Forget callers whose buckets have refilled; they behave like new ones
+                for old_key, old_bucket in list(self._callers.items()):
+                    old_bucket.refill(now)
+                    if old_bucket.tokens >= old_bucket.burst:
+                        del self._callers[old_key]
+            bucket = self._callers[key] = TokenBucket(self.caller_rate, self.caller_burst)
+        return bucket
+
+    def _reject(self, counter, status, retry_after, reason):
+        self.counters[counter] += 1
+        raise Rejected(status, retry_after, reason)
+
+    @contextmanager
+    def admit(self, key):
+        with self._condition:
+            now = time.monotonic()
+            # Check both buckets before taking from either, so a rejected request costs no tokens
+            caller_bucket = self._caller_bucket(key, now)
+            retry_after = caller_bucket.wait_time(now)
+            if retry_after:
+                self._reject('shed_caller_rate', 429, retry_after, 'Too many requests, please slow down.')
+            retry_after = self.global_bucket.wait_time(now)
+            if retry_after:
+                self._reject('shed_global_rate', 503, retry_after, 'The server is busy, please try again shortly.')
+            caller_bucket.take(now)
+            self.global_bucket.take(now)
+
+            if self.in_flight >= self.concurrency:
+                try:
+                    if self.waiting >= self.queue_limit:
+                        self._reject('shed_queue_full', 503, self.max_wait,
+                                     'The server is busy, please try again shortly.')
+                    self.waiting += 1
+                    self.counters['queued'] += 1
+                    self.max_waiting = max(self.max_waiting, self.waiting)
+                    try:
+                        admitted = self._condition.wait_for(lambda: self.in_flight < self.concurrency, self.max_wait)
+                    finally:
+                        self.waiting -= 1
+                    if not admitted:
+                        self._reject('shed_timeout', 503, self.max_wait, 'The server is busy, please try again shortly.')
+                except Rejected:
+                    # Taken up front so queued requests cannot overdraw the buckets; refunded if never admitted
+                    caller_bucket.give_back()
+                    self.global_bucket.give_back()
+                    raise
+            self.in_flight += 1
+            self.counters['admitted'] += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def as_dict(self):
+        with self._condition:
+            return dict(self.counters, name=self.name, in_flight=self.in_flight, queue_depth=self.waiting,
+                        max_queue_depth=self.max_waiting, concurrency=self.concurrency,
+                        queue_limit=self.queue_limit, tracked_callers=len(self._callers))
+
+
+# Gates by name; empty (admission control off) until init_admission() runs
+gates = {}
+
+
+def init_admission(app_config):
+    gates.clear()
+    if not app_config.get('ADMISSION_ENABLED'):
+        return
+    gates['writes'] = AdmissionGate(
+        'writes', app_config['ADMISSION_WRITE_CONCURRENCY'], app_config['ADMISSION_QUEUE_LIMIT'],
+        app_config['ADMISSION_MAX_WAIT_SECONDS'], app_config['ADMISSION_USER_RATE'],
+        app_config['ADMISSION_USER_BURST'], app_config['ADMISSION_GLOBAL_RATE'], app_config['ADMISSION_GLOBAL_BURST'])
+    gates['login'] = AdmissionGate(
+        'login', app_config['ADMISSION_LOGIN_CONCURRENCY'], app_config['ADMISSION_QUEUE_LIMIT'],
+        app_config['ADMISSION_MAX_WAIT_SECONDS'], app_config['ADMISSION_LOGIN_RATE'],
+        app_config['ADMISSION_LOGIN_BURST'], app_config['ADMISSION_GLOBAL_RATE'], app_config['ADMISSION_GLOBAL_BURST'])
+
+
+def _rejection_response(rejected):
+    if request.blueprint in ('api', 'api_v1') or request.accept_mimetypes.best == 'application/json':
+        response = make_response(jsonify({'message': rejected.reason}), rejected.status)
+    else:
+        response = make_response(rejected.reason, rejected.status)
+        response.mimetype = 'text/plain'
+    response.headers['Retry-After'] = str(max(1, math.ceil(rejected.retry_after)))
+    return response
+
+
+def admission_control(gate_name, key=None, methods=('POST',)):
+    """Run the view through the named gate. `key` returns the caller's rate-limit key (default: user id)."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            gate = gates.get(gate_name)
+            if gate is None or request.method not in methods:
+                return f(*args, **kwargs)
+            caller = key() if key else current_user.get_id()
+            try:
+                with gate.admit(caller):
+                    return f(*args, **kwargs)
+            except Rejected as rejected:
+                return _rejection_response(rejected)
+        return decorated_function
+    return decorator
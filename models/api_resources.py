@@ -0,0 +1,158 @@
+from models.database import get_db_connection
+from models.archive import ReservationArchive, COLUMNS as ARCHIVED_COLUMNS
+from models.availability_board import AvailabilityBoard
+
+# Public field name -> SQL expression for each /api/v1 resource. Only the
+# requested fields are selected, and joins are only added when a field needs them.
+LOT_FIELDS = {
+    'id': 'pl.id',
+    'prime_location_name': 'pl.prime_location_name',
+    'price': 'pl.price',
+    'address': 'pl.address',
+    'pin_code': 'pl.pin_code',
+    'maximum_number_of_spots': 'pl.maximum_number_of_spots',
+    'created_at': 'pl.created_at',
+    'total_spots': 'COUNT(ps.id)',
+    'available_spots': "COALESCE(SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END), 0)",
+    'occupied_spots': "COALESCE(SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END), 0)",
+}
+COUNT_FIELDS = ('total_spots', 'available_spots', 'occupied_spots')
+
+SPOT_FIELDS = {
+    'id': 'ps.id',
+    'spot_number': 'ps.spot_number',
+    'status': 'ps.status',
+    'reservation_id': 'r.id',
+    'user_id': 'r.user_id',
+    'username': 'u.username',
+    'parking_timestamp': 'r.parking_timestamp',
+}
+OCCUPANT_FIELDS = ('reservation_id', 'user_id', 'username', 'parking_timestamp')
+
+RESERVATION_FIELDS = {
+    'id': 'r.id',
+    'lot_id': 'ps.lot_id',
+    'spot_id': 'r.spot_id',
+    'spot_number': 'ps.spot_number',
+    'prime_location_name': 'pl.prime_location_name',
+    'price': 'COALESCE(r.hourly_rate, pl.price)',
+    'parking_timestamp': 'r.parking_timestamp',
+    'leaving_timestamp': 'r.leaving_timestamp',
+    'reserved_until': 'r.reserved_until',
+    'parking_cost': 'r.parking_cost',
+    'accrued_cost': 'r.accrued_cost',
+    'status': 'r.status',
+}
+
+
+def parse_fields(value, allowed, default):
+    """Turn a ?fields=a,b,c value into a list of field names; raises ValueError on unknown ones."""
+    if not value:
+        return list(default)
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in allowed:
+            raise ValueError(f'unknown field: {name}')
+        if name not in fields:
+            fields.append(name)
+    return fields or list(default)
+
+
+def _columns(mapping, fields, key='id'):
+    # The key column is always selected (rows are matched and ordered by it)
+    names = [key] + [name for name in fields if name != key]
+    return ', '.join(f'{mapping[name]} AS {name}' for name in names)
+
+
+def select_lots(fields, lot_id=None, use_board=True):
+    """Lots (or one lot) with only `fields`; spot counts come from the shared board when it is attached."""
+    wants_counts = any(name in COUNT_FIELDS for name in fields)
+    board = AvailabilityBoard.read_all() if wants_counts and use_board else None
+    sql_fields = [name for name in fields if board is None or name not in COUNT_FIELDS]
+    join_spots = wants_counts and board is None
+
+    query = f'SELECT {_columns(LOT_FIELDS, sql_fields)} FROM parking_lots pl'
+    params = ()
+    if join_spots:
+        query += ' LEFT JOIN parking_spots ps ON pl.id = ps.lot_id'
+    if lot_id is not None:
+        query += ' WHERE pl.id = ?'
+        params = (lot_id,)
+    if join_spots:
+        query += ' GROUP BY pl.id'
+    query += ' ORDER BY pl.id'
+
+    conn = get_db_connection()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    lots = []
+    for row in rows:
+        row = dict(row)
+        if board is not None:
+            if row['id'] not in board:
+                return select_lots(fields, lot_id, use_board=False)
+            available, occupied = board[row['id']]
+            row.update(total_spots=available + occupied, available_spots=available, occupied_spots=occupied)
+        lots.append({name: row[name] for name in fields})
+    return lots
+
+
+def select_spots(lot_id, fields):
+    query = f'SELECT {_columns(SPOT_FIELDS, fields)} FROM parking_spots ps'
+    if any(name in OCCUPANT_FIELDS for name in fields):
+        query += '''
+            LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
+            LEFT JOIN users u ON r.user_id = u.id'''
+    query += ' WHERE ps.lot_id = ? ORDER BY ps.spot_number'
+    conn = get_db_connection()
+    rows = conn.execute(query, (lot_id,)).fetchall()
+    conn.close()
+    return [{name: row[name] for name in fields} for row in rows]
+
+
+def _reservation_query(fields):
+    query = f'SELECT {_columns(RESERVATION_FIELDS, fields)} FROM reservations r'
+    if any('ps.' in RESERVATION_FIELDS[name] or 'pl.' in RESERVATION_FIELDS[name] for name in fields):
+        query += ' JOIN parking_spots ps ON r.spot_id = ps.id'
+    if any('pl.' in RESERVATION_FIELDS[name] for name in fields):
+        query += ' JOIN parking_lots pl ON ps.lot_id = pl.id'
+    return query
+
+
+def select_reservation(reservation_id, user_id, fields):
+    """One of the user's reservations, looked up in the archived tier once it has left the database."""
+    conn = get_db_connection()
+    row = conn.execute(_reservation_query(fields) + ' WHERE r.id = ? AND r.user_id = ?',
+                       (reservation_id, user_id)).fetchone()
+    conn.close()
+    if row:
+        return {name: row[name] for name in fields}
+    archived = [name for name, kind in ARCHIVED_COLUMNS if name in fields]
+    row = ReservationArchive.get_user_row(user_id, reservation_id, archived)
+    # Archived rows have no reserved_until/accrued_cost
+    return {name: row.get(name) for name in fields} if row else None
+
+
+def select_user_reservations(user_id, fields, limit=10):
+    """A user's reservations, newest first, including the archived tier (like Reservation.get_user_history)."""
+    # parking_timestamp is needed to merge with the archive even if it was not requested
+    query_fields = fields if 'parking_timestamp' in fields else fields + ['parking_timestamp']
+    conn = get_db_connection()
+    rows = conn.execute(_reservation_query(query_fields) + '''
+        WHERE r.user_id = ? ORDER BY r.parking_timestamp DESC LIMIT ?
+    ''', (user_id, limit)).fetchall()
+    conn.close()
+    rows = [dict(row) for row in rows]
+
+    newest_archived = ReservationArchive.newest_timestamp()
+    if newest_archived and (len(rows) < limit or rows[-1]['parking_timestamp'] <= newest_archived):
+        archived = [name for name, kind in ARCHIVED_COLUMNS if name in query_fields]
+        rows.extend(ReservationArchive.get_user_rows(user_id, limit, archived))
+        rows.sort(key=lambda row: row['parking_timestamp'], reverse=True)
+        rows = rows[:limit]
+    # Archived rows have no reserved_until/accrued_cost
+    return [{name: row.get(name) for name in fields} for row in rows]
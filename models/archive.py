@@ -0,0 +1,391 @@
+from models.database import get_db_connection
+from models.availability import TIMESTAMP_FORMAT, EPOCH
+from datetime import datetime, timedelta
+from array import array
+from bisect import bisect_left
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+# Column layout of an archived reservation. Lot details are copied in so that
+# archived history stays readable after a lot is edited or deleted.
+# Types follow the array module: 'q' = int64, 'd' = float64, 's' = utf-8 text.
+COLUMNS = [
+    ('user_id', 'q'),
+    ('parking_timestamp', 'q'),
+    ('id', 'q'),
+    ('spot_id', 'q'),
+    ('lot_id', 'q'),
+    ('spot_number', 'q'),
+    ('leaving_timestamp', 'q'),
+    ('parking_cost', 'd'),
+    ('price', 'd'),
+    ('status', 's'),
+    ('prime_location_name', 's'),
+]
+TIMESTAMP_COLUMNS = ('parking_timestamp', 'leaving_timestamp')
+ARCHIVED_STATUSES = ('completed', 'abandoned', 'expired', 'cancelled')
+HEADER_SIZE = struct.Struct('<Q')
+ROW_GROUP_SIZE = 1024  # Rows per compressed block of a column
+
+
+def to_epoch(value):
+    if not value:
+        return 0
+    return int((datetime.strptime(value, TIMESTAMP_FORMAT) - EPOCH).total_seconds())
+
+
+def from_epoch(value):
+    if not value:
+        return None
+    return (EPOCH + timedelta(seconds=value)).strftime(TIMESTAMP_FORMAT)
+
+
+def _encode(values, kind):
+    if kind == 's':
+        return zlib.compress('\n'.join(values).encode('utf-8'))
+    return zlib.compress(array(kind, values).tobytes())
+
+
+def _decode(blob, kind, rows):
+    data = zlib.decompress(blob)
+    if kind == 's':
+        return data.decode('utf-8').split('\n') if rows else []
+    values = array(kind)
+    values.frombytes(data)
+    return values
+
+
+def _empty_columns():
+    return {name: [] if kind == 's' else array(kind) for name, kind in COLUMNS}
+
+
+class Partition:
+    """One month of archived reservations stored column by column.
+
+    File layout: an 8-byte header length, a JSON header with the row count and
+    the offset/size of every block, then the zlib-compressed blocks. Each column
+    is split into row groups of row_group_size rows, so readers only decompress
+    the groups they touch. Rows are sorted by (user_id, parking_timestamp), and
+    a user index (distinct user ids and the row each one starts at) locates a
+    user's contiguous slice without reading the user_id column.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.month = os.path.basename(path).split('.')[0]
+        with open(path, 'rb') as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            header_length = HEADER_SIZE.unpack(f.read(HEADER_SIZE.size))[0]
+            self.header = json.loads(f.read(header_length))
+        self.data_offset = HEADER_SIZE.size + header_length
+        self.row_group_size = self.header.get('row_group_size') or max(self.rows, 1)
+        self._user_index = None
+
+    @property
+    def rows(self):
+        return self.header['rows']
+
+    def _blocks(self, name):
+        meta = self.header['columns'][name]
+        # Partitions written before row groups hold each column as a single block
+        return meta.get('blocks') or [[meta['offset'], meta['size']]]
+
+    def read(self, columns=None, start=0, stop=None):
+        """Decode rows [start, stop) of the given columns, touching only the row groups they span."""
+        columns = columns or [name for name, kind in COLUMNS]
+        stop = self.rows if stop is None else min(stop, self.rows)
+        if start >= stop:
+            return {name: values for name, values in _empty_columns().items() if name in columns}
+        size = self.row_group_size
+        first, last = start // size, (stop - 1) // size
+        result = {}
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for name in columns:
+                    kind = self.header['columns'][name]['type']
+                    values = [] if kind == 's' else array(kind)
+                    for group in range(first, last + 1):
+                        offset, length = self._blocks(name)[group]
+                        block_start = self.data_offset + offset
+                        group_rows = min(size, self.rows - group * size)
+                        values.extend(_decode(mapped[block_start:block_start + length], kind, group_rows))
+                    skip = start - first * size
+                    result[name] = values[skip:skip + stop - start]
+        return result
+
+    def iter_row_groups(self, columns=None):
+        # One row group at a time, so a full scan never holds a whole month in memory
+        for start in range(0, self.rows, self.row_group_size):
+            yield self.read(columns, start, start + self.row_group_size)
+
+    def _users(self):
+        if self._user_index is None:
+            meta = self.header.get('user_index')
+            if meta:
+                with open(self.path, 'rb') as f:
+                    f.seek(self.data_offset + meta['offset'])
+                    values = _decode(f.read(meta['size']), 'q', 0)
+                half = len(values) // 2
+                self._user_index = (values[:half], values[half:])
+            else:
+                keys, starts = array('q'), array('q')
+                for row, user_id in enumerate(self.read(['user_id'])['user_id']):
+                    if not keys or keys[-1] != user_id:
+                        keys.append(user_id)
+                        starts.append(row)
+                self._user_index = (keys, starts)
+        return self._user_index
+
+    def user_slice(self, user_id):
+        if not self.rows or not (self.header['user_min'] <= user_id <= self.header['user_max']):
+            return None
+        keys, starts = self._users()
+        index = bisect_left(keys, user_id)
+        if index == len(keys) or keys[index] != user_id:
+            return None
+        return starts[index], starts[index + 1] if index + 1 < len(starts) else self.rows
+
+    def user_rows(self, user_id, columns=None):
+        bounds = self.user_slice(user_id)
+        if bounds is None:
+            return []
+        data = self.read(columns, *bounds)
+        return [
+            {name: values[i] for name, values in data.items()}
+            for i in range(bounds[1] - bounds[0])
+        ]
+
+    @staticmethod
+    def write(path, data):
+        order = sorted(range(len(data['id'])), key=lambda i: (data['user_id'][i], data['parking_timestamp'][i]))
+        blobs, columns, offset = [], {}, 0
+        for name, kind in COLUMNS:
+            values = [data[name][i] for i in order]
+            blocks = []
+            for start in range(0, len(values), ROW_GROUP_SIZE):
+                blob = _encode(values[start:start + ROW_GROUP_SIZE], kind)
+                blocks.append([offset, len(blob)])
+                blobs.append(blob)
+                offset += len(blob)
+            columns[name] = {'type': kind, 'blocks': blocks}
+
+        keys, starts = array('q'), array('q')
+        for row, i in enumerate(order):
+            if not keys or keys[-1] != data['user_id'][i]:
+                keys.append(data['user_id'][i])
+                starts.append(row)
+        index_blob = zlib.compress((keys + starts).tobytes())
+        blobs.append(index_blob)
+
+        header = json.dumps({
+            'rows': len(order),
+            'row_group_size': ROW_GROUP_SIZE,
+            'columns': columns,
+            'user_index': {'offset': offset, 'size': len(index_blob)},
+            'user_min': data['user_id'][order[0]] if order else 0,
+            'user_max': data['user_id'][order[-1]] if order else 0,
+            'parking_max': max(data['parking_timestamp']) if order else 0,
+        }).encode('utf-8')
+
+        # Write to a temp file and rename so readers never see a half-written partition
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER_SIZE.pack(len(header)))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class ReservationArchive:
+    archive_dir = 'archive'
+
+    # Opened partitions (parsed header, user index) are reused until the archive
+    # directory changes; partitions are only ever replaced by rename, which does that
+    _lock = threading.Lock()
+    _listing = (None, None, [])   # (archive_dir, directory mtime, partitions oldest first)
+
+    @classmethod
+    def partitions(cls, newest_first=True):
+        try:
+            mtime = os.stat(cls.archive_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        directory, cached_mtime, partitions = cls._listing
+        if directory != cls.archive_dir or cached_mtime != mtime:
+            with cls._lock:
+                opened = {(partition.path, partition.mtime): partition for partition in partitions}
+                partitions = []
+                for name in sorted(name for name in os.listdir(cls.archive_dir) if name.endswith('.colz')):
+                    path = os.path.join(cls.archive_dir, name)
+                    partitions.append(opened.get((path, os.stat(path).st_mtime_ns)) or Partition(path))
+                cls._listing = (cls.archive_dir, mtime, partitions)
+        return partitions[::-1] if newest_first else list(partitions)
+
+    @classmethod
+    def newest_timestamp(cls):
+        partitions = cls.partitions()
+        return from_epoch(partitions[0].header['parking_max']) if partitions else None
+
+    @classmethod
+    def archive_completed(cls, older_than_days, batch_size=50000, flush_rows=500000):
+        """Move finished reservations older than `older_than_days` into monthly partitions.
+
+        Rows are read in id order and gathered per month; every flush_rows rows
+        (and at the end) each month's partition is rewritten once and only then
+        are the gathered rows deleted. Merging skips ids that are already
+        archived, so an interrupted run can simply be repeated.
+        Returns the number of rows moved.
+        """
+        os.makedirs(cls.archive_dir, exist_ok=True)
+        cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).strftime(TIMESTAMP_FORMAT)
+        placeholders = ','.join('?' for _ in ARCHIVED_STATUSES)
+        moved, last_id = 0, 0
+        months, pending, strings = {}, 0, {}
+
+        while True:
+            conn = get_db_connection()
+            rows = conn.execute(f'''
+                SELECT r.id, r.spot_id, r.user_id, r.parking_timestamp, r.leaving_timestamp,
+                       r.parking_cost, r.status, ps.lot_id, ps.spot_number,
+                       pl.prime_location_name, COALESCE(r.hourly_rate, pl.price) AS price
+                FROM reservations r
+                JOIN parking_spots ps ON r.spot_id = ps.id
+                JOIN parking_lots pl ON ps.lot_id = pl.id
+                WHERE r.status IN ({placeholders})
+                  AND COALESCE(r.leaving_timestamp, r.reserved_until, r.parking_timestamp) < ?
+                  AND r.id > ?
+                ORDER BY r.id
+                LIMIT ?
+            ''', (*ARCHIVED_STATUSES, cutoff, last_id, batch_size)).fetchall()
+            conn.close()
+
+            for row in rows:
+                data = months.setdefault(row['parking_timestamp'][:7], _empty_columns())
+                for name, kind in COLUMNS:
+                    value = row[name]
+                    if name in TIMESTAMP_COLUMNS:
+                        value = to_epoch(value)
+                    elif kind == 's':
+                        # Newlines separate values in text columns; repeated names share one string
+                        value = (value or '').replace('\n', ' ')
+                        value = strings.setdefault(value, value)
+                    elif value is None:
+                        value = 0
+                    data[name].append(value)
+            pending += len(rows)
+            if rows:
+                last_id = rows[-1]['id']
+
+            if pending and (not rows or pending >= flush_rows):
+                moved += cls._flush(months)
+                months, pending, strings = {}, 0, {}
+            if not rows:
+                return moved
+
+    @classmethod
+    def _flush(cls, months, delete_batch=50000):
+        # Partitions first, deletes second: a crash in between leaves rows that the next run skips
+        for month, data in months.items():
+            cls._merge_into_partition(month, data)
+        ids = [reservation_id for data in months.values() for reservation_id in data['id']]
+        conn = get_db_connection()
+        for start in range(0, len(ids), delete_batch):
+            conn.executemany('DELETE FROM reservations WHERE id = ?',
+                             [(reservation_id,) for reservation_id in ids[start:start + delete_batch]])
+            conn.commit()
+        conn.close()
+        return len(ids)
+
+    @classmethod
+    def _merge_into_partition(cls, month, rows):
+        path = os.path.join(cls.archive_dir, f'{month}.colz')
+        if not os.path.exists(path):
+            Partition.write(path, rows)
+            return
+        data = Partition(path).read()
+        archived_ids = set(data['id'])
+        for i, reservation_id in enumerate(rows['id']):
+            if reservation_id in archived_ids:
+                continue
+            for name, kind in COLUMNS:
+                data[name].append(rows[name][i])
+        Partition.write(path, data)
+
+    @classmethod
+    def get_user_rows(cls, user_id, limit=None, columns=None):
+        """Archived reservations of one user, newest first, as dicts shaped like hot rows."""
+        rows = []
+        for partition in cls.partitions():
+            month_rows = partition.user_rows(user_id, columns)
+            month_rows.sort(key=lambda row: row['parking_timestamp'], reverse=True)
+            for row in month_rows:
+                for name in TIMESTAMP_COLUMNS:
+                    if name in row:
+                        row[name] = from_epoch(row[name])
+                rows.append(row)
+            # Partitions are visited newest month first, so once we have `limit`
+            # rows nothing in an older partition can make the cut
+            if limit is not None and len(rows) >= limit:
+                return rows[:limit]
+        return rows
+
+    @classmethod
+    def get_user_row(cls, user_id, reservation_id, columns=None):
+        """One archived reservation of a user by id, shaped like a hot row, or None."""
+        for partition in cls.partitions():
+            bounds = partition.user_slice(user_id)
+            if bounds is None:
+                continue
+            ids = partition.read(['id'], *bounds)['id']
+            if reservation_id not in ids:
+                continue
+            row_number = bounds[0] + ids.index(reservation_id)
+            data = partition.read(columns, row_number, row_number + 1)
+            row = {name: values[0] for name, values in data.items()}
+            for name in TIMESTAMP_COLUMNS:
+                if name in row:
+                    row[name] = from_epoch(row[name])
+            return row
+        return None
+
+    @classmethod
+    def get_user_daily_bookings(cls, user_id, days):
+        counts = {}
+        for partition in cls.partitions():
+            bounds = partition.user_slice(user_id)
+            if bounds is None:
+                continue
+            for value in partition.read(['parking_timestamp'], *bounds)['parking_timestamp']:
+                date = from_epoch(value)[:10]
+                counts[date] = counts.get(date, 0) + 1
+            if len(counts) >= days:
+                break
+        return counts
+
+    @classmethod
+    def monthly_summary(cls):
+        # Admin analytics over the cold tier: bookings and revenue per month and lot
+        summary = []
+        for partition in cls.partitions(newest_first=False):
+            lots, revenue = {}, 0.0
+            for data in partition.iter_row_groups(['lot_id', 'prime_location_name', 'parking_cost']):
+                for lot_id, name, cost in zip(data['lot_id'], data['prime_location_name'], data['parking_cost']):
+                    entry = lots.setdefault(lot_id, {'lot_id': lot_id, 'prime_location_name': name,
+                                                     'bookings': 0, 'revenue': 0.0})
+                    entry['bookings'] += 1
+                    entry['revenue'] += cost
+                revenue += sum(data['parking_cost'])
+            summary.append({
+                'month': partition.month,
+                'bookings': partition.rows,
+                'revenue': round(revenue, 2),
+                'lots': sorted(lots.values(), key=lambda lot: lot['lot_id']),
+            })
+        return summary
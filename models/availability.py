@@ -0,0 +1,185 @@
+from models.database import get_db_connection
+from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+import threading
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
+OPEN_ENDED = float('inf') # Active walk-in sessions have no known end
+# A walk-in needs its spot free for this long; advance bookings further out do not block it,
+# and if the driver is still parked when one starts, check-in moves it to another spot
+WALK_IN_HORIZON = timedelta(hours=2)
+
+
+def to_seconds(value):
+    # Timestamps are stored as UTC strings by SQLite's CURRENT_TIMESTAMP
+    if isinstance(value, str):
+        value = datetime.strptime(value, TIMESTAMP_FORMAT)
+    return (value - EPOCH).total_seconds()
+
+
+class SpotSchedule:
+    """Busy intervals of one spot, kept as parallel arrays sorted by start.
+
+    Bookings never overlap each other, but an open-ended session may overlap
+    bookings further out than WALK_IN_HORIZON, so ends are not sorted. A
+    running maximum of the ends answers "does anything starting before t
+    end after s" with one bisect.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.max_ends = []  # max_ends[i] = max(ends[:i + 1])
+
+    def _update_max_ends(self, index):
+        del self.max_ends[index:]
+        running = self.max_ends[-1] if self.max_ends else None
+        for end in self.ends[index:]:
+            running = end if running is None else max(running, end)
+            self.max_ends.append(running)
+
+    def add(self, start, end):
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self._update_max_ends(index)
+
+    def remove(self, start, end):
+        index = bisect_right(self.starts, start) - 1
+        while index >= 0 and self.starts[index] == start:
+            if self.ends[index] == end:
+                del self.starts[index]
+                del self.ends[index]
+                self._update_max_ends(index)
+                return True
+            index -= 1
+        return False
+
+    def gap_around(self, start, end):
+        # Intervals starting at or after `end` cannot collide with [start, end);
+        # of those starting before it, the latest end decides
+        index = bisect_left(self.starts, end)
+        previous_end = self.max_ends[index - 1] if index > 0 else None
+        if previous_end is not None and previous_end > start:
+            return None
+        next_start = self.starts[index] if index < len(self.starts) else None
+        return previous_end, next_start
+
+
+class LotAvailability:
+    """Per-lot interval index answering "which spot is free for [t1, t2)"."""
+
+    def __init__(self, lot_id):
+        self.lot_id = lot_id
+        self.spot_numbers = {}
+        self.schedules = {}
+
+    def load(self, conn):
+        spots = conn.execute(
+            'SELECT id, spot_number FROM parking_spots WHERE lot_id = ? ORDER BY spot_number',
+            (self.lot_id,)
+        ).fetchall()
+        self.spot_numbers = {spot['id']: spot['spot_number'] for spot in spots}
+        self.schedules = {spot['id']: SpotSchedule() for spot in spots}
+
+        busy = conn.execute('''
+            SELECT r.spot_id, r.parking_timestamp, r.reserved_until
+            FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            WHERE ps.lot_id = ? AND r.status IN ('active', 'reserved', 'held')
+            ORDER BY r.parking_timestamp
+        ''', (self.lot_id,)).fetchall()
+        for row in busy:
+            self.add(row['spot_id'], row['parking_timestamp'], row['reserved_until'])
+        return self
+
+    def add(self, spot_id, start, end):
+        schedule = self.schedules.setdefault(spot_id, SpotSchedule())
+        schedule.add(to_seconds(start), to_seconds(end) if end else OPEN_ENDED)
+
+    def remove(self, spot_id, start, end):
+        schedule = self.schedules.get(spot_id)
+        if schedule:
+            schedule.remove(to_seconds(start), to_seconds(end) if end else OPEN_ENDED)
+
+    def find_spot(self, start, end=None, candidates=None):
+        """Best-fit search: pick the free spot that leaves the smallest gap around the window.
+
+        Packing bookings tightly keeps long free stretches intact for later,
+        longer requests. A walk-in (end=None) only needs the spot free for
+        WALK_IN_HORIZON from `start`.
+        """
+        end = start + WALK_IN_HORIZON if end is None else end
+        start, end = to_seconds(start), to_seconds(end)
+        best_spot, best_key = None, None
+        for spot_id, schedule in self.schedules.items():
+            if candidates is not None and spot_id not in candidates:
+                continue
+            gap = schedule.gap_around(start, end)
+            if gap is None:
+                continue
+            previous_end, next_start = gap
+            before = start - previous_end if previous_end is not None else OPEN_ENDED
+            after = next_start - end if next_start is not None else OPEN_ENDED
+            # Spots adjacent to existing bookings on both sides come first, then those
+            # with the tightest fit on one side; untouched spots are used last
+            key = (before + after, min(before, after), self.spot_numbers.get(spot_id, 0))
+            if best_key is None or key < best_key:
+                best_spot, best_key = spot_id, key
+        return best_spot
+
+
+class AvailabilityIndex:
+    """Process-local cache of LotAvailability objects.
+
+    The database stays the source of truth: writers re-check for overlaps inside
+    their transaction and call invalidate() if the cached view turned out stale
+    (for example because another worker booked the same spot).
+    """
+
+    _lots = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def for_lot(cls, lot_id, conn=None):
+        with cls._lock:
+            lot = cls._lots.get(lot_id)
+            if lot is None:
+                owns_connection = conn is None
+                conn = conn or get_db_connection()
+                lot = LotAvailability(lot_id).load(conn)
+                if owns_connection:
+                    conn.close()
+                cls._lots[lot_id] = lot
+            return lot
+
+    @classmethod
+    def find_spot(cls, lot_id, start, end=None, conn=None, exclude=()):
+        # `exclude`: spots the caller's SQL re-check already rejected
+        lot = cls.for_lot(lot_id, conn)
+        with cls._lock:
+            candidates = set(lot.schedules) - set(exclude) if exclude else None
+            return lot.find_spot(start, end, candidates)
+
+    @classmethod
+    def record(cls, lot_id, spot_id, start, end):
+        with cls._lock:
+            lot = cls._lots.get(lot_id)
+            if lot is not None:
+                lot.add(spot_id, start, end)
+
+    @classmethod
+    def forget(cls, lot_id, spot_id, start, end):
+        with cls._lock:
+            lot = cls._lots.get(lot_id)
+            if lot is not None:
+                lot.remove(spot_id, start, end)
+
+    @classmethod
+    def invalidate(cls, lot_id=None):
+        with cls._lock:
+            if lot_id is None:
+                cls._lots.clear()
+            else:
+                cls._lots.pop(lot_id, None)
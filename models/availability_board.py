@@ -0,0 +1,263 @@
+from models.database import get_db_connection
+from multiprocessing import shared_memory, resource_tracker
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: writers are only serialized within this process
+    fcntl = None
+
+MAGIC = 0x50524b424f415244  # "PRKBOARD"
+HEADER = struct.Struct('<QQQ')  # magic, capacity, generation
+SLOT = struct.Struct('<qqq')    # lot_id (0 = empty, -1 = deleted), available, occupied
+EMPTY, DELETED = 0, -1
+READ_RETRIES = 100
+ATTACH_WAIT_SECONDS = 2.0  # How long a worker waits for another one to finish creating the segment
+
+COUNTS_QUERY = '''
+    SELECT pl.id AS lot_id,
+           COALESCE(SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END), 0) AS available,
+           COALESCE(SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END), 0) AS occupied
+    FROM parking_lots pl
+    LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
+'''
+
+
+class AvailabilityBoard:
+    """Per-lot available/occupied counts in shared memory, shared by all workers.
+
+    Layout: a header (magic, capacity, generation) followed by an open-addressing
+    hash table of (lot_id, available, occupied) slots. Writers publish after
+    their transaction commits: they take an exclusive file lock shared by all
+    workers, re-read the lot's counts from the database and write them, so the
+    last publisher always writes the latest committed state. They bump the
+    generation to an odd value, write, then bump it back to even. Readers take
+    no lock: they retry if the generation was odd or changed while they read
+    (a seqlock).
+
+    If the board is not attached (disabled, or shared memory unavailable),
+    reads return None and callers fall back to SQL.
+    """
+
+    _shm = None
+    _lock_file = None
+    _thread_lock = threading.Lock()
+    capacity = 0
+    # Called as listener(lot_id, (available, occupied) or None) whenever a write refreshes a lot
+    listeners = []
+
+    @classmethod
+    def attach(cls, name, capacity=4096):
+        size = HEADER.size + capacity * SLOT.size
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _untrack(shm)
+            HEADER.pack_into(shm.buf, 0, MAGIC, capacity, 0)
+        except FileExistsError:
+            shm = _open_created(name)
+            if shm is None:
+                print("Shared availability board was never initialized; using the database instead")
+                return False
+        except OSError as e:
+            print(f"Shared availability board unavailable: {e}")
+            return False
+
+        magic, stored_capacity, generation = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or stored_capacity != capacity or shm.size < size:
+            print("Shared availability board has an unexpected layout; using the database instead")
+            shm.close()
+            return False
+        cls._shm, cls.capacity = shm, capacity
+        if fcntl is not None:
+            cls._lock_file = open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'a+b')
+        return True
+
+    @classmethod
+    def detach(cls):
+        if cls._shm is not None:
+            cls._shm.close()
+            cls._shm = None
+        if cls._lock_file is not None:
+            cls._lock_file.close()
+            cls._lock_file = None
+
+    @classmethod
+    def is_attached(cls):
+        return cls._shm is not None
+
+    @classmethod
+    def generation(cls):
+        if cls._shm is None:
+            return None
+        return HEADER.unpack_from(cls._shm.buf, 0)[2]
+
+    @classmethod
+    def _set_generation(cls, generation):
+        struct.pack_into('<Q', cls._shm.buf, 16, generation)
+
+    @classmethod
+    def _slot_offset(cls, index):
+        return HEADER.size + index * SLOT.size
+
+    @classmethod
+    def _find_slot(cls, lot_id, for_insert=False):
+        buf = cls._shm.buf
+        first_free = None
+        index = lot_id % cls.capacity
+        for _ in range(cls.capacity):
+            slot_lot_id = struct.unpack_from('<q', buf, cls._slot_offset(index))[0]
+            if slot_lot_id == lot_id:
+                return index
+            if slot_lot_id == DELETED and first_free is None:
+                first_free = index
+            if slot_lot_id == EMPTY:
+                return (first_free if first_free is not None else index) if for_insert else None
+            index = (index + 1) % cls.capacity
+        return first_free if for_insert else None
+
+    @classmethod
+    def _begin_write(cls):
+        generation = cls.generation()
+        if generation % 2:
+            generation += 1  # A writer died mid-update; reconcile() on startup repairs its slot
+        cls._set_generation(generation + 1)
+        return generation + 2
+
+    @classmethod
+    def _apply(cls, updates):
+        # updates: {lot_id: (available, occupied)}, or None as the value to delete the lot
+        for lot_id, counts in updates.items():
+            index = cls._find_slot(lot_id, for_insert=counts is not None)
+            if index is None:
+                if counts is not None:
+                    print(f"Shared availability board is full; lot {lot_id} is served from the database")
+                continue
+            if counts is None:
+                SLOT.pack_into(cls._shm.buf, cls._slot_offset(index), DELETED, 0, 0)
+            else:
+                SLOT.pack_into(cls._shm.buf, cls._slot_offset(index), lot_id, counts[0], counts[1])
+
+    @classmethod
+    def _write(cls, updates):
+        next_generation = cls._begin_write()
+        try:
+            cls._apply(updates)
+        finally:
+            cls._set_generation(next_generation)
+
+    @classmethod
+    def _exclusive(cls):
+        # Serializes publishers across workers (flock) and across threads in this one
+        return _ExclusiveLock(cls._thread_lock, cls._lock_file)
+
+    @classmethod
+    def refresh_lot(cls, lot_id):
+        """Publish one lot's committed counts. Call after the transaction that changed them commits."""
+        cls.refresh_lots([lot_id])
+
+    @classmethod
+    def refresh_lots(cls, lot_ids):
+        """Like refresh_lot for many lots, with one query and one board write."""
+        if (cls._shm is None and not cls.listeners) or not lot_ids:
+            return
+        updates = dict.fromkeys(lot_ids)
+        ids = list(updates)
+        conn = get_db_connection()
+        try:
+            with cls._exclusive():
+                # Read under the lock: a publisher that read earlier cannot overwrite these counts
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    placeholders = ','.join('?' for _ in batch)
+                    for row in conn.execute(COUNTS_QUERY + f' WHERE pl.id IN ({placeholders}) GROUP BY pl.id', batch):
+                        updates[row['lot_id']] = (row['available'], row['occupied'])
+                if cls._shm is not None:
+                    cls._write(updates)
+        finally:
+            conn.close()
+        for lot_id, counts in updates.items():
+            for listener in cls.listeners:
+                listener(lot_id, counts)
+
+    @classmethod
+    def reconcile(cls):
+        """Rebuild the whole board from the database (run on worker startup)."""
+        if cls._shm is None:
+            return
+        conn = get_db_connection()
+        try:
+            with cls._exclusive():
+                rows = conn.execute(COUNTS_QUERY + ' GROUP BY pl.id').fetchall()
+                next_generation = cls._begin_write()
+                try:
+                    cls._shm.buf[HEADER.size:HEADER.size + cls.capacity * SLOT.size] = bytes(cls.capacity * SLOT.size)
+                    cls._apply({row['lot_id']: (row['available'], row['occupied']) for row in rows})
+                finally:
+                    cls._set_generation(next_generation)
+        finally:
+            conn.close()
+
+    @classmethod
+    def read_all(cls):
+        """Return {lot_id: (available, occupied)} without taking any lock, or None to fall back to SQL."""
+        if cls._shm is None:
+            return None
+        buf = cls._shm.buf
+        for _ in range(READ_RETRIES):
+            before = HEADER.unpack_from(buf, 0)[2]
+            if before % 2:
+                continue
+            counts = {}
+            for lot_id, available, occupied in SLOT.iter_unpack(buf[HEADER.size:HEADER.size + cls.capacity * SLOT.size]):
+                if lot_id > 0:
+                    counts[lot_id] = (available, occupied)
+            if HEADER.unpack_from(buf, 0)[2] == before:
+                return counts
+        return None
+
+
+class _ExclusiveLock:
+    def __init__(self, thread_lock, lock_file):
+        self.thread_lock = thread_lock
+        self.lock_file = lock_file
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+def _untrack(shm):
+    # Every worker would otherwise unlink the segment when it exits; it is
+    # rebuilt by reconcile() on startup, so it can safely outlive workers
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+def _open_created(name):
+    """Open a segment another worker created, once it has sized it and written the header."""
+    deadline = time.monotonic() + ATTACH_WAIT_SECONDS
+    while True:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except ValueError:  # Created but not sized yet
+            shm = None
+        if shm is not None:
+            _untrack(shm)
+            if shm.size >= HEADER.size and HEADER.unpack_from(shm.buf, 0)[0] != 0:
+                return shm
+            shm.close()
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.01)
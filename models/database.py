@@ -8,9 +8,17 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+def add_column_if_missing(cursor, table, column, definition):
+    columns = [row['name'] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
 def init_db():
     conn = get_db_connection()
     cursor = conn.cursor()
+    # Readers (exports, streamed pages) then never block writers, nor writers readers.
+    # The mode is stored in the database file, so every later connection uses it
+    cursor.execute('PRAGMA journal_mode=WAL')
     
     # Users table
     cursor.execute('''
@@ -57,13 +65,82 @@ def init_db():
             user_id INTEGER NOT NULL,
             parking_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             leaving_timestamp TIMESTAMP NULL,
+            reserved_until TIMESTAMP NULL,
             parking_cost REAL DEFAULT 0,
+            accrued_cost REAL DEFAULT 0,
+            overstay INTEGER NOT NULL DEFAULT 0,
             status TEXT NOT NULL DEFAULT 'active',
             FOREIGN KEY (spot_id) REFERENCES parking_spots (id),
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
     
+    # Per-lot FIFO waitlist for full lots (see models/waitlist.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS waitlist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lot_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'waiting',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            offered_at TIMESTAMP NULL,
+            hold_expires_at TIMESTAMP NULL,
+            reservation_id INTEGER NULL,
+            FOREIGN KEY (lot_id) REFERENCES parking_lots (id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (reservation_id) REFERENCES reservations (id)
+        )
+    ''')
+
+    # Background jobs (see models/scheduler.py); next_run_at lets several workers share one schedule
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            interval_seconds INTEGER NOT NULL,
+            next_run_at TIMESTAMP NOT NULL,
+            last_started_at TIMESTAMP NULL,
+            last_duration_ms REAL DEFAULT 0,
+            last_rows_touched INTEGER DEFAULT 0,
+            total_runs INTEGER DEFAULT 0
+        )
+    ''')
+
+    # License plates registered by users, matched against gate events (see models/gate.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vehicles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            plate TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Columns added after the first release; CREATE TABLE IF NOT EXISTS won't add them to old databases
+    add_column_if_missing(cursor, 'reservations', 'reserved_until', 'TIMESTAMP NULL')
+    add_column_if_missing(cursor, 'reservations', 'accrued_cost', 'REAL DEFAULT 0')
+    add_column_if_missing(cursor, 'reservations', 'overstay', 'INTEGER NOT NULL DEFAULT 0')
+    add_column_if_missing(cursor, 'reservations', 'plate', 'TEXT NULL')  # Set for sessions opened by a gate
+    add_column_if_missing(cursor, 'reservations', 'hourly_rate', 'REAL NULL')  # Rate locked in at booking
+
+    # Indexes for the availability lookups on spots and reservations
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_spots_lot_status ON parking_spots (lot_id, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_spot_status ON reservations (spot_id, status, parking_timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_user ON reservations (user_id, parking_timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_status ON reservations (status, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_waitlist_lot_status ON waitlist (lot_id, status, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_waitlist_user_status ON waitlist (user_id, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reservations_plate ON reservations (plate, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vehicles_user ON vehicles (user_id)')
+
+    # Reservations still open from before dynamic pricing keep the base price they were booked at
+    cursor.execute('''
+        UPDATE reservations
+        SET hourly_rate = (SELECT pl.price FROM parking_spots ps JOIN parking_lots pl ON ps.lot_id = pl.id
+                           WHERE ps.id = reservations.spot_id)
+        WHERE status IN ('active', 'reserved', 'held') AND hourly_rate IS NULL
+    ''')
+
     # Create admin user if not exists
     cursor.execute('SELECT * FROM users WHERE username = ?', ('admin',))
     if not cursor.fetchone():
@@ -0,0 +1,182 @@
+from models.database import get_db_connection
+from models.archive import ReservationArchive, COLUMNS as ARCHIVE_COLUMNS, TIMESTAMP_COLUMNS, from_epoch
+from array import array
+import csv
+import io
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Arrow IPC export is offered only when pyarrow is installed
+    pa = pc = None
+
+# Column lists and queries for each exportable dataset. Each query reads one page
+# after a given id (the first column), so no statement stays open between chunks
+DATASETS = {
+    'lots': (
+        ['id', 'prime_location_name', 'price', 'address', 'pin_code', 'maximum_number_of_spots', 'created_at'],
+        'SELECT id, prime_location_name, price, address, pin_code, maximum_number_of_spots, created_at '
+        'FROM parking_lots WHERE id > ? ORDER BY id LIMIT ?',
+    ),
+    'spots': (
+        ['id', 'lot_id', 'spot_number', 'status'],
+        'SELECT id, lot_id, spot_number, status FROM parking_spots WHERE id > ? ORDER BY id LIMIT ?',
+    ),
+    'reservations': (
+        ['id', 'spot_id', 'lot_id', 'spot_number', 'user_id', 'parking_timestamp',
+         'leaving_timestamp', 'parking_cost', 'status'],
+        '''SELECT r.id, r.spot_id, ps.lot_id, ps.spot_number, r.user_id, r.parking_timestamp,
+                  r.leaving_timestamp, r.parking_cost, r.status
+           FROM reservations r
+           JOIN parking_spots ps ON r.spot_id = ps.id
+           WHERE r.id > ? AND r.parking_timestamp >= ? AND r.parking_timestamp < ?
+           ORDER BY r.id
+           LIMIT ?''',
+    ),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+if pa is not None:
+    FORMATS['arrow'] = 'application/vnd.apache.arrow.stream'
+
+INTEGER_FIELDS = ('id', 'spot_id', 'lot_id', 'spot_number', 'user_id', 'maximum_number_of_spots')
+FLOAT_FIELDS = ('price', 'parking_cost')
+
+
+def iter_column_chunks(dataset, since=None, until=None, chunk_size=5000):
+    """Yield (columns, archived) pairs, `columns` mapping each field to the values of up to one chunk.
+
+    Hot rows are read one page at a time, each a short read that holds no lock
+    while the client downloads it, so an export never keeps writers waiting;
+    reservations also include the archived (cold) tier one row group at a
+    time, with timestamps left as epoch seconds (archived=True). Never more
+    than one chunk is held in memory.
+    """
+    columns, query = DATASETS[dataset]
+    params = ()
+    if dataset == 'reservations':
+        params = (since or '0000-00-00 00:00:00', until or '9999-12-31 23:59:59')
+
+    conn = get_db_connection()
+    try:
+        last_id = 0
+        while True:
+            rows = conn.execute(query, (last_id,) + params + (chunk_size,)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield dict(zip(columns, zip(*rows))), False
+    finally:
+        conn.close()
+
+    if dataset == 'reservations':
+        for data in _iter_archived(columns, params[0], params[1]):
+            yield data, True
+
+
+def _iter_archived(columns, since, until):
+    archived = [name for name, kind in ARCHIVE_COLUMNS if name in columns]
+    for partition in ReservationArchive.partitions(newest_first=False):
+        # Partition names are months (YYYY-MM); skip whole files outside the range
+        if partition.month < since[:7] or partition.month > until[:7]:
+            continue
+        # Only the first and last month of the range need a per-row check
+        whole_month = since[:7] < partition.month < until[:7]
+        for data in partition.iter_row_groups(archived):
+            if not whole_month:
+                keep = [i for i, value in enumerate(data['parking_timestamp'])
+                        if since <= from_epoch(value) < until]
+                data = {name: array(values.typecode, (values[i] for i in keep)) if isinstance(values, array)
+                        else [values[i] for i in keep] for name, values in data.items()}
+            if len(data['parking_timestamp']):
+                yield data
+
+
+def iter_chunks(dataset, since=None, until=None, chunk_size=5000):
+    """Yield lists of row tuples for `dataset`, never holding more than one chunk in memory."""
+    columns = DATASETS[dataset][0]
+    for data, archived in iter_column_chunks(dataset, since, until, chunk_size):
+        values = [data[name] for name in columns]
+        if archived:
+            values = [[from_epoch(value) for value in column] if name in TIMESTAMP_COLUMNS else column
+                      for name, column in zip(columns, values)]
+        yield list(zip(*values))
+
+
+def stream_csv(dataset, **kwargs):
+    columns = DATASETS[dataset][0]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in iter_chunks(dataset, **kwargs):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(dataset, **kwargs):
+    columns = DATASETS[dataset][0]
+    for chunk in iter_chunks(dataset, **kwargs):
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in chunk)
+
+
+def _arrow_type(name):
+    if name in INTEGER_FIELDS:
+        return pa.int64()
+    if name in FLOAT_FIELDS:
+        return pa.float64()
+    if name in TIMESTAMP_COLUMNS:
+        return pa.timestamp('s')
+    return pa.string()
+
+
+def _arrow_array(name, values, archived):
+    arrow_type = _arrow_type(name)
+    if archived and isinstance(values, array):
+        # Wrap the decoded partition buffer as-is, without a Python object per value
+        raw = pa.Array.from_buffers(pa.int64() if values.typecode == 'q' else pa.float64(),
+                                    len(values), [None, pa.py_buffer(values)])
+        if name in TIMESTAMP_COLUMNS:
+            # 0 stands for a missing timestamp in the archive
+            return pc.if_else(pc.equal(raw, 0), pa.scalar(None, arrow_type), raw.cast(arrow_type))
+        return raw
+    if name in TIMESTAMP_COLUMNS:
+        return pa.array([value.replace(' ', 'T') if value else None for value in values], pa.string()) \
+            .cast(arrow_type)
+    return pa.array(values, arrow_type)
+
+
+def stream_arrow(dataset, **kwargs):
+    """Arrow IPC stream: one record batch per chunk, flushed as soon as it is written.
+
+    Batches are serialized into one reused in-memory buffer rather than
+    memory-mapped files: the stream goes straight to the response, so there is
+    no file for a reader to map. Archived chunks are wrapped without copying
+    (see _arrow_array); hot rows arrive from sqlite3 as Python values either way.
+    """
+    columns = DATASETS[dataset][0]
+    schema = pa.schema([(name, _arrow_type(name)) for name in columns])
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, schema) as writer:
+        for data, archived in iter_column_chunks(dataset, **kwargs):
+            writer.write_batch(pa.record_batch(
+                [_arrow_array(name, data[name], archived) for name in columns], schema=schema))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_export(dataset, fmt, **kwargs):
+    if fmt == 'ndjson':
+        return stream_ndjson(dataset, **kwargs)
+    if fmt == 'arrow':
+        return stream_arrow(dataset, **kwargs)
+    return stream_csv(dataset, **kwargs)
@@ -0,0 +1,272 @@
+from models.database import get_db_connection
+from models.reservation import Reservation
+from models.availability import AvailabilityIndex, TIMESTAMP_FORMAT, to_seconds
+from models.availability_board import AvailabilityBoard
+from models.pricing import PricingEngine
+from models.waitlist import Waitlist
+from models.vehicle import Vehicle, normalize_plate
+from datetime import datetime, timedelta
+import random
+import threading
+import time
+
+DIRECTIONS = ('entry', 'exit')
+MAX_CLOCK_SKEW = timedelta(minutes=5)  # Events stamped further in the future than this are rejected
+MAX_EVENT_AGE = timedelta(days=7)  # Readers buffer while offline; events older than this are rejected
+MAX_ID = 2 ** 63 - 1  # Largest integer SQLite stores
+
+
+def _parse_lot_id(value):
+    # JSON true would otherwise pass as lot 1
+    if isinstance(value, bool):
+        raise ValueError(f'invalid lot_id: {value}')
+    lot_id = int(value)
+    if not 1 <= lot_id <= MAX_ID:
+        raise ValueError(f'invalid lot_id: {value}')
+    return lot_id
+
+
+def _parse_timestamp(value):
+    # Readers send UTC as '2024-07-28 09:15:00', ISO 8601 ('...T09:15:00Z') or epoch seconds
+    if isinstance(value, bool):
+        raise ValueError(f'invalid timestamp: {value}')
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value).replace(microsecond=0)
+    value = str(value or '').strip().replace('T', ' ').rstrip('Z')
+    if not value:
+        raise ValueError('missing timestamp')
+    try:
+        return datetime.strptime(value[:19], TIMESTAMP_FORMAT)
+    except ValueError:
+        raise ValueError(f'invalid timestamp: {value}')
+
+
+class GateResult:
+    def __init__(self):
+        self.received = 0
+        self.duplicates = 0
+        self.entries = 0
+        self.exits = 0
+        self.rejected = []  # (index in the batch, reason)
+
+    def reject(self, index, reason):
+        self.rejected.append((index, reason))
+
+    def as_dict(self):
+        return {'received': self.received, 'duplicates': self.duplicates,
+                'entries': self.entries, 'exits': self.exits,
+                'rejected': [{'index': index, 'reason': reason} for index, reason in self.rejected]}
+
+
+class GateIngestor:
+    """Applies batches of entry/exit events from license-plate readers at lot gates.
+
+    Readers fire several times while a car passes, so repeats of the same lot,
+    plate and direction within dedup_window_seconds are dropped first. The rest
+    are applied in timestamp order, batch_size events per write transaction,
+    through Reservation.start_session/end_session. An entry opens a session for
+    the plate's owner (or tags the session they booked in the app); an exit
+    closes it. Open gate sessions are found through an in-memory plate index,
+    which is only a hint: every match is re-checked inside the transaction.
+    """
+
+    dedup_window_seconds = 30
+    batch_size = 500
+    mirror_ttl_seconds = 60
+
+    _lock = threading.Lock()
+    _last_seen = {}   # (lot_id, plate, direction) -> event time in epoch seconds
+    _owners = {}      # plate -> user_id
+    _sessions = {}    # (lot_id, plate) -> id of the open reservation
+    _loaded_at = None
+
+    @classmethod
+    def _load(cls):
+        conn = get_db_connection()
+        sessions = {(row['lot_id'], row['plate']): row['id'] for row in conn.execute('''
+            SELECT r.id, r.plate, ps.lot_id FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            WHERE r.status = 'active' AND r.plate IS NOT NULL
+        ''')}
+        conn.close()
+        cls._owners = Vehicle.get_plate_owners()
+        cls._sessions = sessions
+        cls._loaded_at = time.monotonic()
+
+    @classmethod
+    def _parse(cls, index, event, result):
+        try:
+            plate = normalize_plate(event.get('plate'))
+            if not plate:
+                raise ValueError('missing plate')
+            lot_id = _parse_lot_id(event.get('lot_id'))
+            direction = str(event.get('direction', '')).lower()
+            if direction not in DIRECTIONS:
+                raise ValueError('direction must be entry or exit')
+            when = _parse_timestamp(event.get('timestamp'))
+            now = datetime.utcnow()
+            if when > now + MAX_CLOCK_SKEW:
+                raise ValueError('timestamp is in the future')
+            if when < now - MAX_EVENT_AGE:
+                raise ValueError('timestamp is too old')
+        except (AttributeError, TypeError, ValueError, OverflowError, OSError) as e:
+            # OverflowError/OSError: numbers too large for an id or a datetime (inf, 1e20)
+            result.reject(index, str(e))
+            return None
+        return index, lot_id, plate, direction, when
+
+    @classmethod
+    def _deduplicate(cls, events, result):
+        # Caller holds cls._lock. Events are only remembered once their batch
+        # commits (see _remember), so a failed batch can be sent again
+        window = cls.dedup_window_seconds
+        kept, seen = [], {}
+        for event in events:
+            index, lot_id, plate, direction, when = event
+            key, seconds = (lot_id, plate, direction), to_seconds(when)
+            last = seen.get(key, cls._last_seen.get(key))
+            if last is not None and abs(seconds - last) < window:
+                result.duplicates += 1
+                continue
+            seen[key] = seconds
+            kept.append(event)
+        return kept
+
+    @classmethod
+    def _remember(cls, events):
+        # Caller holds cls._lock; events are in timestamp order
+        if not events:
+            return
+        for index, lot_id, plate, direction, when in events:
+            cls._last_seen[(lot_id, plate, direction)] = to_seconds(when)
+        oldest = to_seconds(events[-1][4]) - cls.dedup_window_seconds
+        cls._last_seen = {key: seconds for key, seconds in cls._last_seen.items() if seconds >= oldest}
+
+    @classmethod
+    def ingest(cls, events):
+        """Apply a list of event dicts (plate, lot_id, direction, timestamp). Returns a GateResult."""
+        result = GateResult()
+        result.received = len(events)
+        parsed = [cls._parse(index, event, result) for index, event in enumerate(events)]
+        parsed = sorted((event for event in parsed if event), key=lambda event: event[4])
+        PricingEngine.refresh({event[1] for event in parsed})
+
+        # One batch at a time per worker: the database allows a single writer anyway,
+        # and the plate index and dedup window stay consistent without finer locking
+        with cls._lock:
+            if cls._loaded_at is None or time.monotonic() - cls._loaded_at > cls.mirror_ttl_seconds:
+                cls._load()
+            parsed = cls._deduplicate(parsed, result)
+            for start in range(0, len(parsed), cls.batch_size):
+                batch = parsed[start:start + cls.batch_size]
+                cls._apply(batch, result)
+                cls._remember(batch)
+        return result
+
+    @classmethod
+    def _owner(cls, cursor, plate):
+        if plate not in cls._owners:
+            row = cursor.execute('SELECT user_id FROM vehicles WHERE plate = ?', (plate,)).fetchone()
+            if not row:
+                return None
+            cls._owners[plate] = row['user_id']
+        return cls._owners[plate]
+
+    @classmethod
+    def _find_session(cls, cursor, lot_id, plate, user_id):
+        # The plate index gives the reservation id directly; otherwise (or if it is
+        # stale) look for the plate's session, or one its owner booked in the app
+        columns = 'SELECT r.*, ps.lot_id, COALESCE(r.hourly_rate, pl.price) AS price FROM reservations r ' \
+                  'JOIN parking_spots ps ON r.spot_id = ps.id JOIN parking_lots pl ON ps.lot_id = pl.id '
+        reservation_id = cls._sessions.get((lot_id, plate))
+        if reservation_id is not None:
+            reservation = cursor.execute(columns + "WHERE r.id = ? AND r.status = 'active'",
+                                         (reservation_id,)).fetchone()
+            if reservation:
+                return reservation
+            del cls._sessions[(lot_id, plate)]
+        return cursor.execute(columns + '''
+            WHERE ps.lot_id = ? AND r.status = 'active'
+              AND (r.plate = ? OR (r.plate IS NULL AND r.user_id = ?))
+            ORDER BY r.plate IS NULL
+            LIMIT 1
+        ''', (lot_id, plate, user_id)).fetchone()
+
+    @classmethod
+    def _apply(cls, events, result):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        lots, offers = set(), []
+        try:
+            for index, lot_id, plate, direction, when in events:
+                user_id = cls._owner(cursor, plate)
+                reservation = cls._find_session(cursor, lot_id, plate, user_id)
+                if direction == 'entry':
+                    if user_id is None:
+                        result.reject(index, 'unknown plate')
+                    elif reservation and reservation['plate'] is None:
+                        # The driver booked in the app before arriving
+                        cursor.execute('UPDATE reservations SET plate = ? WHERE id = ?', (plate, reservation['id']))
+                        cls._sessions[(lot_id, plate)] = reservation['id']
+                        result.entries += 1
+                    elif reservation:
+                        result.duplicates += 1
+                    else:
+                        session = Reservation.start_session(cursor, lot_id, user_id, when, plate)
+                        if session is None:
+                            result.reject(index, 'no free spot')
+                            continue
+                        # Recorded before commit so the rest of this batch sees the spot as taken
+                        AvailabilityIndex.record(lot_id, session[1], when.strftime(TIMESTAMP_FORMAT), None)
+                        cls._sessions[(lot_id, plate)] = session[0]
+                        lots.add(lot_id)
+                        result.entries += 1
+                else:
+                    if not reservation:
+                        result.reject(index, 'no open session')
+                        continue
+                    leaving = max(when, datetime.strptime(reservation['parking_timestamp'], TIMESTAMP_FORMAT))
+                    parking_cost, offer = Reservation.end_session(cursor, reservation, leaving)
+                    AvailabilityIndex.forget(lot_id, reservation['spot_id'], reservation['parking_timestamp'], None)
+                    cls._sessions.pop((lot_id, plate), None)
+                    offers.append(offer)
+                    lots.add(lot_id)
+                    result.exits += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # The index and plate mirror already reflect the rolled-back events
+            for lot_id in lots:
+                AvailabilityIndex.invalidate(lot_id)
+            cls._loaded_at = None
+            raise
+        finally:
+            conn.close()
+        AvailabilityBoard.refresh_lots(lots)
+        for offer in offers:
+            Waitlist.notify(offer)
+
+
+def simulate_events(plates, lot_ids, count, start=None, repeat_reads=3):
+    """Yield `count` synthetic gate events: each plate enters a random lot, then leaves it.
+
+    Every pass is read 1..repeat_reads times a second apart, like a real reader.
+    """
+    start = start or datetime.utcnow().replace(microsecond=0) - timedelta(days=1)
+    parked = {}
+    emitted, clock = 0, start
+    while emitted < count:
+        plate = random.choice(plates)
+        if plate in parked:
+            lot_id, direction = parked.pop(plate), 'exit'
+        else:
+            lot_id, direction = random.choice(lot_ids), 'entry'
+            parked[plate] = lot_id
+        clock += timedelta(seconds=1)
+        for read in range(random.randint(1, repeat_reads)):
+            yield {'plate': plate, 'lot_id': lot_id, 'direction': direction,
+                   'timestamp': (clock + timedelta(seconds=read)).strftime(TIMESTAMP_FORMAT)}
+            emitted += 1
+            if emitted >= count:
+                return
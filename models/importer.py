@@ -0,0 +1,259 @@
+from models.database import get_db_connection
+from models.availability import AvailabilityIndex, TIMESTAMP_FORMAT
+from models.availability_board import AvailabilityBoard
+from werkzeug.security import generate_password_hash
+from datetime import datetime
+import csv
+import json
+import math
+
+ENTITIES = ('lots', 'users', 'reservations')
+HISTORICAL_STATUSES = ('completed', 'abandoned', 'cancelled', 'expired')
+PASSWORD_HASH_METHODS = ('pbkdf2:', 'scrypt:')
+
+
+def read_records(stream, fmt):
+    """Yield one dict per input record from a text stream without loading the whole file.
+
+    `fmt` is 'csv' (header row required) or 'ndjson' (one JSON object per line).
+    A line that is not valid JSON is yielded as the ValueError describing it, so
+    the importer can reject that row and carry on.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:  # json.JSONDecodeError, or invalid UTF-8
+                    yield ValueError(f'invalid JSON: {e}')
+
+
+def _chunks(records, chunk_size):
+    chunk = []
+    for number, record in enumerate(records, start=1):
+        chunk.append((number, record))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(record, field):
+    value = record.get(field)
+    if value is None or str(value).strip() == '':
+        raise ValueError(f'missing {field}')
+    return str(value).strip()
+
+
+def _number(record, field, required=True):
+    value = record.get(field)
+    if required:
+        value = _text(record, field)
+    elif value is None or str(value).strip() == '':
+        return 0.0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'invalid {field}: {value}')
+    if not math.isfinite(number):
+        raise ValueError(f'{field} must be a finite number')
+    return number
+
+
+def _timestamp(record, field, required=True):
+    value = record.get(field)
+    if not value:
+        if required:
+            raise ValueError(f'missing {field}')
+        return None
+    value = str(value).strip().replace('T', ' ')
+    if len(value) == 19 and value[10] == ' ':
+        # Already in TIMESTAMP_FORMAT (the common case): validate with the C parser, keep the text
+        try:
+            datetime.fromisoformat(value)
+            return value
+        except ValueError:
+            pass
+    for fmt in (TIMESTAMP_FORMAT, '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.strptime(value, fmt).strftime(TIMESTAMP_FORMAT)
+        except ValueError:
+            pass
+    raise ValueError(f'invalid {field}: {value}')
+
+
+class ImportResult:
+    def __init__(self, entity):
+        self.entity = entity
+        self.processed = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = []
+
+    def error(self, number, message):
+        self.errors.append((number, message))
+
+    def __str__(self):
+        return (f'{self.entity}: {self.processed} processed, {self.inserted} inserted, '
+                f'{self.skipped} skipped, {len(self.errors)} invalid')
+
+
+class Importer:
+    """Chunked bulk loader for lots, users and historical reservations.
+
+    Each chunk is validated in Python, then written with executemany inside a
+    single transaction. Invalid rows are reported and skipped; they never
+    abort the rest of the chunk.
+    """
+
+    def __init__(self, chunk_size=10000, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        # (lot id, spot number) -> spot id and username -> user id, filled as chunks mention them
+        self._spots = {}
+        self._lots_seen = set()
+        self._users = {}
+        self._new_lots = []  # Published on the availability board once their chunk commits
+
+    def run(self, entity, records):
+        result = ImportResult(entity)
+        load_chunk = getattr(self, f'_load_{entity}')
+        conn = get_db_connection()
+        try:
+            for chunk in _chunks(records, self.chunk_size):
+                valid = []
+                for number, record in chunk:
+                    if isinstance(record, dict):
+                        valid.append((number, record))
+                    else:
+                        result.error(number, str(record) if isinstance(record, ValueError)
+                                     else 'record is not a JSON object')
+                load_chunk(conn, valid, result)
+                conn.commit()
+                AvailabilityBoard.refresh_lots(self._new_lots)
+                self._new_lots = []
+                result.processed += len(chunk)
+                if self.progress:
+                    self.progress(result)
+        finally:
+            conn.close()
+        return result
+
+    def _load_lots(self, conn, chunk, result):
+        lots = []
+        for number, record in chunk:
+            try:
+                lot = (_text(record, 'prime_location_name'), _number(record, 'price'),
+                       _text(record, 'address'), _text(record, 'pin_code'),
+                       int(_text(record, 'maximum_number_of_spots')))
+                if lot[1] < 0 or lot[4] <= 0:
+                    raise ValueError('price must be >= 0 and maximum_number_of_spots > 0')
+            except ValueError as e:
+                result.error(number, str(e))
+                continue
+            lots.append(lot)
+        if not lots:
+            return
+
+        cursor = conn.cursor()
+        # Take the write lock first: AUTOINCREMENT then hands this chunk the ids after the current maximum
+        if not conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        first_id = cursor.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM parking_lots').fetchone()[0]
+        cursor.executemany('''
+            INSERT INTO parking_lots (prime_location_name, price, address, pin_code, maximum_number_of_spots)
+            VALUES (?, ?, ?, ?, ?)
+        ''', lots)
+        lot_ids = [row['id'] for row in cursor.execute(
+            'SELECT id FROM parking_lots WHERE id >= ? ORDER BY id', (first_id,))]
+        cursor.executemany(
+            "INSERT INTO parking_spots (lot_id, spot_number, status) VALUES (?, ?, 'A')",
+            ((lot_id, i) for lot_id, lot in zip(lot_ids, lots) for i in range(1, lot[4] + 1))
+        )
+        self._new_lots.extend(lot_ids)
+        result.inserted += len(lots)
+
+    def _load_users(self, conn, chunk, result):
+        rows = []
+        for number, record in chunk:
+            try:
+                username, email = _text(record, 'username'), _text(record, 'email')
+                role = str(record.get('role') or 'user').strip()
+                if role not in ('user', 'admin'):
+                    raise ValueError(f'invalid role: {role}')
+                # Accept hashes exported from another system to skip the expensive pbkdf2 step
+                password_hash = str(record.get('password_hash') or '').strip()
+                if password_hash:
+                    if not password_hash.startswith(PASSWORD_HASH_METHODS):
+                        raise ValueError('password_hash is not a werkzeug hash')
+                else:
+                    password_hash = generate_password_hash(_text(record, 'password'))
+            except ValueError as e:
+                result.error(number, str(e))
+                continue
+            rows.append((username, password_hash, email, role))
+
+        # Existing usernames/emails are skipped by the UNIQUE constraints instead of a per-row lookup
+        inserted = conn.executemany('''
+            INSERT OR IGNORE INTO users (username, password_hash, email, role)
+            VALUES (?, ?, ?, ?)
+        ''', rows).rowcount
+        result.inserted += inserted
+        result.skipped += len(rows) - inserted
+
+    def _load_reservations(self, conn, chunk, result):
+        # Resolve the (lot, spot number) pairs and usernames not seen in earlier chunks
+        lot_ids = {str(record.get('lot_id', '')).strip() for number, record in chunk} - self._lots_seen
+        usernames = {str(record.get('username', '')).strip() for number, record in chunk} - set(self._users)
+        spots, users = self._spots, self._users
+        for lot_id in lot_ids:
+            if lot_id.isdigit():
+                for spot in conn.execute('SELECT id, spot_number FROM parking_spots WHERE lot_id = ?', (int(lot_id),)):
+                    spots[(lot_id, str(spot['spot_number']))] = spot['id']
+        self._lots_seen |= lot_ids
+        usernames = [name for name in usernames if name]
+        for start in range(0, len(usernames), 500):
+            batch = usernames[start:start + 500]
+            placeholders = ','.join('?' for _ in batch)
+            for user in conn.execute(f'SELECT id, username FROM users WHERE username IN ({placeholders})', batch):
+                users[user['username']] = user['id']
+
+        rows = []
+        for number, record in chunk:
+            try:
+                key = (_text(record, 'lot_id'), _text(record, 'spot_number'))
+                if key not in spots:
+                    raise ValueError(f'unknown spot {key[1]} in lot {key[0]}')
+                username = _text(record, 'username')
+                if username not in users:
+                    raise ValueError(f'unknown user: {username}')
+                status = str(record.get('status') or 'completed').strip()
+                if status not in HISTORICAL_STATUSES:
+                    raise ValueError(f'status must be one of {", ".join(HISTORICAL_STATUSES)}')
+                parking_timestamp = _timestamp(record, 'parking_timestamp')
+                leaving_timestamp = _timestamp(record, 'leaving_timestamp', required=(status == 'completed'))
+                if leaving_timestamp and leaving_timestamp < parking_timestamp:
+                    raise ValueError('leaving_timestamp is before parking_timestamp')
+                parking_cost = _number(record, 'parking_cost', required=False)
+            except ValueError as e:
+                result.error(number, str(e))
+                continue
+            rows.append((spots[key], users[username], parking_timestamp, leaving_timestamp,
+                         parking_cost, status))
+
+        conn.executemany('''
+            INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        result.inserted += len(rows)
+
+
+def import_file(entity, stream, fmt, chunk_size=10000, progress=None):
+    result = Importer(chunk_size, progress).run(entity, read_records(stream, fmt))
+    if entity == 'lots':
+        AvailabilityIndex.invalidate()
+    return result
@@ -1,4 +1,9 @@
 from models.database import get_db_connection
+from models.availability import AvailabilityIndex, TIMESTAMP_FORMAT, WALK_IN_HORIZON
+from models.availability_board import AvailabilityBoard
+from models.pricing import PricingEngine
+from models.waitlist import Waitlist
+from datetime import datetime
 
 class ParkingLot:
     def __init__(self, id, prime_location_name, price, address, pin_code, maximum_number_of_spots, created_at):
@@ -10,8 +15,30 @@ class ParkingLot:
         self.maximum_number_of_spots = maximum_number_of_spots
         self.created_at = created_at
 
+    @staticmethod
+    def _lots_from_board():
+        # Lot rows with spot counts from the shared availability board, or None
+        # if the board is off or does not know every lot (callers then use SQL)
+        if not AvailabilityBoard.is_attached():
+            return None
+        conn = get_db_connection()
+        lots = conn.execute('SELECT * FROM parking_lots ORDER BY id').fetchall()
+        conn.close()
+        counts = AvailabilityBoard.read_all()
+        if counts is None or any(lot['id'] not in counts for lot in lots):
+            return None
+        result = []
+        for lot in lots:
+            available, occupied = counts[lot['id']]
+            result.append(dict(lot, total_spots=available + occupied,
+                               available_spots=available, occupied_spots=occupied))
+        return result
+
     @staticmethod
     def get_all():
+        lots = ParkingLot._lots_from_board()
+        if lots is not None:
+            return lots
         conn = get_db_connection()
         lots = conn.execute('''
             SELECT pl.*, 
@@ -25,6 +52,41 @@ class ParkingLot:
         conn.close()
         return lots
 
+    @staticmethod
+    def iter_all(chunk_size=500):
+        # Same rows as get_all(), yielded in chunks for streamed pages. Each chunk is
+        # its own short read after the last id, so no lock is held while a slow
+        # client receives the page
+        conn = get_db_connection()
+        try:
+            last_id = 0
+            while True:
+                rows = conn.execute('''
+                    SELECT pl.*, 
+                           COUNT(ps.id) AS total_spots,
+                           CAST(SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) AS INTEGER) AS available_spots,
+                           CAST(SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END) AS INTEGER) AS occupied_spots
+                    FROM parking_lots pl
+                    LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
+                    WHERE pl.id > ?
+                    GROUP BY pl.id
+                    ORDER BY pl.id
+                    LIMIT ?
+                ''', (last_id, chunk_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                yield from rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def count():
+        conn = get_db_connection()
+        count = conn.execute('SELECT COUNT(*) FROM parking_lots').fetchone()[0]
+        conn.close()
+        return count
+
     @staticmethod
     def get_by_id(lot_id):
         conn = get_db_connection()
@@ -54,6 +116,7 @@ class ParkingLot:
         
         conn.commit()
         conn.close()
+        AvailabilityBoard.refresh_lot(lot_id)
         return lot_id
 
     @staticmethod
@@ -62,8 +125,10 @@ class ParkingLot:
         cursor = conn.cursor()
 
         # Get current lot details to compare max_spots
+        cursor.execute('BEGIN IMMEDIATE')
         current_lot = cursor.execute('SELECT maximum_number_of_spots FROM parking_lots WHERE id = ?', (lot_id,)).fetchone()
         if not current_lot:
+            conn.rollback()
             conn.close()
             return False
         
@@ -76,13 +141,17 @@ class ParkingLot:
         ''', (location_name, price, address, pin_code, max_spots, lot_id))
 
         # Adjust parking spots if max_spots changed
+        offers = []
         if max_spots > old_max_spots:
-            # Add new spots
+            # Add new spots; people already on the waitlist get them before any walk-in
             for i in range(old_max_spots + 1, max_spots + 1):
                 cursor.execute('''
                     INSERT INTO parking_spots (lot_id, spot_number, status)
                     VALUES (?, ?, 'A')
                 ''', (lot_id, i))
+                offer = Waitlist.hand_off(cursor, lot_id, cursor.lastrowid)
+                if offer:
+                    offers.append(offer)
         elif max_spots < old_max_spots:
             # Remove excess spots (only if they are available)
             # This is a simplified deletion. In a real app, you'd handle occupied spots carefully.
@@ -95,6 +164,12 @@ class ParkingLot:
 
         conn.commit()
         conn.close()
+        AvailabilityBoard.refresh_lot(lot_id)
+        AvailabilityIndex.invalidate(lot_id)
+        # Rebuild the lot's rate table from the new base price; sessions already booked keep their rate
+        PricingEngine.invalidate(lot_id)
+        for offer in offers:
+            Waitlist.notify(offer)
         return True
 
     @staticmethod
@@ -114,12 +189,15 @@ class ParkingLot:
 
             # Delete associated reservations first (or set to inactive/completed)
             cursor.execute('DELETE FROM reservations WHERE spot_id IN (SELECT id FROM parking_spots WHERE lot_id = ?)', (lot_id,))
+            cursor.execute('DELETE FROM waitlist WHERE lot_id = ?', (lot_id,))
             # Delete associated parking spots
             cursor.execute('DELETE FROM parking_spots WHERE lot_id = ?', (lot_id,))
             # Delete the parking lot
             cursor.execute('DELETE FROM parking_lots WHERE id = ?', (lot_id,))
             conn.commit()
             conn.close()
+            AvailabilityBoard.refresh_lot(lot_id)
+            AvailabilityIndex.invalidate(lot_id)
             return True
         except Exception as e:
             print(f"Error deleting parking lot: {e}")
@@ -127,19 +205,45 @@ class ParkingLot:
             return False
 
     @staticmethod
-    def get_available_lots():
+    def _walk_in_lots():
+        """Every lot with spots, where available_spots counts only the spots a walk-in can take now.
+
+        A free spot with a booking within WALK_IN_HORIZON is left out, the same
+        rule book_spot and Waitlist.join apply, so a lot listed as available can
+        be booked and a lot that cannot is listed as full (with its waitlist).
+        """
+        lots = ParkingLot._lots_from_board()
         conn = get_db_connection()
-        lots = conn.execute('''
-            SELECT pl.*, 
-                   COUNT(ps.id) as total_spots,
-                   SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END) as available_spots
-            FROM parking_lots pl
-            LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
-            GROUP BY pl.id
-            HAVING available_spots > 0
-        ''').fetchall()
+        if lots is None:
+            lots = [dict(row) for row in conn.execute('''
+                SELECT pl.*,
+                       COUNT(ps.id) as total_spots,
+                       COALESCE(SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END), 0) as available_spots
+                FROM parking_lots pl
+                LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
+                GROUP BY pl.id
+            ''')]
+        now = datetime.utcnow().replace(microsecond=0)
+        blocked = {row['lot_id']: row['blocked'] for row in conn.execute('''
+            SELECT ps.lot_id, COUNT(DISTINCT ps.id) AS blocked
+            FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            WHERE r.status = 'reserved' AND ps.status = 'A'
+              AND r.parking_timestamp < ? AND r.reserved_until > ?
+            GROUP BY ps.lot_id
+        ''', ((now + WALK_IN_HORIZON).strftime(TIMESTAMP_FORMAT), now.strftime(TIMESTAMP_FORMAT)))}
         conn.close()
-        return lots
+        for lot in lots:
+            lot['available_spots'] = max(0, lot['available_spots'] - blocked.get(lot['id'], 0))
+        return [lot for lot in lots if lot['total_spots'] > 0]
+
+    @staticmethod
+    def get_available_lots():
+        return [lot for lot in ParkingLot._walk_in_lots() if lot['available_spots'] > 0]
+
+    @staticmethod
+    def get_full_lots():
+        return [lot for lot in ParkingLot._walk_in_lots() if lot['available_spots'] == 0]
 
     @staticmethod
     def get_spots_by_lot_id(lot_id):
@@ -155,6 +259,45 @@ class ParkingLot:
         conn.close()
         return spots
 
+    @staticmethod
+    def iter_spots_by_lot_id(lot_id, chunk_size=1000):
+        # Streaming version of get_spots_by_lot_id for garages with thousands of spots,
+        # read a chunk at a time after the last spot number like iter_all()
+        conn = get_db_connection()
+        try:
+            last_number = 0
+            while True:
+                rows = conn.execute('''
+                    SELECT ps.*, r.user_id, r.parking_timestamp, u.username
+                    FROM parking_spots ps
+                    LEFT JOIN reservations r ON ps.id = r.spot_id AND r.status = 'active'
+                    LEFT JOIN users u ON r.user_id = u.id
+                    WHERE ps.lot_id = ? AND ps.spot_number > ?
+                    ORDER BY ps.spot_number
+                    LIMIT ?
+                ''', (lot_id, last_number, chunk_size)).fetchall()
+                if not rows:
+                    break
+                last_number = rows[-1]['spot_number']
+                yield from rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_spot_counts(lot_id):
+        conn = get_db_connection()
+        counts = conn.execute('''
+            SELECT COUNT(*) AS total,
+                   COALESCE(SUM(CASE WHEN status = 'A' THEN 1 ELSE 0 END), 0) AS available,
+                   COALESCE(SUM(CASE WHEN status = 'O' THEN 1 ELSE 0 END), 0) AS occupied,
+                   (SELECT COUNT(*) FROM reservations r JOIN parking_spots s ON r.spot_id = s.id
+                    WHERE s.lot_id = ? AND r.status = 'active') AS active
+            FROM parking_spots
+            WHERE lot_id = ?
+        ''', (lot_id, lot_id)).fetchone()
+        conn.close()
+        return counts
+
     @staticmethod
     def search_lots(query):
         conn = get_db_connection()
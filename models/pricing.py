@@ -0,0 +1,162 @@
+from models.database import get_db_connection
+from models.availability_board import AvailabilityBoard
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+import threading
+import time
+
+
+# Base price and spot counts of the given lots, one indexed scan of each lot's spots
+LOTS_QUERY = '''
+    SELECT pl.id AS lot_id, pl.price,
+           COALESCE(SUM(CASE WHEN ps.status = 'A' THEN 1 ELSE 0 END), 0) AS available,
+           COALESCE(SUM(CASE WHEN ps.status = 'O' THEN 1 ELSE 0 END), 0) AS occupied
+    FROM parking_lots pl
+    LEFT JOIN parking_spots ps ON pl.id = ps.lot_id
+    WHERE pl.id IN ({placeholders})
+    GROUP BY pl.id
+'''
+
+
+class PricingEngine:
+    """Hourly rate of each lot from its base price, live occupancy and the time of day.
+
+    For every lot the rates of all (occupancy tier, hour) pairs are precomputed
+    into one flat array, so a lookup is an index into it. Tables are only
+    rebuilt when a lot's base price changes. This worker's writes report new
+    counts through the AvailabilityBoard listener after they commit, which
+    moves a lot to another tier when its occupancy crosses a threshold. Other
+    workers' writes and price edits are picked up by re-reading a lot once it
+    is more than tier_ttl_seconds old, one lot at a time and never inside a
+    write transaction: writers call refresh() before they take the lock.
+
+    The rate in effect is snapshotted onto each reservation when it is booked
+    (reservations.hourly_rate), so later price changes never reprice it.
+    """
+
+    enabled = True
+    # Multiplier for each hour of the day (local time = UTC + utc_offset_hours)
+    hour_multipliers = [0.8] * 6 + [1.0] * 2 + [1.25] * 3 + [1.0] * 6 + [1.25] * 3 + [1.0] * 2 + [0.8] * 2
+    utc_offset_hours = 0
+    # (minimum occupied fraction, multiplier), by ascending threshold
+    occupancy_tiers = ((0.0, 0.9), (0.5, 1.0), (0.75, 1.25), (0.9, 1.5))
+    tier_ttl_seconds = 5
+
+    _tables = {}      # lot_id -> array('d') of len(occupancy_tiers) * 24 rates, one row per tier
+    _base_prices = {}  # lot_id -> base price the table was built from
+    _tiers = {}       # lot_id -> current occupancy tier index
+    _read_at = {}     # lot_id -> monotonic time the lot was last read from the database
+    _thresholds = [threshold for threshold, multiplier in occupancy_tiers]
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, enabled=True, hour_multipliers=None, occupancy_tiers=None, utc_offset_hours=0):
+        if hour_multipliers is not None:
+            if len(hour_multipliers) != 24:
+                raise ValueError('hour_multipliers needs one value per hour')
+            cls.hour_multipliers = list(hour_multipliers)
+        if occupancy_tiers is not None:
+            cls.occupancy_tiers = tuple(sorted(occupancy_tiers))
+        cls.enabled = enabled
+        cls.utc_offset_hours = utc_offset_hours
+        cls._thresholds = [threshold for threshold, multiplier in cls.occupancy_tiers]
+        cls.invalidate()
+
+    @classmethod
+    def invalidate(cls, lot_id=None):
+        with cls._lock:
+            if lot_id is None:
+                cls._tables, cls._base_prices, cls._tiers, cls._read_at = {}, {}, {}, {}
+            else:
+                cls._read_at.pop(lot_id, None)
+
+    @classmethod
+    def _build_table(cls, base_price):
+        return array('d', (round(base_price * tier_multiplier * hour_multiplier, 2)
+                           for threshold, tier_multiplier in cls.occupancy_tiers
+                           for hour_multiplier in cls.hour_multipliers))
+
+    @classmethod
+    def _tier(cls, counts):
+        available, occupied = counts
+        total = available + occupied
+        return bisect_right(cls._thresholds, occupied / total if total else 0.0) - 1
+
+    @classmethod
+    def observe(cls, lot_id, counts):
+        # AvailabilityBoard listener: called after commit with a lot's new (available, occupied), or None once deleted
+        if counts is None:
+            cls._tiers.pop(lot_id, None)
+            return
+        cls._tiers[lot_id] = cls._tier(counts)
+
+    @classmethod
+    def _is_stale(cls, lot_id, now):
+        read_at = cls._read_at.get(lot_id)
+        return read_at is None or now - read_at > cls.tier_ttl_seconds
+
+    @classmethod
+    def _load(cls, conn, lot_ids):
+        # Caller holds cls._lock. Rebuilds a table only if the lot's base price changed
+        now = time.monotonic()
+        found = set()
+        for start in range(0, len(lot_ids), 500):
+            batch = lot_ids[start:start + 500]
+            query = LOTS_QUERY.format(placeholders=','.join('?' for _ in batch))
+            for row in conn.execute(query, batch):
+                lot_id = row['lot_id']
+                found.add(lot_id)
+                if cls._base_prices.get(lot_id) != row['price'] or lot_id not in cls._tables:
+                    cls._tables[lot_id] = cls._build_table(row['price'])
+                    cls._base_prices[lot_id] = row['price']
+                cls._tiers[lot_id] = cls._tier((row['available'], row['occupied']))
+                cls._read_at[lot_id] = now
+        for lot_id in set(lot_ids) - found:  # Deleted
+            for cache in (cls._tables, cls._base_prices, cls._tiers, cls._read_at):
+                cache.pop(lot_id, None)
+
+    @classmethod
+    def refresh(cls, lot_ids):
+        """Re-read the lots among `lot_ids` older than tier_ttl_seconds. Call it outside write transactions."""
+        now = time.monotonic()
+        if not any(cls._is_stale(lot_id, now) for lot_id in lot_ids):
+            return
+        with cls._lock:
+            stale = [lot_id for lot_id in dict.fromkeys(lot_ids) if cls._is_stale(lot_id, now)]
+            if stale:
+                conn = get_db_connection()
+                try:
+                    cls._load(conn, stale)
+                finally:
+                    conn.close()
+
+    @classmethod
+    def rate(cls, lot_id, when=None, conn=None):
+        """Current hourly rate of the lot (at `when`, a naive UTC datetime), or None if the lot does not exist.
+
+        Inside a write transaction pass its `conn`: the cached rate is used as it
+        is (the caller refreshed the lot before taking the lock), and only a lot
+        never seen before is read, through `conn`.
+        """
+        if conn is None:
+            cls.refresh([lot_id])
+        elif lot_id not in cls._tables:
+            with cls._lock:
+                cls._load(conn, [lot_id])
+        table = cls._tables.get(lot_id)
+        if table is None:
+            return None
+        if not cls.enabled:
+            return cls._base_prices[lot_id]
+        when = (when or datetime.utcnow()) + timedelta(hours=cls.utc_offset_hours)
+        return table[cls._tiers.get(lot_id, 0) * 24 + when.hour]
+
+    @classmethod
+    def rates(cls, lot_ids, when=None):
+        lot_ids = list(lot_ids)
+        cls.refresh(lot_ids)
+        return {lot_id: cls.rate(lot_id, when) for lot_id in lot_ids}
+
+
+AvailabilityBoard.listeners.append(PricingEngine.observe)
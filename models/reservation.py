@@ -1,13 +1,21 @@
 from models.database import get_db_connection
-from datetime import datetime
+from models.availability import AvailabilityIndex, TIMESTAMP_FORMAT, WALK_IN_HORIZON
+from models.archive import ReservationArchive
+from models.waitlist import Waitlist
+from models.availability_board import AvailabilityBoard
+from models.pricing import PricingEngine
+from datetime import datetime, timedelta
 import math # Import math for ceil function
 
+# Upper bound used when comparing open-ended (active) sessions against a time window
+FAR_FUTURE = '9999-12-31 23:59:59'
+
 class Reservation:
     @staticmethod
     def get_user_active_reservations(user_id):
         conn = get_db_connection()
         reservations_data = conn.execute('''
-            SELECT r.*, ps.spot_number, pl.prime_location_name, pl.price
+            SELECT r.*, ps.spot_number, pl.prime_location_name, COALESCE(r.hourly_rate, pl.price) AS price
             FROM reservations r
             JOIN parking_spots ps ON r.spot_id = ps.id
             JOIN parking_lots pl ON ps.lot_id = pl.id
@@ -45,7 +53,7 @@ class Reservation:
     def get_user_history(user_id, limit=10):
         conn = get_db_connection()
         history_data = conn.execute('''
-            SELECT r.*, ps.spot_number, pl.prime_location_name, pl.price
+            SELECT r.*, ps.spot_number, pl.prime_location_name, COALESCE(r.hourly_rate, pl.price) AS price
             FROM reservations r
             JOIN parking_spots ps ON r.spot_id = ps.id
             JOIN parking_lots pl ON ps.lot_id = pl.id
@@ -54,10 +62,17 @@ class Reservation:
             LIMIT ?
         ''', (user_id, limit)).fetchall()
         conn.close()
+        history_data = [dict(h_data) for h_data in history_data]
+
+        # Merge in archived (cold) rows unless the hot rows alone are already newer than all of them
+        newest_archived = ReservationArchive.newest_timestamp()
+        if newest_archived and (len(history_data) < limit or history_data[-1]['parking_timestamp'] <= newest_archived):
+            history_data.extend(ReservationArchive.get_user_rows(user_id, limit))
+            history_data.sort(key=lambda h: h['parking_timestamp'], reverse=True)
+            history_data = history_data[:limit]
         
         history = []
-        for h_data in history_data:
-            h_dict = dict(h_data)
+        for h_dict in history_data:
             
             # Convert parking_timestamp to datetime object
             if isinstance(h_dict['parking_timestamp'], str):
@@ -81,82 +96,288 @@ class Reservation:
         return history
 
     @staticmethod
-    def book_spot(lot_id, user_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Find first available spot in the lot
-        spot = cursor.execute('''
-            SELECT id FROM parking_spots 
-            WHERE lot_id = ? AND status = 'A' 
-            ORDER BY spot_number 
+    def calculate_cost(parking_start, parking_end, price):
+        # Ensure parking_start is a datetime object for calculation
+        if isinstance(parking_start, str):
+            parking_start = datetime.strptime(parking_start, TIMESTAMP_FORMAT)
+        # Calculate hours, rounding up to the nearest whole hour, with a minimum of 1 hour
+        hours_parked = max(1, math.ceil((parking_end - parking_start).total_seconds() / 3600))
+        return hours_parked * price
+
+    @staticmethod
+    def _spot_is_free(cursor, spot_id, start, end):
+        clash = cursor.execute('''
+            SELECT 1 FROM reservations
+            WHERE spot_id = ? AND status IN ('active', 'reserved', 'held')
+              AND parking_timestamp < ? AND COALESCE(reserved_until, ?) > ?
             LIMIT 1
-        ''', (lot_id,)).fetchone()
-        
-        if not spot:
-            conn.close()
-            return False
-        
-        spot_id = spot['id']
-        
-        # Create reservation
+        ''', (spot_id, end, FAR_FUTURE, start)).fetchone()
+        return clash is None
+
+    @staticmethod
+    def _pick_spot(cursor, lot_id, start_time, end_time=None, exclude=()):
+        """Best-fit spot free for [start_time, end_time), re-checked in SQL inside the caller's transaction.
+
+        end_time=None is a walk-in: the spot must be free now and for
+        WALK_IN_HORIZON. A spot the re-check rejects (the cached view was
+        stale) is excluded and the search repeats; returns None if no spot fits.
+        """
+        walk_in = end_time is None
+        start = start_time.strftime(TIMESTAMP_FORMAT)
+        end = (start_time + WALK_IN_HORIZON if walk_in else end_time).strftime(TIMESTAMP_FORMAT)
+        rejected = set(exclude)
+        while True:
+            spot_id = AvailabilityIndex.find_spot(lot_id, start_time, end_time, conn=cursor.connection,
+                                                  exclude=rejected)
+            if spot_id is None:
+                return None
+            status = cursor.execute('SELECT status FROM parking_spots WHERE id = ?', (spot_id,)).fetchone()
+            if (status and (not walk_in or status['status'] == 'A')
+                    and Reservation._spot_is_free(cursor, spot_id, start, end)):
+                return spot_id
+            # Reload once from the database; keep excluding what the re-check rejected
+            if len(rejected) == len(exclude):
+                AvailabilityIndex.invalidate(lot_id)
+            rejected.add(spot_id)
+
+    @staticmethod
+    def start_session(cursor, lot_id, user_id, now, plate=None):
+        """Open a parking session on the best free spot, inside the caller's write transaction.
+
+        Returns (reservation_id, spot_id), or None if the lot has no free spot. The
+        caller commits, then records the session in the AvailabilityIndex.
+        """
+        start = now.strftime(TIMESTAMP_FORMAT)
+        spot_id = Reservation._pick_spot(cursor, lot_id, now)
+        if spot_id is None:
+            return None
+
+        # Create reservation, locking in the rate in effect now
         cursor.execute('''
-            INSERT INTO reservations (spot_id, user_id, status)
-            VALUES (?, ?, 'active')
-        ''', (spot_id, user_id))
-        
+            INSERT INTO reservations (spot_id, user_id, parking_timestamp, status, plate, hourly_rate)
+            VALUES (?, ?, ?, 'active', ?, ?)
+        ''', (spot_id, user_id, start, plate, PricingEngine.rate(lot_id, now, conn=cursor.connection)))
+        reservation_id = cursor.lastrowid
+
         # Update spot status
         cursor.execute('''
             UPDATE parking_spots SET status = 'O' WHERE id = ?
         ''', (spot_id,))
+        return reservation_id, spot_id
+
+    @staticmethod
+    def book_spot(lot_id, user_id, retry_lapsed_holds=True):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        now = datetime.utcnow().replace(microsecond=0)
+        # Any re-read of the lot's rate happens here, not under the write lock
+        PricingEngine.refresh([lot_id])
+
+        # Take the write lock up front so the availability check and the insert are atomic
+        cursor.execute('BEGIN IMMEDIATE')
+        session = Reservation.start_session(cursor, lot_id, user_id, now)
+        if session is None:
+            conn.rollback()
+            conn.close()
+            # A full lot may only be full because of holds the scheduler has not expired yet
+            if retry_lapsed_holds and Waitlist.expire_holds(lot_id):
+                return Reservation.book_spot(lot_id, user_id, retry_lapsed_holds=False)
+            return False
         
         conn.commit()
         conn.close()
+        AvailabilityBoard.refresh_lot(lot_id)
+        reservation_id, spot_id = session
+        AvailabilityIndex.record(lot_id, spot_id, now.strftime(TIMESTAMP_FORMAT), None)
+        return reservation_id
+
+    @staticmethod
+    def reserve_spot(lot_id, user_id, start_time, end_time):
+        # Advance booking of a spot for the window [start_time, end_time), both naive UTC datetimes
+        if end_time <= start_time:
+            return False
+        start = start_time.strftime(TIMESTAMP_FORMAT)
+        end = end_time.strftime(TIMESTAMP_FORMAT)
+        PricingEngine.refresh([lot_id])
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+
+        spot_id = Reservation._pick_spot(cursor, lot_id, start_time, end_time)
+        if spot_id is None:
+            conn.rollback()
+            conn.close()
+            return False
+
+        # The rate is quoted for the start of the window and kept through check-in
+        cursor.execute('''
+            INSERT INTO reservations (spot_id, user_id, parking_timestamp, reserved_until, status, hourly_rate)
+            VALUES (?, ?, ?, ?, 'reserved', ?)
+        ''', (spot_id, user_id, start, end, PricingEngine.rate(lot_id, start_time, conn=conn)))
+        reservation_id = cursor.lastrowid
+
+        conn.commit()
+        conn.close()
+        AvailabilityIndex.record(lot_id, spot_id, start, end)
+        return reservation_id
+
+    @staticmethod
+    def check_in(reservation_id, user_id):
+        # Turn an advance reservation into an active parking session once its window has started
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+
+        reservation = cursor.execute('''
+            SELECT r.*, ps.lot_id, ps.status AS spot_status FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            WHERE r.id = ? AND r.user_id = ? AND r.status = 'reserved'
+        ''', (reservation_id, user_id)).fetchone()
+
+        now_time = datetime.utcnow().replace(microsecond=0)
+        now = now_time.strftime(TIMESTAMP_FORMAT)
+        if not reservation or not (reservation['parking_timestamp'] <= now < reservation['reserved_until']):
+            conn.rollback()
+            conn.close()
+            return False
+
+        spot_id = reservation['spot_id']
+        if reservation['spot_status'] != 'A':
+            # A walk-in admitted before this booking was near is still parked there:
+            # move the booking to another spot free for the rest of its window
+            reserved_until = datetime.strptime(reservation['reserved_until'], TIMESTAMP_FORMAT)
+            spot_id = Reservation._pick_spot(cursor, reservation['lot_id'], now_time, reserved_until,
+                                             exclude={reservation['spot_id']})
+            if spot_id is None:
+                conn.rollback()
+                conn.close()
+                return False
+
+        # Billing starts at check-in, and the session becomes open-ended like a walk-in
+        cursor.execute('''
+            UPDATE reservations
+            SET spot_id = ?, parking_timestamp = ?, reserved_until = NULL, status = 'active'
+            WHERE id = ?
+        ''', (spot_id, now, reservation_id))
+        cursor.execute("UPDATE parking_spots SET status = 'O' WHERE id = ?", (spot_id,))
+
+        conn.commit()
+        conn.close()
+        AvailabilityBoard.refresh_lot(reservation['lot_id'])
+        AvailabilityIndex.forget(reservation['lot_id'], reservation['spot_id'],
+                                 reservation['parking_timestamp'], reservation['reserved_until'])
+        AvailabilityIndex.record(reservation['lot_id'], spot_id, now, None)
         return True
 
     @staticmethod
-    def release_spot(reservation_id, user_id):
+    def cancel_reservation(reservation_id, user_id):
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        # Get reservation details
+        # Locked like check_in, so a cancel racing a check-in can't cancel an active session
+        cursor.execute('BEGIN IMMEDIATE')
+
         reservation = cursor.execute('''
-            SELECT r.*, pl.price FROM reservations r
+            SELECT r.*, ps.lot_id FROM reservations r
             JOIN parking_spots ps ON r.spot_id = ps.id
-            JOIN parking_lots pl ON ps.lot_id = pl.id
-            WHERE r.id = ? AND r.user_id = ? AND r.status = 'active'
+            WHERE r.id = ? AND r.user_id = ? AND r.status = 'reserved'
         ''', (reservation_id, user_id)).fetchone()
-        
+
         if not reservation:
+            conn.rollback()
             conn.close()
-            return False, 0
-        
+            return False
+
+        cursor.execute("UPDATE reservations SET status = 'cancelled' WHERE id = ? AND status IN ('reserved')",
+                       (reservation_id,))
+        # The booking may have been all that kept a waiter off this spot
+        offer = Waitlist.hand_off(cursor, reservation['lot_id'], reservation['spot_id'])
+        conn.commit()
+        conn.close()
+        if offer:
+            AvailabilityBoard.refresh_lot(reservation['lot_id'])
+        AvailabilityIndex.forget(reservation['lot_id'], reservation['spot_id'],
+                                 reservation['parking_timestamp'], reservation['reserved_until'])
+        Waitlist.notify(offer)
+        return True
+
+    @staticmethod
+    def get_user_upcoming_reservations(user_id):
+        conn = get_db_connection()
+        upcoming = conn.execute('''
+            SELECT r.*, ps.spot_number, pl.prime_location_name, COALESCE(r.hourly_rate, pl.price) AS price
+            FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            JOIN parking_lots pl ON ps.lot_id = pl.id
+            WHERE r.user_id = ? AND r.status = 'reserved'
+            ORDER BY r.parking_timestamp
+        ''', (user_id,)).fetchall()
+        conn.close()
+
+        reservations = []
+        for r_data in upcoming:
+            r_dict = dict(r_data)
+            r_dict['parking_timestamp'] = datetime.strptime(r_dict['parking_timestamp'], TIMESTAMP_FORMAT)
+            r_dict['reserved_until'] = datetime.strptime(r_dict['reserved_until'], TIMESTAMP_FORMAT)
+            reservations.append(type('ReservationObject', (object,), r_dict)())
+        return reservations
+
+    @staticmethod
+    def end_session(cursor, reservation, leaving):
+        """Close an active session at `leaving`, inside the caller's write transaction.
+
+        `reservation` needs the reservation columns plus lot_id and price (the
+        hourly rate booked, see PricingEngine). Returns
+        (parking_cost, offer); after committing, the caller forgets the session in
+        the AvailabilityIndex and passes the offer to Waitlist.notify().
+        """
         # Calculate parking cost
-        # Ensure parking_timestamp is a datetime object for calculation
-        parking_start_str = reservation['parking_timestamp']
-        parking_start = datetime.strptime(parking_start_str, '%Y-%m-%d %H:%M:%S')
-        parking_end = datetime.utcnow() # Use UTC for consistency
-        
-        # Calculate hours, rounding up to the nearest whole hour, with a minimum of 1 hour
-        hours_parked = max(1, math.ceil((parking_end - parking_start).total_seconds() / 3600))
-        parking_cost = hours_parked * reservation['price']
+        parking_cost = Reservation.calculate_cost(reservation['parking_timestamp'], leaving, reservation['price'])
         
         # Update reservation
         cursor.execute('''
             UPDATE reservations 
-            SET leaving_timestamp = CURRENT_TIMESTAMP, 
+            SET leaving_timestamp = ?, 
                 parking_cost = ?, 
                 status = 'completed'
             WHERE id = ?
-        ''', (parking_cost, reservation_id))
+        ''', (leaving.strftime(TIMESTAMP_FORMAT), parking_cost, reservation['id']))
         
-        # Update spot status
-        cursor.execute('''
-            UPDATE parking_spots SET status = 'A' WHERE id = ?
-        ''', (reservation['spot_id'],))
+        # Hand the spot to the first person on the lot's waitlist, or mark it available
+        offer = Waitlist.hand_off(cursor, reservation['lot_id'], reservation['spot_id'])
+        if not offer:
+            cursor.execute('''
+                UPDATE parking_spots SET status = 'A' WHERE id = ?
+            ''', (reservation['spot_id'],))
+        return parking_cost, offer
+
+    @staticmethod
+    def release_spot(reservation_id, user_id):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Get reservation details
+        # Lock before reading so a concurrent sweep can't close the same session
+        cursor.execute('BEGIN IMMEDIATE')
+        reservation = cursor.execute('''
+            SELECT r.*, ps.lot_id, COALESCE(r.hourly_rate, pl.price) AS price FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            JOIN parking_lots pl ON ps.lot_id = pl.id
+            WHERE r.id = ? AND r.user_id = ? AND r.status = 'active'
+        ''', (reservation_id, user_id)).fetchone()
+        
+        if not reservation:
+            conn.rollback()
+            conn.close()
+            return False, 0
+        
+        parking_cost, offer = Reservation.end_session(cursor, reservation, datetime.utcnow().replace(microsecond=0))
         
         conn.commit()
         conn.close()
+        AvailabilityBoard.refresh_lot(reservation['lot_id'])
+        AvailabilityIndex.forget(reservation['lot_id'], reservation['spot_id'], reservation['parking_timestamp'], None)
+        Waitlist.notify(offer)
         return True, parking_cost
 
     @staticmethod
@@ -178,4 +399,107 @@ class Reservation:
             LIMIT 7
         ''', (user_id,)).fetchall()
         conn.close()
-        return stats
+
+        if not ReservationArchive.newest_timestamp():
+            return stats
+
+        # Combine with per-day counts from the archive and keep the 7 most recent dates
+        counts = ReservationArchive.get_user_daily_bookings(user_id, 7)
+        for stat in stats:
+            counts[stat['date']] = counts.get(stat['date'], 0) + stat['bookings']
+        dates = sorted(counts, reverse=True)[:7]
+        return [{'date': date, 'bookings': counts[date]} for date in dates]
+
+    @staticmethod
+    def sweep_active(after_id, batch_size, overstay_hours, abandon_hours, now=None):
+        """Process one batch of active/reserved reservations with id > after_id.
+
+        Updates accrued_cost and the overstay flag, closes sessions older than
+        abandon_hours and expires advance reservations whose window has passed.
+        Each batch is its own short transaction so book_spot never waits long
+        for the write lock. Returns (last_id, rows_touched); last_id is None
+        once the table has been fully scanned.
+        """
+        now = now or datetime.utcnow()
+        now_str = now.strftime(TIMESTAMP_FORMAT)
+        overstay_cutoff = (now - timedelta(hours=overstay_hours)).strftime(TIMESTAMP_FORMAT)
+        abandon_cutoff = (now - timedelta(hours=abandon_hours)).strftime(TIMESTAMP_FORMAT)
+
+        conn = get_db_connection()
+        # Read the batch without holding the write lock
+        rows = conn.execute('''
+            SELECT r.id, r.spot_id, r.status, r.parking_timestamp, r.reserved_until,
+                   r.accrued_cost, r.overstay, ps.lot_id, COALESCE(r.hourly_rate, pl.price) AS price
+            FROM reservations r
+            JOIN parking_spots ps ON r.spot_id = ps.id
+            JOIN parking_lots pl ON ps.lot_id = pl.id
+            WHERE r.status IN ('active', 'reserved') AND r.id > ?
+            ORDER BY r.id
+            LIMIT ?
+        ''', (after_id, batch_size)).fetchall()
+
+        if not rows:
+            conn.close()
+            return None, 0
+
+        accrued, closed, expired = [], [], []
+        for row in rows:
+            if row['status'] == 'reserved':
+                if row['reserved_until'] <= now_str:
+                    expired.append(row)
+                continue
+            cost = Reservation.calculate_cost(row['parking_timestamp'], now, row['price'])
+            if row['parking_timestamp'] <= abandon_cutoff:
+                closed.append((row, cost))
+            else:
+                overstay = 1 if row['parking_timestamp'] <= overstay_cutoff else 0
+                if cost != row['accrued_cost'] or overstay != row['overstay']:
+                    accrued.append((cost, overstay, row['id']))
+
+        touched = 0
+        offers = []
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        # The status guards skip rows a user released or checked in since the read above
+        if accrued:
+            cursor.executemany('''
+                UPDATE reservations SET accrued_cost = ?, overstay = ?
+                WHERE id = ? AND status = 'active'
+            ''', accrued)
+            touched += len(accrued)
+        for row, cost in closed:
+            updated = cursor.execute('''
+                UPDATE reservations
+                SET leaving_timestamp = ?, parking_cost = ?, accrued_cost = ?, overstay = 1, status = 'abandoned'
+                WHERE id = ? AND status = 'active'
+            ''', (now_str, cost, cost, row['id'])).rowcount
+            if updated:
+                offer = Waitlist.hand_off(cursor, row['lot_id'], row['spot_id'])
+                if offer:
+                    offers.append(offer)
+                else:
+                    cursor.execute("UPDATE parking_spots SET status = 'A' WHERE id = ?", (row['spot_id'],))
+                touched += 1
+        for row in expired:
+            updated = cursor.execute(
+                "UPDATE reservations SET status = 'expired' WHERE id = ? AND status = 'reserved'",
+                (row['id'],)
+            ).rowcount
+            if updated:
+                offer = Waitlist.hand_off(cursor, row['lot_id'], row['spot_id'])
+                if offer:
+                    offers.append(offer)
+            touched += updated
+        conn.commit()
+        conn.close()
+        AvailabilityBoard.refresh_lots({row['lot_id'] for row, cost in closed} |
+                                       {offer['lot_id'] for offer in offers})
+
+        for row, cost in closed:
+            AvailabilityIndex.forget(row['lot_id'], row['spot_id'], row['parking_timestamp'], None)
+        for row in expired:
+            AvailabilityIndex.forget(row['lot_id'], row['spot_id'], row['parking_timestamp'], row['reserved_until'])
+        for offer in offers:
+            Waitlist.notify(offer)
+
+        return rows[-1]['id'], touched
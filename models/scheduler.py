@@ -0,0 +1,175 @@
+from models.database import get_db_connection
+from models.reservation import Reservation
+from models.archive import ReservationArchive
+from models.waitlist import Waitlist
+from models.availability import TIMESTAMP_FORMAT
+from datetime import datetime, timedelta
+import threading
+import time
+
+
+class JobMetrics:
+    """In-memory counters for the jobs run by this process"""
+
+    def __init__(self):
+        self.runs = 0
+        self.last_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.last_rows_touched = 0
+        self.total_rows_touched = 0
+        self.last_error = None
+
+    def record(self, duration_ms, rows_touched):
+        self.runs += 1
+        self.last_duration_ms = duration_ms
+        self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+        self.last_rows_touched = rows_touched
+        self.total_rows_touched += rows_touched
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class Scheduler:
+    """In-process background scheduler backed by the scheduled_jobs table.
+
+    Every worker may run a Scheduler; a job only runs in the worker that wins the
+    conditional UPDATE on next_run_at, so the sweep still happens once per interval.
+    """
+
+    def __init__(self, poll_seconds=5):
+        self.poll_seconds = poll_seconds
+        self.jobs = {}
+        self.metrics = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, interval_seconds, func):
+        self.jobs[name] = (interval_seconds, func)
+        self.metrics[name] = JobMetrics()
+        conn = get_db_connection()
+        conn.execute('''
+            INSERT INTO scheduled_jobs (name, interval_seconds, next_run_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(name) DO UPDATE SET interval_seconds = excluded.interval_seconds
+        ''', (name, interval_seconds))
+        conn.commit()
+        conn.close()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='parking-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _claim(self, name, interval_seconds):
+        now = datetime.utcnow()
+        conn = get_db_connection()
+        claimed = conn.execute('''
+            UPDATE scheduled_jobs
+            SET next_run_at = ?, last_started_at = ?
+            WHERE name = ? AND next_run_at <= ?
+        ''', ((now + timedelta(seconds=interval_seconds)).strftime(TIMESTAMP_FORMAT),
+              now.strftime(TIMESTAMP_FORMAT), name, now.strftime(TIMESTAMP_FORMAT))).rowcount
+        conn.commit()
+        conn.close()
+        return claimed == 1
+
+    def run_job(self, name):
+        interval_seconds, func = self.jobs[name]
+        started = time.perf_counter()
+        try:
+            rows_touched = func()
+        except Exception as e:
+            print(f"Error running scheduled job {name}: {e}")
+            self.metrics[name].last_error = str(e)
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        self.metrics[name].record(duration_ms, rows_touched)
+
+        conn = get_db_connection()
+        conn.execute('''
+            UPDATE scheduled_jobs
+            SET last_duration_ms = ?, last_rows_touched = ?, total_runs = total_runs + 1
+            WHERE name = ?
+        ''', (duration_ms, rows_touched, name))
+        conn.commit()
+        conn.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for name, (interval_seconds, func) in list(self.jobs.items()):
+                try:
+                    if self._claim(name, interval_seconds):
+                        self.run_job(name)
+                except Exception as e:
+                    print(f"Error scheduling job {name}: {e}")
+            self._stop.wait(self.poll_seconds)
+
+    @staticmethod
+    def get_job_table():
+        conn = get_db_connection()
+        jobs = conn.execute('SELECT * FROM scheduled_jobs ORDER BY name').fetchall()
+        conn.close()
+        return jobs
+
+
+def make_reservation_sweep(batch_size, overstay_hours, abandon_hours, pause_seconds=0.01):
+    def sweep():
+        last_id, rows_touched = 0, 0
+        while True:
+            last_id, touched = Reservation.sweep_active(last_id, batch_size, overstay_hours, abandon_hours)
+            if last_id is None:
+                return rows_touched
+            rows_touched += touched
+            # Give request threads a chance at the write lock between batches
+            time.sleep(pause_seconds)
+    return sweep
+
+
+scheduler = Scheduler()
+_init_lock = threading.Lock()
+
+
+def init_scheduler(app_config):
+    """Register the jobs and start the scheduler thread, once per process."""
+    if not app_config.get('SCHEDULER_ENABLED', True):
+        return None
+    with _init_lock:
+        if scheduler.running:
+            return scheduler
+        _add_jobs(app_config)
+        scheduler.start()
+    return scheduler
+
+
+def _add_jobs(app_config):
+    scheduler.add_job(
+        'reservation_sweep',
+        app_config.get('SWEEP_INTERVAL_SECONDS', 300),
+        make_reservation_sweep(
+            app_config.get('SWEEP_BATCH_SIZE', 500),
+            app_config.get('OVERSTAY_HOURS', 24),
+            app_config.get('ABANDON_HOURS', 72),
+        ),
+    )
+    scheduler.add_job(
+        'waitlist_holds',
+        app_config.get('WAITLIST_SWEEP_SECONDS', 30),
+        Waitlist.expire_holds,
+    )
+    scheduler.add_job(
+        'reservation_archive',
+        app_config.get('ARCHIVE_INTERVAL_SECONDS', 24 * 3600),
+        lambda: ReservationArchive.archive_completed(app_config.get('ARCHIVE_AFTER_DAYS', 180)),
+    )
@@ -79,6 +79,34 @@ class User(UserMixin):
             users.append(User(user_data['id'], user_data['username'], user_data['email'], user_data['role'], created_at))
         return users
 
+    @staticmethod
+    def iter_all_users(chunk_size=1000):
+        # Yields User objects a chunk at a time instead of building the full list; each
+        # chunk is a short read after the last id, so no lock outlives it
+        conn = get_db_connection()
+        try:
+            last_id = 0
+            while True:
+                rows = conn.execute('SELECT * FROM users WHERE id > ? ORDER BY id LIMIT ?',
+                                    (last_id, chunk_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                for user_data in rows:
+                    created_at = user_data['created_at']
+                    if isinstance(created_at, str):
+                        created_at = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
+                    yield User(user_data['id'], user_data['username'], user_data['email'], user_data['role'], created_at)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def count():
+        conn = get_db_connection()
+        count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        conn.close()
+        return count
+
     @staticmethod
     def user_exists(username, email):
         conn = get_db_connection()
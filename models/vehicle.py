@@ -0,0 +1,48 @@
+from models.database import get_db_connection
+import re
+import sqlite3
+
+
+def normalize_plate(plate):
+    # Plate readers and users disagree on spacing, dashes and case
+    return re.sub(r'[^A-Z0-9]', '', str(plate or '').upper())
+
+
+class Vehicle:
+    @staticmethod
+    def get_user_vehicles(user_id):
+        conn = get_db_connection()
+        vehicles = conn.execute('SELECT * FROM vehicles WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+        conn.close()
+        return vehicles
+
+    @staticmethod
+    def add(user_id, plate):
+        """Register a plate for the user. Returns False if it is invalid or already registered."""
+        plate = normalize_plate(plate)
+        if not 2 <= len(plate) <= 12:
+            return False
+        conn = get_db_connection()
+        try:
+            conn.execute('INSERT INTO vehicles (user_id, plate) VALUES (?, ?)', (user_id, plate))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def remove(vehicle_id, user_id):
+        conn = get_db_connection()
+        removed = conn.execute('DELETE FROM vehicles WHERE id = ? AND user_id = ?', (vehicle_id, user_id)).rowcount
+        conn.commit()
+        conn.close()
+        return removed > 0
+
+    @staticmethod
+    def get_plate_owners():
+        conn = get_db_connection()
+        owners = {row['plate']: row['user_id'] for row in conn.execute('SELECT plate, user_id FROM vehicles')}
+        conn.close()
+        return owners
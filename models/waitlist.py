@@ -0,0 +1,341 @@
+from models.database import get_db_connection
+from models.availability import AvailabilityIndex, TIMESTAMP_FORMAT, WALK_IN_HORIZON
+from models.availability_board import AvailabilityBoard
+from models.pricing import PricingEngine
+from collections import deque
+from datetime import datetime, timedelta
+import threading
+import time
+
+# A spot a walk-in could take now (see WALK_IN_HORIZON): nothing active or held on it, and no
+# booking overlapping the horizon. Parameters: end of the horizon, now
+FREE_FOR_WALK_IN = '''
+    NOT EXISTS (SELECT 1 FROM reservations r
+                WHERE r.spot_id = ps.id AND r.status IN ('active', 'reserved', 'held')
+                  AND r.parking_timestamp < ? AND (r.reserved_until IS NULL OR r.reserved_until > ?))
+'''
+
+
+class Waitlist:
+    """Per-lot FIFO queue for users who find a lot full.
+
+    The waitlist table is the source of truth. A freed spot is handed to the
+    oldest waiter inside the transaction that frees it (see hand_off) and held
+    for them as a 'held' reservation until hold_minutes have passed. Each worker
+    keeps an in-memory copy of the queues for positions and queue lengths, and
+    wakes up waiting notification streams when it hands out a spot.
+    """
+
+    hold_minutes = 10
+    mirror_ttl_seconds = 5
+    # Each open notification stream holds a worker thread: cap them, and end each
+    # one after stream_seconds so the browser reconnects (after stream_retry_ms)
+    stream_seconds = 25
+    stream_retry_ms = 5000
+    stream_slots = threading.BoundedSemaphore(32)
+
+    _queues = {}      # lot_id -> deque of (entry_id, user_id) still waiting
+    _loaded_at = {}   # lot_id -> time.monotonic() of the last reload from the database
+    _offers = {}      # entry_id -> time.monotonic() of an offer made by this worker
+    _condition = threading.Condition()
+
+    @classmethod
+    def _queue(cls, lot_id):
+        # Reload a lot's queue from the database when the copy is missing or stale
+        # (another worker may have changed it)
+        with cls._condition:
+            loaded_at = cls._loaded_at.get(lot_id)
+            if loaded_at is not None and time.monotonic() - loaded_at < cls.mirror_ttl_seconds:
+                return cls._queues[lot_id]
+        conn = get_db_connection()
+        rows = conn.execute('''
+            SELECT id, user_id FROM waitlist
+            WHERE lot_id = ? AND status = 'waiting'
+            ORDER BY id
+        ''', (lot_id,)).fetchall()
+        conn.close()
+        with cls._condition:
+            cls._queues[lot_id] = deque((row['id'], row['user_id']) for row in rows)
+            cls._loaded_at[lot_id] = time.monotonic()
+            return cls._queues[lot_id]
+
+    @classmethod
+    def _forget_lot(cls, lot_id):
+        with cls._condition:
+            cls._loaded_at.pop(lot_id, None)
+
+    @classmethod
+    def queue_length(cls, lot_id):
+        return len(cls._queue(lot_id))
+
+    @classmethod
+    def join(cls, lot_id, user_id):
+        """Queue the user for a spot in the lot.
+
+        Returns the waitlist entry id, or None if the lot has a free spot (the
+        caller should just book it) or does not exist.
+        """
+        # A lapsed hold may be what keeps the lot full
+        cls.expire_holds(lot_id)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        # Same test as a walk-in booking, read under the write lock
+        now = datetime.utcnow().replace(microsecond=0)
+        free_spot = cursor.execute(
+            "SELECT 1 FROM parking_spots ps WHERE ps.lot_id = ? AND ps.status = 'A' AND" + FREE_FOR_WALK_IN + "LIMIT 1",
+            (lot_id, (now + WALK_IN_HORIZON).strftime(TIMESTAMP_FORMAT), now.strftime(TIMESTAMP_FORMAT))
+        ).fetchone()
+        lot = cursor.execute('SELECT 1 FROM parking_lots WHERE id = ?', (lot_id,)).fetchone()
+        if free_spot or not lot:
+            conn.rollback()
+            conn.close()
+            return None
+
+        existing = cursor.execute('''
+            SELECT id FROM waitlist
+            WHERE lot_id = ? AND user_id = ? AND status IN ('waiting', 'offered')
+        ''', (lot_id, user_id)).fetchone()
+        if existing:
+            conn.rollback()
+            conn.close()
+            return existing['id']
+
+        cursor.execute("INSERT INTO waitlist (lot_id, user_id, status) VALUES (?, ?, 'waiting')", (lot_id, user_id))
+        entry_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+
+        with cls._condition:
+            if lot_id in cls._queues:
+                cls._queues[lot_id].append((entry_id, user_id))
+        return entry_id
+
+    @classmethod
+    def leave(cls, entry_id, user_id):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        entry = cursor.execute('''
+            SELECT * FROM waitlist WHERE id = ? AND user_id = ? AND status IN ('waiting', 'offered')
+        ''', (entry_id, user_id)).fetchone()
+        if not entry:
+            conn.rollback()
+            conn.close()
+            return False
+
+        cursor.execute("UPDATE waitlist SET status = 'cancelled' WHERE id = ?", (entry_id,))
+        offer, released = None, None
+        if entry['status'] == 'offered':
+            # Giving up a held spot passes it straight to the next waiter
+            offer, released = cls._release_hold(cursor, entry)
+        conn.commit()
+        conn.close()
+
+        cls._forget_lot(entry['lot_id'])
+        cls._after_hold_released(entry, released, offer)
+        return True
+
+    @classmethod
+    def hand_off(cls, cursor, lot_id, spot_id):
+        """Give a just-freed spot to the oldest waiter, inside the caller's transaction.
+
+        Returns an offer dict (pass it to notify() after committing), or None if
+        nobody is waiting and the caller should mark the spot available. Like a
+        walk-in, the waiter claims it as an open-ended session, so a spot booked
+        within WALK_IN_HORIZON is not handed off.
+        """
+        now = datetime.utcnow().replace(microsecond=0)
+        start = now.strftime(TIMESTAMP_FORMAT)
+        free = cursor.execute('SELECT 1 FROM parking_spots ps WHERE ps.id = ? AND' + FREE_FOR_WALK_IN,
+                              (spot_id, (now + WALK_IN_HORIZON).strftime(TIMESTAMP_FORMAT), start)).fetchone()
+        if not free:
+            return None
+        entry = cursor.execute('''
+            SELECT id, user_id FROM waitlist
+            WHERE lot_id = ? AND status = 'waiting'
+            ORDER BY id
+            LIMIT 1
+        ''', (lot_id,)).fetchone()
+        if not entry:
+            return None
+
+        hold_expires_at = (now + timedelta(minutes=cls.hold_minutes)).strftime(TIMESTAMP_FORMAT)
+        cursor.execute('''
+            INSERT INTO reservations (spot_id, user_id, parking_timestamp, reserved_until, status, hourly_rate)
+            VALUES (?, ?, ?, ?, 'held', ?)
+        ''', (spot_id, entry['user_id'], start, hold_expires_at, PricingEngine.rate(lot_id, now, conn=cursor.connection)))
+        reservation_id = cursor.lastrowid
+        cursor.execute('''
+            UPDATE waitlist
+            SET status = 'offered', offered_at = ?, hold_expires_at = ?, reservation_id = ?
+            WHERE id = ?
+        ''', (start, hold_expires_at, reservation_id, entry['id']))
+        # The spot stays 'O' while it is held
+        cursor.execute("UPDATE parking_spots SET status = 'O' WHERE id = ?", (spot_id,))
+        return {'entry_id': entry['id'], 'user_id': entry['user_id'], 'lot_id': lot_id,
+                'spot_id': spot_id, 'start': start, 'hold_expires_at': hold_expires_at}
+
+    @classmethod
+    def notify(cls, offer):
+        if not offer:
+            return
+        AvailabilityIndex.record(offer['lot_id'], offer['spot_id'], offer['start'], offer['hold_expires_at'])
+        with cls._condition:
+            queue = cls._queues.get(offer['lot_id'])
+            if queue and queue[0][0] == offer['entry_id']:
+                queue.popleft()
+            else:
+                cls._loaded_at.pop(offer['lot_id'], None)
+            # Offers claimed or dropped through another worker never reach this one,
+            # so entries are also forgotten once their hold would have lapsed
+            now = time.monotonic()
+            for entry_id, offered_at in list(cls._offers.items()):
+                if now - offered_at > cls.hold_minutes * 60:
+                    del cls._offers[entry_id]
+            cls._offers[offer['entry_id']] = now
+            cls._condition.notify_all()
+
+    @classmethod
+    def _release_hold(cls, cursor, entry):
+        # Close the held reservation and give the spot to the next waiter, or free it
+        reservation = cursor.execute('SELECT * FROM reservations WHERE id = ?', (entry['reservation_id'],)).fetchone()
+        cursor.execute("UPDATE reservations SET status = 'expired' WHERE id = ? AND status = 'held'",
+                       (entry['reservation_id'],))
+        offer = cls.hand_off(cursor, entry['lot_id'], reservation['spot_id'])
+        if not offer:
+            cursor.execute("UPDATE parking_spots SET status = 'A' WHERE id = ?", (reservation['spot_id'],))
+        return offer, reservation
+
+    @classmethod
+    def _after_hold_released(cls, entry, released, offer):
+        AvailabilityBoard.refresh_lot(entry['lot_id'])
+        if released:
+            AvailabilityIndex.forget(entry['lot_id'], released['spot_id'],
+                                     released['parking_timestamp'], released['reserved_until'])
+        with cls._condition:
+            cls._offers.pop(entry['id'], None)
+        cls.notify(offer)
+
+    @classmethod
+    def claim(cls, entry_id, user_id):
+        """Turn a held spot into an active parking session. Returns False if the hold has lapsed."""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        entry = cursor.execute('''
+            SELECT w.*, r.spot_id, r.parking_timestamp, r.reserved_until FROM waitlist w
+            JOIN reservations r ON w.reservation_id = r.id
+            WHERE w.id = ? AND w.user_id = ? AND w.status = 'offered' AND r.status = 'held'
+        ''', (entry_id, user_id)).fetchone()
+        now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+        if not entry or entry['hold_expires_at'] <= now:
+            conn.rollback()
+            conn.close()
+            return False
+
+        cursor.execute('''
+            UPDATE reservations SET parking_timestamp = ?, reserved_until = NULL, status = 'active'
+            WHERE id = ?
+        ''', (now, entry['reservation_id']))
+        cursor.execute("UPDATE waitlist SET status = 'fulfilled' WHERE id = ?", (entry_id,))
+        conn.commit()
+        conn.close()
+
+        AvailabilityIndex.forget(entry['lot_id'], entry['spot_id'], entry['parking_timestamp'], entry['reserved_until'])
+        AvailabilityIndex.record(entry['lot_id'], entry['spot_id'], now, None)
+        with cls._condition:
+            cls._offers.pop(entry_id, None)
+        return True
+
+    @classmethod
+    def expire_holds(cls, lot_id=None):
+        """Pass lapsed holds on to the next waiter (or free their spots). Returns rows touched.
+
+        Runs as a scheduled job for every lot, and for one lot whenever it looks
+        full, so a lapsed hold never keeps a spot occupied while the scheduler is off.
+        """
+        now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+        conn = get_db_connection()
+        if lot_id is None:
+            lapsed = conn.execute('''
+                SELECT id FROM waitlist WHERE status = 'offered' AND hold_expires_at <= ? ORDER BY id
+            ''', (now,)).fetchall()
+        else:
+            lapsed = conn.execute('''
+                SELECT id FROM waitlist WHERE lot_id = ? AND status = 'offered' AND hold_expires_at <= ? ORDER BY id
+            ''', (lot_id, now)).fetchall()
+        conn.close()
+
+        touched = 0
+        for row in lapsed:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            entry = cursor.execute("SELECT * FROM waitlist WHERE id = ? AND status = 'offered'", (row['id'],)).fetchone()
+            if not entry:
+                conn.rollback()
+                conn.close()
+                continue
+            cursor.execute("UPDATE waitlist SET status = 'expired' WHERE id = ?", (entry['id'],))
+            offer, released = cls._release_hold(cursor, entry)
+            conn.commit()
+            conn.close()
+            cls._after_hold_released(entry, released, offer)
+            touched += 1
+        return touched
+
+    @classmethod
+    def get_user_entries(cls, user_id):
+        conn = get_db_connection()
+        entries = conn.execute('''
+            SELECT w.*, pl.prime_location_name, ps.spot_number
+            FROM waitlist w
+            JOIN parking_lots pl ON w.lot_id = pl.id
+            LEFT JOIN reservations r ON w.reservation_id = r.id
+            LEFT JOIN parking_spots ps ON r.spot_id = ps.id
+            WHERE w.user_id = ? AND w.status IN ('waiting', 'offered')
+            ORDER BY w.id
+        ''', (user_id,)).fetchall()
+        conn.close()
+
+        result = []
+        for entry in entries:
+            entry = dict(entry)
+            if entry['status'] == 'waiting':
+                ids = [entry_id for entry_id, waiting_user in cls._queue(entry['lot_id'])]
+                entry['position'] = ids.index(entry['id']) + 1 if entry['id'] in ids else len(ids) + 1
+            else:
+                entry['hold_expires_at'] = datetime.strptime(entry['hold_expires_at'], TIMESTAMP_FORMAT)
+            result.append(type('WaitlistEntry', (object,), entry)())
+        return result
+
+    @classmethod
+    def waiting_entry_ids(cls, user_id):
+        conn = get_db_connection()
+        rows = conn.execute(
+            "SELECT id FROM waitlist WHERE user_id = ? AND status = 'waiting' ORDER BY id", (user_id,)
+        ).fetchall()
+        conn.close()
+        return [row['id'] for row in rows]
+
+    @classmethod
+    def wait_for_offer(cls, entry_ids, timeout):
+        """Block until this worker makes an offer on one of `entry_ids`, or `timeout` seconds pass.
+
+        Returns True if any of those entries is no longer waiting (offered, or
+        left or expired elsewhere). Offers made by other workers are picked up
+        by the database check when the wait times out.
+        """
+        if not entry_ids:
+            return False
+        with cls._condition:
+            if cls._condition.wait_for(lambda: any(entry_id in cls._offers for entry_id in entry_ids), timeout):
+                return True
+        conn = get_db_connection()
+        placeholders = ','.join('?' for _ in entry_ids)
+        waiting = conn.execute(
+            f"SELECT COUNT(*) FROM waitlist WHERE id IN ({placeholders}) AND status = 'waiting'", list(entry_ids)
+        ).fetchone()[0]
+        conn.close()
+        return waiting < len(entry_ids)
@@ -0,0 +1,69 @@
+import os
+
+# Must be set before app.py is imported anywhere
+os.environ['FLASK_ENV'] = 'testing'
+
+import pytest
+from models import database
+from models.availability import AvailabilityIndex
+from models.availability_board import AvailabilityBoard
+from models.gate import GateIngestor
+from models.parking_lot import ParkingLot
+from models.pricing import PricingEngine
+from models.user import User
+from models.waitlist import Waitlist
+
+
+def reset_caches():
+    # Process-local mirrors of the database; each test starts from an empty one
+    AvailabilityIndex.invalidate()
+    AvailabilityBoard.detach()
+    PricingEngine.invalidate()
+    PricingEngine.enabled = False  # Lots charge their base price unless a test turns pricing on
+    Waitlist._queues, Waitlist._loaded_at, Waitlist._offers = {}, {}, {}
+    GateIngestor._last_seen, GateIngestor._owners, GateIngestor._sessions = {}, {}, {}
+    GateIngestor._loaded_at = None
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, initialized database file for the test."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'parking_app.db'))
+    database.init_db()
+    reset_caches()
+    yield tmp_path / 'parking_app.db'
+    reset_caches()
+
+
+@pytest.fixture
+def make_user(db):
+    def make_user(username, password='secret', role='user'):
+        User.create_user(username, f'{username}@example.com', password, role)
+        return User.get_by_username(username).id
+    return make_user
+
+
+@pytest.fixture
+def make_lot(db):
+    def make_lot(spots=2, price=10.0, name='Central'):
+        return ParkingLot.create(name, price, '1 Main Street', '560001', spots)
+    return make_lot
+
+
+@pytest.fixture
+def app(db):
+    from app import app
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def login(username, password='secret'):
+        return client.post('/login', data={'username': username, 'password': password})
+    return login
@@ -0,0 +1,63 @@
+from models.availability import AvailabilityIndex
+from models.database import get_db_connection
+from models.parking_lot import ParkingLot
+from models.reservation import Reservation
+from models.user import User
+
+
+def hold_spot(lot_id, user_id):
+    # A waitlist hold marks the spot occupied with a 'held' reservation, not an active one
+    conn = get_db_connection()
+    spot_id = conn.execute('SELECT id FROM parking_spots WHERE lot_id = ? AND spot_number = 1', (lot_id,)).fetchone()['id']
+    conn.execute("UPDATE parking_spots SET status = 'O' WHERE id = ?", (spot_id,))
+    conn.execute("""
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, reserved_until, status)
+        VALUES (?, ?, datetime('now'), datetime('now', '+10 minutes'), 'held')
+    """, (spot_id, user_id))
+    conn.commit()
+    conn.close()
+    AvailabilityIndex.invalidate(lot_id)
+
+
+def test_view_lot_lists_reservations_only_when_there_are_any(make_user, make_lot, client, login):
+    user_id = make_user('alice')
+    lot_id = make_lot(spots=3)
+    hold_spot(lot_id, make_user('bob'))
+    login('admin', 'admin123')
+
+    response = client.get(f'/admin/view_lot/{lot_id}')
+    assert response.is_streamed
+    assert b'Current Reservations' not in response.data
+
+    assert Reservation.book_spot(lot_id, user_id)
+    page = client.get(f'/admin/view_lot/{lot_id}').data
+    assert b'Current Reservations' in page and b'alice' in page
+
+
+def test_large_admin_pages_are_streamed(make_user, client, login):
+    for number in range(5):
+        make_user(f'user{number}')
+    login('admin', 'admin123')
+    for url in ('/admin/dashboard', '/admin/users'):
+        with client.get(url) as response:
+            assert response.status_code == 200 and response.is_streamed
+            page = response.data
+    assert page.count(b'@example.com') == 5
+
+
+def test_a_page_half_sent_to_a_slow_client_does_not_block_bookings(make_user, make_lot):
+    user_id = make_user('alice')
+    make_user('bob')
+    lot_id = make_lot(spots=3)
+    make_lot(name='Harbour')
+    # Even without WAL, where an open read would keep every commit waiting
+    conn = get_db_connection()
+    conn.execute('PRAGMA journal_mode=DELETE')
+    conn.close()
+
+    pages = [ParkingLot.iter_all(chunk_size=1), ParkingLot.iter_spots_by_lot_id(lot_id, chunk_size=1),
+             User.iter_all_users(chunk_size=1)]
+    for page in pages:
+        next(page)
+    assert Reservation.book_spot(lot_id, user_id)
+    assert [len(list(page)) for page in pages] == [1, 2, 2]
@@ -0,0 +1,60 @@
+import pytest
+from models import admission
+from models.admission import AdmissionGate, Rejected
+
+
+def admit(gate, key):
+    try:
+        with gate.admit(key):
+            return 200
+    except Rejected as rejected:
+        return rejected.status
+
+
+def test_a_rejected_request_takes_no_tokens():
+    gate = AdmissionGate('test', concurrency=1, queue_limit=0, max_wait=0,
+                         caller_rate=0.001, caller_burst=1, global_rate=0.001, global_burst=1)
+    assert admit(gate, 'alice') == 200
+    # The global bucket is empty: bob is turned away without spending his own token
+    assert admit(gate, 'bob') == 503
+    gate.global_bucket.tokens = 1
+    assert admit(gate, 'bob') == 200
+
+    # Alice is over her rate: the global token stays for the next caller
+    gate.global_bucket.tokens = 1
+    assert admit(gate, 'alice') == 429
+    assert admit(gate, 'carol') == 200
+    assert (gate.counters['shed_caller_rate'], gate.counters['shed_global_rate']) == (1, 1)
+
+
+def test_requests_turned_away_by_a_full_queue_keep_their_tokens():
+    gate = AdmissionGate('test', concurrency=1, queue_limit=0, max_wait=0.05,
+                         caller_rate=0.001, caller_burst=2, global_rate=0.001, global_burst=4)
+    with gate.admit('bob'):
+        # The only slot is busy: alice's two requests are shed without spending her burst
+        assert [admit(gate, 'alice') for _ in range(2)] == [503, 503]
+        gate.queue_limit = 1
+        assert admit(gate, 'alice') == 503  # Queued, then timed out
+    assert [admit(gate, 'alice') for _ in range(3)] == [200, 200, 429]
+    assert (gate.counters['shed_queue_full'], gate.counters['shed_timeout']) == (2, 1)
+
+
+@pytest.fixture
+def login_gate(app):
+    admission.init_admission(dict(app.config, ADMISSION_ENABLED=True, ADMISSION_LOGIN_RATE=0.001,
+                                  ADMISSION_LOGIN_BURST=2))
+    yield admission.gates['login']
+    admission.init_admission(app.config)
+
+
+def test_login_attempts_are_limited_per_username_and_address(make_user, client, login, login_gate):
+    make_user('alice')
+    make_user('bob')
+    assert [login('alice', 'wrong').status_code for _ in range(3)] == [200, 200, 429]
+    assert 'Retry-After' in login('alice').headers
+    # Another account from the same address has its own attempts
+    assert login('bob').status_code == 302
+
+    other_address = client.post('/login', data={'username': 'alice', 'password': 'secret'},
+                                environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert other_address.status_code == 302
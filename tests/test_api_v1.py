@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+import pytest
+from models.archive import ReservationArchive
+from models.availability import TIMESTAMP_FORMAT
+from models.database import get_db_connection
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReservationArchive, 'archive_dir', str(tmp_path / 'archive'))
+    return tmp_path / 'archive'
+
+
+def add_finished(user_id, lot_id, start, cost=5.0):
+    conn = get_db_connection()
+    spot_id = conn.execute('SELECT id FROM parking_spots WHERE lot_id = ? LIMIT 1', (lot_id,)).fetchone()['id']
+    reservation_id = conn.execute('''
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+        VALUES (?, ?, ?, ?, ?, 'completed')
+    ''', (spot_id, user_id, start.strftime(TIMESTAMP_FORMAT),
+          (start + timedelta(hours=1)).strftime(TIMESTAMP_FORMAT), cost)).lastrowid
+    conn.commit()
+    conn.close()
+    return reservation_id
+
+
+def test_archived_reservation_is_still_served_by_id(make_user, make_lot, archive_dir, client, login):
+    user_id = make_user('alice')
+    make_user('bob')
+    lot_id = make_lot(name='Central')
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=90)
+    archived_id = add_finished(user_id, lot_id, start, cost=7.5)
+    recent_id = add_finished(user_id, lot_id, start + timedelta(days=89))
+    assert ReservationArchive.archive_completed(30) == 1
+
+    login('alice')
+    response = client.get(f'/api/v1/reservations/{archived_id}')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['id'] == archived_id and body['lot_id'] == lot_id
+    assert body['prime_location_name'] == 'Central' and body['parking_cost'] == 7.5
+    assert body['parking_timestamp'] == start.strftime(TIMESTAMP_FORMAT)
+    assert body['status'] == 'completed' and body['reserved_until'] is None
+    assert client.get(f'/api/v1/reservations/{archived_id}?fields=status').get_json() == {'status': 'completed'}
+    assert client.get(f'/api/v1/reservations/{recent_id}').status_code == 200
+    assert client.get(f'/api/v1/reservations/{archived_id + 100}').status_code == 404
+
+    # Another user's archived reservation is not found, just like a hot one
+    client.get('/logout')
+    login('bob')
+    assert client.get(f'/api/v1/reservations/{archived_id}').status_code == 404
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+import pytest
+from models import archive
+from models.archive import Partition, ReservationArchive
+from models.availability import TIMESTAMP_FORMAT
+from models.database import get_db_connection
+from models.reservation import Reservation
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReservationArchive, 'archive_dir', str(tmp_path / 'archive'))
+    return tmp_path / 'archive'
+
+
+def add_finished(user_id, lot_id, days_ago, hours=2, cost=5.0):
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=days_ago)
+    conn = get_db_connection()
+    spot_id = conn.execute('SELECT id FROM parking_spots WHERE lot_id = ? LIMIT 1', (lot_id,)).fetchone()['id']
+    reservation_id = conn.execute('''
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+        VALUES (?, ?, ?, ?, ?, 'completed')
+    ''', (spot_id, user_id, start.strftime(TIMESTAMP_FORMAT),
+          (start + timedelta(hours=hours)).strftime(TIMESTAMP_FORMAT), cost)).lastrowid
+    conn.commit()
+    conn.close()
+    return reservation_id
+
+
+def hot_ids():
+    conn = get_db_connection()
+    ids = {row['id'] for row in conn.execute('SELECT id FROM reservations')}
+    conn.close()
+    return ids
+
+
+def test_old_rows_move_to_partitions_and_history_merges_both_tiers(make_user, make_lot, archive_dir, monkeypatch):
+    monkeypatch.setattr(archive, 'ROW_GROUP_SIZE', 2)
+    alice, bob = make_user('alice'), make_user('bob')
+    lot_id = make_lot(spots=2)
+    old = [add_finished(user, lot_id, days_ago) for days_ago in (40, 70, 100, 101, 102) for user in (alice, bob)]
+    recent = add_finished(alice, lot_id, days_ago=1)
+
+    assert ReservationArchive.archive_completed(30, batch_size=3, flush_rows=4) == len(old)
+    assert hot_ids() == {recent}
+    assert sum(partition.rows for partition in ReservationArchive.partitions()) == len(old)
+
+    history = Reservation.get_user_history(alice)
+    assert [row.id for row in history][0] == recent and len(history) == 6
+    assert sorted(row.id for row in history[1:]) == sorted(old[0::2])
+    summary = ReservationArchive.monthly_summary()
+    assert sum(month['bookings'] for month in summary) == len(old)
+    assert sum(month['revenue'] for month in summary) == pytest.approx(5.0 * len(old))
+    assert sum(ReservationArchive.get_user_daily_bookings(bob, 30).values()) == 5
+
+
+def test_rerunning_a_merge_does_not_duplicate_rows(make_user, make_lot, archive_dir):
+    user_id = make_user('alice')
+    lot_id = make_lot()
+    add_finished(user_id, lot_id, days_ago=50)
+    ReservationArchive.archive_completed(30)
+    partition = ReservationArchive.partitions()[0]
+    data = partition.read()
+
+    ReservationArchive._merge_into_partition(partition.month, data)
+    assert ReservationArchive.partitions()[0].rows == 1
+
+
+def test_user_slices_only_decode_the_row_groups_they_span(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ROW_GROUP_SIZE', 4)
+    data = archive._empty_columns()
+    for i in range(30):
+        row = {'user_id': i % 7, 'parking_timestamp': 1000 + i, 'id': i + 1, 'spot_id': 1, 'lot_id': 1,
+               'spot_number': 1, 'leaving_timestamp': 2000 + i, 'parking_cost': float(i), 'price': 1.0,
+               'status': 'completed', 'prime_location_name': 'Central'}
+        for name, kind in archive.COLUMNS:
+            data[name].append(row[name])
+    path = str(tmp_path / '2024-01.colz')
+    Partition.write(path, data)
+
+    decoded = []
+    real_decode = archive._decode
+    monkeypatch.setattr(archive, '_decode', lambda *args: decoded.append(args) or real_decode(*args))
+    partition = Partition(path)
+    rows = partition.user_rows(3, ['id', 'parking_timestamp'])
+    assert [row['id'] for row in rows] == [4, 11, 18, 25]
+    # The user index plus one or two row groups of each requested column, not whole columns
+    assert len(decoded) <= 1 + 2 * 2
+    assert partition.user_slice(99) is None
+    assert list(partition.read(['id'], 5, 9)['id']) == [list(partition.read(['id'])['id'])[i] for i in range(5, 9)]
+
+
+def test_partitions_are_reused_until_the_archive_changes(make_user, make_lot, archive_dir):
+    user_id = make_user('alice')
+    lot_id = make_lot()
+    add_finished(user_id, lot_id, days_ago=50)
+    ReservationArchive.archive_completed(30)
+    first = ReservationArchive.partitions()
+    assert ReservationArchive.partitions()[0] is first[0]
+
+    add_finished(user_id, lot_id, days_ago=400)
+    ReservationArchive.archive_completed(30)
+    again = ReservationArchive.partitions()
+    assert len(again) == 2 and first[0] in again
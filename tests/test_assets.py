@@ -0,0 +1,48 @@
+import gzip
+import os
+import pytest
+import assets
+from controllers import assets_controller
+
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'images').mkdir()
+    (static / 'css' / 'style.css').write_text('body { background: url("../images/bg.svg?v=1"); }\n' * 50)
+    (static / 'images' / 'bg.svg').write_text('<svg xmlns="http://www.w3.org/2000/svg"/>')
+    monkeypatch.setattr(assets, 'STATIC_DIR', str(static))
+    monkeypatch.setattr(assets, 'DIST_DIR', str(static / 'dist'))
+    monkeypatch.setattr(assets, 'MANIFEST_PATH', str(static / 'dist' / 'manifest.json'))
+    monkeypatch.setattr(assets_controller, '_manifest', None)
+    monkeypatch.setattr(assets_controller, '_manifest_mtime', None)
+    return static
+
+
+def test_build_fingerprints_and_precompresses_offline(static_dir):
+    manifest, sizes = assets.build()
+    css, image = manifest['css/style.css'], manifest['images/bg.svg']
+    assert css['file'].startswith('css/style.') and css['file'] != 'css/style.css'
+    assert 'gzip' in css['encodings'] and sizes['css/style.css']['gzip'] < sizes['css/style.css']['raw']
+
+    built = (static_dir / 'dist' / css['file']).read_text()
+    assert f'url({os.path.relpath(image["file"], "css")}?v=1)' in built
+    assert gzip.decompress((static_dir / 'dist' / (css['file'] + '.gz')).read_bytes()).decode() == built
+    # Rebuilding unchanged sources gives the same names
+    assert assets.build()[0]['css/style.css']['file'] == css['file']
+
+
+def test_built_assets_are_served_compressed_and_immutable(static_dir, app, client):
+    manifest, sizes = assets.build()
+    with app.test_request_context():
+        url = assets_controller.asset_url('css/style.css')
+    assert url == f"/assets/{manifest['css/style.css']['file']}"
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert gzip.decompress(response.data).startswith(b'body')
+    assert 'Content-Encoding' not in client.get(url).headers
+    assert 'Content-Encoding' not in client.get(url, headers={'Accept-Encoding': 'gzip;q=0, identity'}).headers
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from itertools import accumulate
+from models.availability import AvailabilityIndex, LotAvailability, SpotSchedule
+from models.database import get_db_connection
+from models.parking_lot import ParkingLot
+from models.reservation import Reservation
+
+
+def hours_from_now(hours):
+    return datetime.utcnow().replace(microsecond=0) + timedelta(hours=hours)
+
+
+def spot_of(reservation_id):
+    conn = get_db_connection()
+    row = conn.execute('SELECT spot_id FROM reservations WHERE id = ?', (reservation_id,)).fetchone()
+    conn.close()
+    return row['spot_id']
+
+
+def assert_schedules_sorted(lot_id):
+    for schedule in AvailabilityIndex.for_lot(lot_id).schedules.values():
+        assert schedule.starts == sorted(schedule.starts)
+        assert schedule.max_ends == list(accumulate(schedule.ends, max))
+
+
+def test_best_fit_packs_reservations_next_to_existing_ones():
+    lot = LotAvailability(1)
+    lot.spot_numbers = {1: 1, 2: 2}
+    lot.schedules = {1: SpotSchedule(), 2: SpotSchedule()}
+    lot.add(2, '2024-07-01 09:00:00', '2024-07-01 12:00:00')
+
+    assert lot.find_spot(datetime(2024, 7, 1, 12), datetime(2024, 7, 1, 17)) == 2
+    assert lot.find_spot(datetime(2024, 7, 1, 10), datetime(2024, 7, 1, 11)) == 1
+
+
+def test_walk_in_does_not_take_a_spot_with_an_upcoming_reservation(make_user, make_lot):
+    user_id = make_user('alice')
+    lot_id = make_lot(spots=2)
+    first = Reservation.reserve_spot(lot_id, user_id, hours_from_now(1), hours_from_now(2))
+    second = Reservation.reserve_spot(lot_id, user_id, hours_from_now(1), hours_from_now(2))
+    assert first and second
+
+    assert Reservation.book_spot(lot_id, make_user('bob')) is False
+    assert_schedules_sorted(lot_id)
+
+
+def test_walk_in_uses_the_unreserved_spot_and_later_windows_stay_bookable(make_user, make_lot):
+    user_id = make_user('alice')
+    lot_id = make_lot(spots=2)
+    reserved = Reservation.reserve_spot(lot_id, user_id, hours_from_now(1), hours_from_now(2))
+
+    walk_in = Reservation.book_spot(lot_id, make_user('bob'))
+    assert walk_in and spot_of(walk_in) != spot_of(reserved)
+    assert_schedules_sorted(lot_id)
+
+    # Tomorrow only the reserved spot is free; the walk-in's spot is taken until it is released
+    tomorrow = Reservation.reserve_spot(lot_id, user_id, hours_from_now(24), hours_from_now(26))
+    assert tomorrow and spot_of(tomorrow) == spot_of(reserved)
+    assert Reservation.reserve_spot(lot_id, user_id, hours_from_now(24), hours_from_now(26)) is False
+
+
+def test_check_in_after_walk_ins_fill_the_rest_of_the_lot(make_user, make_lot):
+    user_id = make_user('alice')
+    lot_id = make_lot(spots=2)
+    reservation_id = Reservation.reserve_spot(lot_id, user_id, hours_from_now(-0.1), hours_from_now(1))
+
+    assert Reservation.book_spot(lot_id, make_user('bob'))
+    assert Reservation.book_spot(lot_id, make_user('carol')) is False
+    assert Reservation.check_in(reservation_id, user_id) is True
+
+
+def test_cancel_only_succeeds_once(make_user, make_lot):
+    user_id = make_user('alice')
+    lot_id = make_lot(spots=1)
+    reservation_id = Reservation.reserve_spot(lot_id, user_id, hours_from_now(1), hours_from_now(2))
+
+    assert Reservation.cancel_reservation(reservation_id, user_id) is True
+    assert Reservation.cancel_reservation(reservation_id, user_id) is False
+    assert Reservation.reserve_spot(lot_id, user_id, hours_from_now(1), hours_from_now(2))
+
+
+def test_a_booking_packed_behind_a_checked_in_one_moves_to_a_free_spot(make_user, make_lot):
+    first, second = make_user('alice'), make_user('bob')
+    lot_id = make_lot(spots=3)
+    earlier = Reservation.reserve_spot(lot_id, first, hours_from_now(-0.1), hours_from_now(1))
+    later = Reservation.reserve_spot(lot_id, second, hours_from_now(1), hours_from_now(2))
+    assert spot_of(earlier) == spot_of(later)
+    packed_spot = spot_of(earlier)
+    assert Reservation.check_in(earlier, first) is True
+
+    # Alice overstays into Bob's window
+    conn = get_db_connection()
+    conn.execute('UPDATE reservations SET parking_timestamp = ? WHERE id = ?',
+                 (hours_from_now(-0.1).strftime('%Y-%m-%d %H:%M:%S'), later))
+    conn.commit()
+    conn.close()
+    AvailabilityIndex.invalidate(lot_id)
+    assert Reservation.check_in(later, second) is True
+    assert spot_of(later) != packed_spot
+    assert_schedules_sorted(lot_id)
+    assert Reservation.reserve_spot(lot_id, first, hours_from_now(24), hours_from_now(26))
+
+
+def test_bookings_far_ahead_do_not_turn_walk_ins_away(make_user, make_lot):
+    user_id = make_user('alice')
+    lot_id = make_lot(spots=2)
+    for _ in range(2):
+        assert Reservation.reserve_spot(lot_id, user_id, hours_from_now(24 * 30), hours_from_now(24 * 30 + 2))
+    assert [lot['available_spots'] for lot in ParkingLot.get_available_lots()] == [2]
+    assert Reservation.book_spot(lot_id, make_user('bob'))
+
+    # Bookings within the horizon do: the lot is listed as full, with its waitlist
+    Reservation.reserve_spot(lot_id, user_id, hours_from_now(1), hours_from_now(2))
+    assert ParkingLot.get_available_lots() == []
+    assert [lot['id'] for lot in ParkingLot.get_full_lots()] == [lot_id]
+    assert Reservation.book_spot(lot_id, make_user('carol')) is False
@@ -0,0 +1,118 @@
+from multiprocessing import shared_memory
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+import uuid
+import pytest
+from models import availability_board
+from models.availability_board import AvailabilityBoard, COUNTS_QUERY, HEADER, MAGIC, _untrack
+from models.database import get_db_connection
+
+LOTS, SPOTS, WORKERS = 3, 4, 4
+
+
+@pytest.fixture
+def board_name():
+    name = f'parking_board_test_{uuid.uuid4().hex[:12]}'
+    yield name
+    AvailabilityBoard.detach()
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def database_counts():
+    conn = get_db_connection()
+    counts = {row['lot_id']: (row['available'], row['occupied'])
+              for row in conn.execute(COUNTS_QUERY + ' GROUP BY pl.id')}
+    conn.close()
+    return counts
+
+
+WORKER_SCRIPT = textwrap.dedent('''
+    import random, sys
+    from models import database
+    from models.availability_board import AvailabilityBoard
+    from models.reservation import Reservation
+    database.DATABASE = sys.argv[1]
+    assert AvailabilityBoard.attach(sys.argv[2])
+    user_id, lot_ids = int(sys.argv[3]), [int(lot_id) for lot_id in sys.argv[4:]]
+    for _ in range(40):
+        lot_id = random.choice(lot_ids)
+        reservation_id = Reservation.book_spot(lot_id, user_id)
+        if reservation_id:
+            Reservation.release_spot(reservation_id, user_id)
+''')
+
+
+def test_workers_publish_consistent_counts_that_match_the_database(db, make_lot, board_name):
+    lot_ids = [make_lot(spots=SPOTS, name=f'Lot {number}') for number in range(LOTS)]
+    conn = get_db_connection()
+    conn.executemany('INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                     ((f'driver{number}', '!', f'driver{number}@example.com') for number in range(WORKERS)))
+    conn.commit()
+    user_ids = [row['id'] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'driver%'")]
+    conn.close()
+    assert AvailabilityBoard.attach(board_name)
+    AvailabilityBoard.reconcile()
+
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER_SCRIPT, str(db), board_name, str(user_id),
+                                 *map(str, lot_ids)]) for user_id in user_ids]
+    snapshots = 0
+    while any(worker.poll() is None for worker in workers):
+        counts = AvailabilityBoard.read_all()
+        if counts is not None:
+            snapshots += 1
+            # A torn read would show a lot whose counts do not add up to its spots
+            assert all(sum(counts[lot_id]) == SPOTS for lot_id in lot_ids), counts
+    assert all(worker.wait() == 0 for worker in workers)
+    assert snapshots > 0
+    # Every publisher re-reads under the lock after committing, so the last write is the final state
+    assert AvailabilityBoard.read_all() == database_counts()
+    assert all(counts == (SPOTS, 0) for counts in AvailabilityBoard.read_all().values())
+
+
+def test_board_reads_are_faster_than_the_counts_query(make_lot, board_name):
+    for number in range(50):
+        make_lot(spots=20, name=f'Lot {number}')
+    assert AvailabilityBoard.attach(board_name, capacity=256)
+    AvailabilityBoard.reconcile()
+    assert AvailabilityBoard.read_all() == database_counts()
+
+    def reads_per_second(read, seconds=0.3):
+        reads, deadline = 0, time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            read()
+            reads += 1
+        return reads / seconds
+
+    assert reads_per_second(AvailabilityBoard.read_all) > reads_per_second(database_counts)
+
+
+def test_attach_waits_for_the_creator_to_write_the_header(db, board_name, monkeypatch):
+    capacity = 16
+    shm = shared_memory.SharedMemory(name=board_name, create=True, size=HEADER.size + capacity * 24)
+    _untrack(shm)
+    # Another worker created the segment but has not written its header yet
+    writer = threading.Timer(0.1, lambda: HEADER.pack_into(shm.buf, 0, MAGIC, capacity, 0))
+    writer.start()
+    try:
+        assert AvailabilityBoard.attach(board_name, capacity=capacity)
+    finally:
+        writer.join()
+        shm.close()
+    AvailabilityBoard.detach()
+
+    # A header that never appears makes attach give up and fall back to SQL
+    monkeypatch.setattr(availability_board, 'ATTACH_WAIT_SECONDS', 0.05)
+    existing = shared_memory.SharedMemory(name=board_name)
+    _untrack(existing)
+    existing.buf[:HEADER.size] = bytes(HEADER.size)
+    existing.close()
+    assert AvailabilityBoard.attach(board_name, capacity=capacity) is False
+    assert AvailabilityBoard.read_all() is None
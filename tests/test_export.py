@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+import csv
+import io
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from models import archive, export
+from models.archive import ReservationArchive
+from models.availability import TIMESTAMP_FORMAT
+from models.database import get_db_connection
+from models.reservation import Reservation
+from models.export import iter_column_chunks, stream_csv, stream_ndjson
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ReservationArchive, 'archive_dir', str(tmp_path / 'archive'))
+    return tmp_path / 'archive'
+
+
+def add_finished(user_id, lot_id, start, cost=5.0):
+    conn = get_db_connection()
+    spot_id = conn.execute('SELECT id FROM parking_spots WHERE lot_id = ? LIMIT 1', (lot_id,)).fetchone()['id']
+    reservation_id = conn.execute('''
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+        VALUES (?, ?, ?, ?, ?, 'completed')
+    ''', (spot_id, user_id, start.strftime(TIMESTAMP_FORMAT),
+          (start + timedelta(hours=1)).strftime(TIMESTAMP_FORMAT), cost)).lastrowid
+    conn.commit()
+    conn.close()
+    return reservation_id
+
+
+def seed_reservations(rows):
+    # One INSERT ... SELECT keeps seeding millions of rows to a few seconds
+    conn = get_db_connection()
+    conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, leaving_timestamp, parking_cost, status)
+        SELECT 1, 1 + i % 1000, datetime('2024-01-01', '+' || (i % 500000) || ' minutes'),
+               datetime('2024-01-01', '+' || (i % 500000 + 60) || ' minutes'), 2.5, 'completed'
+        FROM n
+    ''', (rows,))
+    conn.commit()
+    conn.close()
+
+
+def test_exports_merge_both_tiers_within_the_date_range(make_user, make_lot, archive_dir, monkeypatch):
+    monkeypatch.setattr(archive, 'ROW_GROUP_SIZE', 2)
+    user_id = make_user('alice')
+    lot_id = make_lot()
+    now = datetime.utcnow().replace(microsecond=0)
+    starts = [now - timedelta(days=days) for days in (95, 70, 65, 64, 63, 62, 40, 1)]
+    ids = [add_finished(user_id, lot_id, start) for start in starts]
+    ReservationArchive.archive_completed(30)
+
+    since = (now - timedelta(days=80)).strftime('%Y-%m-%d')
+    until = (now - timedelta(days=10)).strftime('%Y-%m-%d')
+    expected = sorted(i for i, start in zip(ids, starts) if since <= start.strftime(TIMESTAMP_FORMAT) < until)
+
+    rows = list(csv.DictReader(io.StringIO(''.join(stream_csv('reservations', since=since, until=until)))))
+    assert sorted(int(row['id']) for row in rows) == expected
+    assert {row['parking_timestamp'] for row in rows} <= {start.strftime(TIMESTAMP_FORMAT) for start in starts}
+    assert ''.join(stream_ndjson('reservations', since=since, until=until)).count('\n') == len(expected)
+
+
+def test_archived_rows_are_streamed_one_row_group_at_a_time(make_user, make_lot, archive_dir, monkeypatch):
+    monkeypatch.setattr(archive, 'ROW_GROUP_SIZE', 3)
+    user_id = make_user('alice')
+    lot_id = make_lot()
+    start = datetime(2023, 5, 1, 8)
+    for hour in range(20):
+        add_finished(user_id, lot_id, start + timedelta(hours=hour))
+    ReservationArchive.archive_completed(30)
+
+    chunks = [data for data, archived in iter_column_chunks('reservations') if archived]
+    assert sum(len(data['id']) for data in chunks) == 20
+    assert max(len(data['id']) for data in chunks) <= 3
+
+
+@pytest.mark.skipif(export.pa is None, reason='pyarrow is not installed')
+def test_arrow_stream_round_trips(make_user, make_lot, archive_dir):
+    user_id = make_user('alice')
+    lot_id = make_lot()
+    add_finished(user_id, lot_id, datetime(2023, 5, 1, 8))
+    add_finished(user_id, lot_id, datetime.utcnow().replace(microsecond=0))
+    ReservationArchive.archive_completed(30)
+
+    table = export.pa.ipc.open_stream(b''.join(export.stream_arrow('reservations'))).read_all()
+    assert table.num_rows == 2
+    assert table.column('parking_cost').to_pylist() == [5.0, 5.0]
+    assert table.column('parking_timestamp').to_pylist()[1] == datetime(2023, 5, 1, 8)
+
+
+EXPORT_SCRIPT = textwrap.dedent('''
+    import resource, sys
+    from models import database
+    from models.export import stream_csv
+    database.DATABASE = sys.argv[1]
+    size = sum(len(part) for part in stream_csv('reservations', until=sys.argv[2]))
+    print(size, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+''')
+
+
+def run_export(db_path, until):
+    # A fresh process per run, so peak RSS belongs to that export alone
+    output = subprocess.run([sys.executable, '-c', EXPORT_SCRIPT, str(db_path), until],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return int(output[0]), int(output[1])
+
+
+@pytest.mark.skipif(not os.environ.get('RUN_SLOW_TESTS'), reason='slow (over a minute): set RUN_SLOW_TESTS=1')
+def test_memory_stays_flat_exporting_five_million_rows(db, make_lot):
+    make_lot(spots=1)
+    seed_reservations(5_000_000)
+    small_bytes, small_rss = run_export(db, '2024-01-01 00:10:00')
+    full_bytes, full_rss = run_export(db, '9999-12-31')
+    assert full_bytes > 1000 * small_bytes
+    # ru_maxrss is in KiB: the full export may not use more than 32 MiB over a ten-row one
+    assert full_rss - small_rss < 32 * 1024
+
+
+def test_a_download_in_progress_does_not_block_bookings(make_user, make_lot, archive_dir):
+    user_id = make_user('alice')
+    lot_id = make_lot()
+    for days in (3, 2, 1):
+        add_finished(user_id, lot_id, datetime.utcnow() - timedelta(days=days))
+    download = stream_csv('reservations', chunk_size=1)
+    next(download)  # The client is still receiving the first row
+
+    # Committing needs every reader's lock released; this would wait 5 s, then fail
+    assert Reservation.book_spot(lot_id, user_id)
+    assert len(list(csv.reader(io.StringIO(''.join(download))))) == 3
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+import pytest
+from models.availability import TIMESTAMP_FORMAT
+from models.gate import GateIngestor
+from models.reservation import Reservation
+from models.vehicle import Vehicle
+
+
+def event(lot_id, direction, when, plate='KA01AB1234'):
+    return {'plate': plate, 'lot_id': lot_id, 'direction': direction, 'timestamp': when.strftime(TIMESTAMP_FORMAT)}
+
+
+def test_unparseable_numbers_reject_only_their_event(make_user, make_lot):
+    Vehicle.add(make_user('alice'), 'KA01AB1234')
+    lot_id = make_lot()
+    when = datetime.utcnow().replace(microsecond=0) - timedelta(hours=2)
+    result = GateIngestor.ingest([
+        {'plate': 'KA01AB1234', 'lot_id': lot_id, 'direction': 'entry', 'timestamp': 1e20},
+        {'plate': 'KA01AB1234', 'lot_id': float('inf'), 'direction': 'entry', 'timestamp': 0},
+        {'plate': 'KA01AB1234', 'lot_id': lot_id, 'direction': 'entry', 'timestamp': -1e18},
+        {'plate': 'KA01AB1234', 'lot_id': 1e20, 'direction': 'entry', 'timestamp': str(when)},
+        {'plate': 'KA01AB1234', 'lot_id': True, 'direction': 'entry', 'timestamp': str(when)},
+        {'plate': 'KA01AB1234', 'lot_id': lot_id, 'direction': 'entry', 'timestamp': '0001-01-01 00:00:00'},
+        {'plate': 'KA01AB1234', 'lot_id': lot_id, 'direction': 'entry', 'timestamp': True},
+        event(lot_id, 'entry', when - timedelta(days=30)),
+        event(lot_id, 'entry', when),
+    ])
+    assert [index for index, reason in result.rejected] == [0, 1, 2, 3, 4, 5, 6, 7]
+    assert result.entries == 1
+
+
+def test_repeat_reads_are_dropped_but_a_failed_batch_can_be_resent(make_user, make_lot, monkeypatch):
+    Vehicle.add(make_user('alice'), 'KA01AB1234')
+    lot_id = make_lot()
+    when = datetime.utcnow().replace(microsecond=0) - timedelta(hours=2)
+    reads = [event(lot_id, 'entry', when + timedelta(seconds=second)) for second in range(3)]
+
+    start_session = Reservation.start_session
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('disk I/O error')
+
+    monkeypatch.setattr(Reservation, 'start_session', staticmethod(fail))
+    with pytest.raises(RuntimeError):
+        GateIngestor.ingest(reads)
+
+    # Nothing was committed, so the resent reads are not mistaken for duplicates
+    monkeypatch.setattr(Reservation, 'start_session', staticmethod(start_session))
+    result = GateIngestor.ingest(reads)
+    assert (result.entries, result.duplicates) == (1, 2)
+    assert GateIngestor.ingest(reads[:1]).duplicates == 1
+
+    result = GateIngestor.ingest([event(lot_id, 'exit', when + timedelta(hours=1))])
+    assert (result.exits, result.rejected) == (1, [])
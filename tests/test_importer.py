@@ -0,0 +1,66 @@
+import io
+from models.database import get_db_connection
+from models.importer import import_file
+from models.parking_lot import ParkingLot
+
+
+def test_lots_are_created_with_their_spots_in_bulk(db):
+    stream = io.StringIO('prime_location_name,price,address,pin_code,maximum_number_of_spots\n'
+                         'North,2.5,1 North Road,560001,3\n'
+                         'South,4,2 South Road,560002,2\n'
+                         'Broken,nan,3 Nowhere,560003,2\n'
+                         'Huge,inf,4 Nowhere,560004,2\n')
+    result = import_file('lots', stream, 'csv', chunk_size=10)
+    assert (result.processed, result.inserted) == (4, 2)
+    assert [number for number, message in result.errors] == [3, 4]
+
+    lots = {lot['prime_location_name']: lot for lot in ParkingLot.get_all()}
+    assert set(lots) == {'North', 'South'}
+    assert ParkingLot.get_spot_counts(lots['North']['id'])['available'] == 3
+    assert ParkingLot.get_spot_counts(lots['South']['id'])['available'] == 2
+
+
+def test_malformed_ndjson_lines_are_rejected_without_stopping_the_import(make_user, make_lot):
+    make_user('alice')
+    lot_id = make_lot(spots=2)
+    stream = io.StringIO(
+        f'{{"lot_id": {lot_id}, "spot_number": 1, "username": "alice", "parking_timestamp": "2024-01-01 08:00:00",'
+        f' "leaving_timestamp": "2024-01-01 10:00:00", "parking_cost": 5}}\n'
+        '{"lot_id": \n'
+        '[1, 2, 3]\n'
+        '"just a string"\n'
+        f'{{"lot_id": {lot_id}, "spot_number": 2, "username": "alice", "parking_timestamp": "2024-01-02 08:00:00",'
+        f' "leaving_timestamp": "2024-01-02 09:00:00", "parking_cost": "Infinity"}}\n'
+        f'{{"lot_id": {lot_id}, "spot_number": 2, "username": "alice", "parking_timestamp": "2024-01-03 08:00:00",'
+        f' "leaving_timestamp": "2024-01-03 09:00:00"}}\n'
+    )
+    result = import_file('reservations', stream, 'ndjson', chunk_size=2)
+    assert (result.processed, result.inserted) == (6, 2)
+    errors = dict(result.errors)
+    assert sorted(errors) == [2, 3, 4, 5]
+    assert errors[2].startswith('invalid JSON')
+    assert errors[3] == errors[4] == 'record is not a JSON object'
+
+    conn = get_db_connection()
+    costs = [row['parking_cost'] for row in conn.execute('SELECT parking_cost FROM reservations ORDER BY id')]
+    conn.close()
+    assert costs == [5.0, 0.0]
+
+
+def test_non_string_values_are_reported_as_invalid_rows(make_user, make_lot):
+    make_user('alice')
+    lot_id = make_lot()
+    users = io.StringIO(
+        '{"username": "bob", "email": "bob@example.com", "password": "secret", "role": 1}\n'
+        '{"username": "carol", "email": "carol@example.com", "password_hash": 5}\n'
+        '{"username": "dave", "email": "dave@example.com", "password": "secret"}\n'
+    )
+    result = import_file('users', users, 'ndjson')
+    assert result.inserted == 1 and [number for number, message in result.errors] == [1, 2]
+
+    reservations = io.StringIO(
+        f'{{"lot_id": {lot_id}, "spot_number": 1, "username": "alice", "parking_timestamp": "2024-01-01 08:00:00",'
+        f' "leaving_timestamp": "2024-01-01 10:00:00", "status": 3}}\n'
+    )
+    result = import_file('reservations', reservations, 'ndjson')
+    assert result.inserted == 0 and [number for number, message in result.errors] == [1]
@@ -0,0 +1,79 @@
+import pytest
+from models import database, pricing
+from models.database import get_db_connection
+from models.pricing import PricingEngine
+from models.reservation import Reservation
+
+
+@pytest.fixture
+def flat_hours(monkeypatch):
+    # Every hour at 1x, so rates only depend on occupancy: 0.9x below half full, 1x, 1.25x, 1.5x
+    monkeypatch.setattr(PricingEngine, 'enabled', True)
+    monkeypatch.setattr(PricingEngine, 'hour_multipliers', [1.0] * 24)
+    monkeypatch.setattr(PricingEngine, 'tier_ttl_seconds', 3600)
+
+
+def hourly_rate(reservation_id):
+    conn = get_db_connection()
+    rate = conn.execute('SELECT hourly_rate FROM reservations WHERE id = ?', (reservation_id,)).fetchone()[0]
+    conn.close()
+    return rate
+
+
+def test_bookings_move_the_lot_through_occupancy_tiers(make_user, make_lot, flat_hours):
+    first, second = make_user('alice'), make_user('bob')
+    lot_id = make_lot(spots=2, price=10.0)
+    assert PricingEngine.rate(lot_id) == 9.0
+
+    # Each booking reports the committed counts, so the next one is priced from them
+    assert hourly_rate(Reservation.book_spot(lot_id, first)) == 9.0
+    assert PricingEngine.rate(lot_id) == 10.0
+    booking = Reservation.book_spot(lot_id, second)
+    assert hourly_rate(booking) == 10.0
+    assert PricingEngine.rate(lot_id) == 15.0
+    Reservation.release_spot(booking, second)
+    assert PricingEngine.rate(lot_id) == 10.0
+
+
+def test_stale_lots_are_reread_one_at_a_time_outside_transactions(make_lot, flat_hours, monkeypatch):
+    edited, untouched = make_lot(price=10.0, name='Edited'), make_lot(price=20.0, name='Untouched')
+    PricingEngine.rates([edited, untouched])
+    conn = get_db_connection()
+    conn.execute('UPDATE parking_lots SET price = 30.0 WHERE id = ?', (edited,))  # As another worker would
+    conn.commit()
+    monkeypatch.setattr(PricingEngine, 'tier_ttl_seconds', 0)
+
+    # Inside a write transaction a stale lot is priced from the cache, without touching the database
+    queries = []
+    conn.set_trace_callback(queries.append)
+    monkeypatch.setattr(pricing, 'get_db_connection', lambda: pytest.fail('opened a connection under the lock'))
+    conn.execute('BEGIN IMMEDIATE')
+    assert PricingEngine.rate(edited, conn=conn) == 9.0
+    conn.rollback()
+    conn.close()
+    assert queries == ['BEGIN IMMEDIATE', 'ROLLBACK']
+
+    # Outside one, only the lots asked for are re-read
+    monkeypatch.setattr(pricing, 'get_db_connection', get_db_connection)
+    untouched_table = PricingEngine._tables[untouched]
+    assert PricingEngine.rates([edited]) == {edited: 27.0}
+    assert PricingEngine._tables[untouched] is untouched_table
+
+
+def test_init_db_backfills_the_rate_of_open_reservations(make_user, make_lot):
+    user_id = make_user('alice')
+    lot_id = make_lot(spots=3, price=12.0)
+    conn = get_db_connection()
+    spot_ids = [row['id'] for row in conn.execute('SELECT id FROM parking_spots WHERE lot_id = ?', (lot_id,))]
+    conn.executemany('''
+        INSERT INTO reservations (spot_id, user_id, parking_timestamp, status, hourly_rate)
+        VALUES (?, ?, '2024-01-01 08:00:00', ?, NULL)
+    ''', [(spot_ids[0], user_id, 'active'), (spot_ids[1], user_id, 'reserved'), (spot_ids[2], user_id, 'completed')])
+    conn.commit()
+    conn.close()
+
+    database.init_db()
+    conn = get_db_connection()
+    rates = {row['status']: row['hourly_rate'] for row in conn.execute('SELECT status, hourly_rate FROM reservations')}
+    conn.close()
+    assert rates == {'active': 12.0, 'reserved': 12.0, 'completed': None}
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import click
+import pytest
+from models.availability import TIMESTAMP_FORMAT
+from models.database import get_db_connection
+from models.reservation import Reservation
+from models.scheduler import Scheduler, init_scheduler, make_reservation_sweep, scheduler
+
+
+@pytest.fixture
+def stop_scheduler():
+    yield scheduler
+    scheduler.stop(timeout=10)
+    scheduler.jobs.clear()
+    scheduler.metrics.clear()
+
+
+def backdate(reservation_id, hours):
+    conn = get_db_connection()
+    conn.execute('UPDATE reservations SET parking_timestamp = ? WHERE id = ?',
+                 ((datetime.utcnow() - timedelta(hours=hours)).strftime(TIMESTAMP_FORMAT), reservation_id))
+    conn.commit()
+    conn.close()
+
+
+def test_sweep_flags_overstays_and_closes_abandoned_sessions(make_user, make_lot):
+    lot_id = make_lot(spots=3, price=2.0)
+    overstaying = Reservation.book_spot(lot_id, make_user('alice'))
+    abandoned = Reservation.book_spot(lot_id, make_user('bob'))
+    backdate(overstaying, 30)
+    backdate(abandoned, 80)
+
+    make_reservation_sweep(batch_size=1, overstay_hours=24, abandon_hours=72, pause_seconds=0)()
+
+    conn = get_db_connection()
+    rows = {row['id']: row for row in conn.execute('SELECT * FROM reservations')}
+    spot = conn.execute('SELECT status FROM parking_spots WHERE id = ?', (rows[abandoned]['spot_id'],)).fetchone()
+    conn.close()
+    assert rows[overstaying]['status'] == 'active' and rows[overstaying]['overstay'] == 1
+    assert rows[overstaying]['accrued_cost'] == pytest.approx(30 * 2.0, abs=2.0)
+    assert rows[abandoned]['status'] == 'abandoned' and spot['status'] == 'A'
+
+
+def test_only_one_worker_claims_a_due_job(db):
+    workers = [Scheduler(), Scheduler()]
+    for worker in workers:
+        worker.add_job('job', 60, lambda: 0)
+    assert [worker._claim('job', 60) for worker in workers] == [True, False]
+
+
+def test_app_starts_the_scheduler_once_per_process(app, client, stop_scheduler):
+    app.config['SCHEDULER_ENABLED'] = True
+    try:
+        client.get('/')
+        thread = scheduler._thread
+        assert scheduler.running and set(scheduler.jobs) == {'reservation_sweep', 'waitlist_holds',
+                                                             'reservation_archive'}
+        client.get('/')
+        assert init_scheduler(app.config) is scheduler and scheduler._thread is thread
+    finally:
+        app.config['SCHEDULER_ENABLED'] = False
+
+
+def test_cli_commands_do_not_start_the_scheduler(app, client, stop_scheduler):
+    app.config['SCHEDULER_ENABLED'] = True
+    try:
+        # A benchmark requesting pages through the test client from inside its command
+        with click.Context(click.Command('bench-pages'), info_name='bench-pages'):
+            client.get('/')
+        assert not scheduler.running
+        with click.Context(click.Command('run'), info_name='run'):
+            client.get('/')
+        assert scheduler.running
+    finally:
+        app.config['SCHEDULER_ENABLED'] = False
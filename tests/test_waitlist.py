@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import random
+import threading
+import time
+from models.availability import TIMESTAMP_FORMAT
+from models.database import get_db_connection
+from models.parking_lot import ParkingLot
+from models.reservation import Reservation
+from models.waitlist import Waitlist
+
+
+def add_users(count):
+    # Plain inserts: these users never log in, so skip the password hashing
+    conn = get_db_connection()
+    conn.executemany('INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+                     ((f'driver{number}', '!', f'driver{number}@example.com') for number in range(count)))
+    conn.commit()
+    ids = [row['id'] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'driver%' ORDER BY id")]
+    conn.close()
+    return ids
+
+
+def entry_status(entry_id):
+    conn = get_db_connection()
+    status = conn.execute('SELECT status FROM waitlist WHERE id = ?', (entry_id,)).fetchone()['status']
+    conn.close()
+    return status
+
+
+def lapse_hold(entry_id):
+    past = (datetime.utcnow() - timedelta(minutes=1)).strftime(TIMESTAMP_FORMAT)
+    conn = get_db_connection()
+    conn.execute('UPDATE waitlist SET hold_expires_at = ? WHERE id = ?', (past, entry_id))
+    conn.commit()
+    conn.close()
+
+
+def assert_spots_consistent(lot_id):
+    # A spot is 'O' exactly when it has one active or held reservation
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT ps.id, ps.status,
+               (SELECT COUNT(*) FROM reservations r WHERE r.spot_id = ps.id AND r.status IN ('active', 'held')) AS taken
+        FROM parking_spots ps WHERE ps.lot_id = ?
+    ''', (lot_id,)).fetchall()
+    conn.close()
+    for row in rows:
+        assert row['taken'] == (1 if row['status'] == 'O' else 0), dict(row)
+
+
+def test_freed_spot_goes_to_the_oldest_waiter_not_a_walk_in(make_lot):
+    first, second, walk_in = add_users(3)
+    lot_id = make_lot(spots=1)
+    reservation_id = Reservation.book_spot(lot_id, first)
+    entry_id = Waitlist.join(lot_id, second)
+
+    Reservation.release_spot(reservation_id, first)
+    assert entry_status(entry_id) == 'offered'
+    assert Reservation.book_spot(lot_id, walk_in) is False
+    assert Waitlist.claim(entry_id, second)
+    assert_spots_consistent(lot_id)
+
+
+def test_an_offer_on_one_lot_does_not_wake_a_wait_on_another(make_lot):
+    holder, waiter = add_users(2)
+    near, far = make_lot(spots=1, name='Near'), make_lot(spots=1, name='Far')
+    near_booking = Reservation.book_spot(near, holder)
+    Reservation.book_spot(far, holder)
+    near_entry, far_entry = Waitlist.join(near, waiter), Waitlist.join(far, waiter)
+
+    Reservation.release_spot(near_booking, holder)
+    assert Waitlist.waiting_entry_ids(waiter) == [far_entry]
+    assert Waitlist.wait_for_offer([far_entry], timeout=0.05) is False
+    assert Waitlist.wait_for_offer([near_entry], timeout=0.05) is True
+
+
+def test_lapsed_hold_is_released_without_the_scheduler(make_lot):
+    holder, first, second = add_users(3)
+    lot_id = make_lot(spots=1)
+    Reservation.release_spot(Reservation.book_spot(lot_id, holder), holder)
+    Reservation.book_spot(lot_id, holder)
+    first_entry = Waitlist.join(lot_id, first)
+    second_entry = Waitlist.join(lot_id, second)
+    Reservation.release_spot(Reservation.get_user_active_reservations(holder)[0].id, holder)
+    assert entry_status(first_entry) == 'offered'
+
+    lapse_hold(first_entry)
+    # The next booking attempt moves the lapsed hold on to the next waiter
+    assert Reservation.book_spot(lot_id, holder) is False
+    assert (entry_status(first_entry), entry_status(second_entry)) == ('expired', 'offered')
+
+    lapse_hold(second_entry)
+    assert Reservation.book_spot(lot_id, holder)
+    assert_spots_consistent(lot_id)
+
+
+def test_spots_added_to_a_full_lot_go_to_waiters_first(make_lot):
+    holder, waiter, walk_in = add_users(3)
+    lot_id = make_lot(spots=1)
+    Reservation.book_spot(lot_id, holder)
+    entry_id = Waitlist.join(lot_id, waiter)
+
+    lot = ParkingLot.get_by_id(lot_id)
+    ParkingLot.update(lot_id, lot['prime_location_name'], lot['price'], lot['address'], lot['pin_code'], 2)
+    assert entry_status(entry_id) == 'offered'
+    assert Reservation.book_spot(lot_id, walk_in) is False
+    assert_spots_consistent(lot_id)
+
+
+def test_spot_with_an_upcoming_reservation_is_not_handed_off(make_lot):
+    holder, planner, waiter = add_users(3)
+    lot_id = make_lot(spots=1)
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    assert Reservation.reserve_spot(lot_id, planner, start, start + timedelta(hours=1))
+    # The only spot is reserved within the walk-in horizon, so walk-ins are turned away and queue instead
+    assert Reservation.book_spot(lot_id, holder) is False
+    entry_id = Waitlist.join(lot_id, waiter)
+    assert entry_id is not None
+
+    conn = get_db_connection()
+    spot_id = conn.execute('SELECT id FROM parking_spots WHERE lot_id = ?', (lot_id,)).fetchone()['id']
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    assert Waitlist.hand_off(cursor, lot_id, spot_id) is None
+    conn.rollback()
+    conn.close()
+    assert entry_status(entry_id) == 'waiting'
+
+
+def test_sustained_over_demand_serves_waiters_in_order(make_lot):
+    # More drivers than spots: every driver books, or queues and claims the
+    # spot it is offered, parks briefly and leaves, several times over
+    users = add_users(12)
+    lot_id = make_lot(spots=3)
+    offers, served, lock = [], [], threading.Lock()
+
+    def drive(user_id):
+        for _ in range(3):
+            reservation_id = Reservation.book_spot(lot_id, user_id)
+            if not reservation_id:
+                entry_id = Waitlist.join(lot_id, user_id)
+                if entry_id is None:
+                    continue
+                assert Waitlist.wait_for_offer([entry_id], timeout=30)
+                with lock:
+                    offers.append(entry_id)
+                assert Waitlist.claim(entry_id, user_id)
+                reservation_id = Reservation.get_user_active_reservations(user_id)[0].id
+            threading.Event().wait(random.uniform(0, 0.02))
+            assert Reservation.release_spot(reservation_id, user_id)[0]
+            with lock:
+                served.append(user_id)
+
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        for future in [pool.submit(drive, user_id) for user_id in users]:
+            future.result()
+
+    assert len(served) >= len(users)
+    conn = get_db_connection()
+    offered = [row['id'] for row in conn.execute(
+        "SELECT id FROM waitlist WHERE lot_id = ? AND status = 'fulfilled' ORDER BY offered_at, id", (lot_id,))]
+    left = conn.execute("SELECT COUNT(*) FROM waitlist WHERE status IN ('waiting', 'offered')").fetchone()[0]
+    conn.close()
+    assert sorted(offers) == sorted(offered)
+    # Hand-offs follow queue order: entry ids are offered in increasing order
+    assert offered == sorted(offered)
+    assert left == 0
+    assert_spots_consistent(lot_id)
+    assert ParkingLot.get_spot_counts(lot_id)['available'] == 3
+
+
+def test_cancelling_the_booking_that_blocked_a_spot_serves_the_waiter(make_lot):
+    planner, waiter = add_users(2)
+    lot_id = make_lot(spots=1)
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    reservation_id = Reservation.reserve_spot(lot_id, planner, start, start + timedelta(hours=1))
+    entry_id = Waitlist.join(lot_id, waiter)
+    assert entry_id is not None
+
+    assert Reservation.cancel_reservation(reservation_id, planner) is True
+    assert entry_status(entry_id) == 'offered'
+    assert_spots_consistent(lot_id)
+
+
+def test_sync_workers_answer_the_event_stream_at_once(make_user, make_lot, client, login, monkeypatch):
+    lot_id = make_lot(spots=1)
+    assert Reservation.book_spot(lot_id, make_user('bob'))
+    assert Waitlist.join(lot_id, make_user('alice')) is not None
+    login('alice')
+    monkeypatch.setattr(Waitlist, 'stream_seconds', 0.5)
+
+    # The test client, like a gunicorn sync worker, runs one request at a time
+    started = time.monotonic()
+    assert client.get('/user/waitlist/events').data.startswith(b'retry:')
+    assert time.monotonic() - started < 0.5
+
+    started = time.monotonic()
+    client.get('/user/waitlist/events', environ_overrides={'wsgi.multithread': True}).data
+    assert time.monotonic() - started >= 0.5